@@ -11,7 +11,6 @@
 """
 
 import os
-import pickle
 import platform
 import sys
 import warnings
@@ -33,6 +32,7 @@ from sphinx.deprecation import RemovedInSphinx40Warning
 from sphinx.domains import Domain, Index
 from sphinx.environment import BuildEnvironment
 from sphinx.environment.collectors import EnvironmentCollector
+from sphinx.environment.storage import ShardedStorage, load_environment
 from sphinx.errors import ApplicationError, ConfigError, VersionRequirementError
 from sphinx.events import EventManager
 from sphinx.extension import Extension
@@ -303,16 +303,16 @@ class Sphinx:
 
     def _init_env(self, freshenv: bool) -> None:
         filename = path.join(self.doctreedir, ENV_PICKLE_FILENAME)
-        if freshenv or not os.path.exists(filename):
+        storage = ShardedStorage(self.doctreedir)
+        if freshenv or not (os.path.exists(filename) or storage.exists()):
             self.env = BuildEnvironment()
             self.env.setup(self)
             self.env.find_files(self.config, self.builder)
         else:
             try:
                 with progress_message(__('loading pickled environment')):
-                    with open(filename, 'rb') as f:
-                        self.env = pickle.load(f)
-                        self.env.setup(self)
+                    self.env = load_environment(self.doctreedir)
+                    self.env.setup(self)
             except Exception as err:
                 logger.info(__('failed: %s'), err)
                 self._init_env(freshenv=True)
@@ -379,6 +379,7 @@ class Sphinx:
             envfile = path.join(self.doctreedir, ENV_PICKLE_FILENAME)
             if path.isfile(envfile):
                 os.unlink(envfile)
+            ShardedStorage(self.doctreedir).remove()
             self.events.emit('build-finished', err)
             raise
         else:
@@ -8,6 +8,7 @@
     :license: BSD, see LICENSE for details.
 """
 
+import os
 import pickle
 import time
 from os import path
@@ -19,6 +20,7 @@ from docutils.nodes import Node
 from sphinx.config import Config
 from sphinx.environment import BuildEnvironment, CONFIG_OK, CONFIG_CHANGED_REASON
 from sphinx.environment.adapters.asset import ImageAdapter
+from sphinx.environment.storage import ShardedStorage
 from sphinx.errors import SphinxError
 from sphinx.events import EventManager
 from sphinx.io import read_doc
@@ -26,11 +28,12 @@ from sphinx.locale import __
 from sphinx.util import import_object, logging, rst, progress_message, status_iterator
 from sphinx.util.build_phase import BuildPhase
 from sphinx.util.console import bold  # type: ignore
-from sphinx.util.docutils import sphinx_domains
+from sphinx.util.docutils import LoggingReporter, sphinx_domains
 from sphinx.util.i18n import CatalogInfo, CatalogRepository, docname_to_domain
 from sphinx.util.osutil import SEP, ensuredir, relative_uri, relpath
-from sphinx.util.parallel import ParallelTasks, SerialTasks, make_chunks, \
-    parallel_available
+from sphinx.util.parallel import (
+    ConcurrentTasks, SerialTasks, WorkerPool, make_chunks, parallel_available
+)
 from sphinx.util.tags import Tags
 
 # side effect: registers roles and directives
@@ -73,6 +76,16 @@ class Builder:
     versioning_compare = False
     # allow parallel write_doc() calls
     allow_parallel = False
+    #: Resolve the doctrees and call :meth:`write_doc_serialized` in the
+    #: parallel write processes as well.  The builder passes the results of
+    #: :meth:`write_doc_serialized` back to the main process with
+    #: :meth:`get_write_results` and :meth:`merge_write_results`.
+    #:
+    #: The attribute is not inherited: the overrides of a subclass may keep
+    #: state in the main process, so a subclass has to set it again to opt in.
+    #:
+    #: .. versionadded:: 3.3
+    parallel_resolve = False
     # support translation
     use_message_catalog = True
 
@@ -323,9 +336,17 @@ class Builder:
         if updated_docnames:
             # save the environment
             from sphinx.application import ENV_PICKLE_FILENAME
+            envfile = path.join(self.doctreedir, ENV_PICKLE_FILENAME)
+            storage = ShardedStorage(self.doctreedir)
             with progress_message(__('pickling environment')):
-                with open(path.join(self.doctreedir, ENV_PICKLE_FILENAME), 'wb') as f:
-                    pickle.dump(self.env, f, pickle.HIGHEST_PROTOCOL)
+                if self.config.environment_storage == 'sharded':
+                    storage.dump(self.env, updated_docnames)
+                    if path.isfile(envfile):
+                        os.unlink(envfile)
+                else:
+                    storage.remove()
+                    with open(envfile, 'wb') as f:
+                        pickle.dump(self.env, f, pickle.HIGHEST_PROTOCOL)
 
             # global actions
             self.app.phase = BuildPhase.CONSISTENCY_CHECK
@@ -351,11 +372,10 @@ class Builder:
             self.parallel_ok = False
 
         #  create a task executor to use for misc. "finish-up" tasks
-        # if self.parallel_ok:
-        #     self.finish_tasks = ParallelTasks(self.app.parallel)
-        # else:
-        # for now, just execute them serially
-        self.finish_tasks = SerialTasks()
+        if self.parallel_ok:
+            self.finish_tasks = ConcurrentTasks(self.app.parallel)
+        else:
+            self.finish_tasks = SerialTasks()
 
         # write all "normal" documents (or everything for some builders)
         self.write(docnames, list(updated_docnames), method)
@@ -366,6 +386,10 @@ class Builder:
         # wait for all tasks
         self.finish_tasks.join()
 
+        logger.verbose(__('doctree cache: %(hits)d hits, %(misses)d misses, '
+                          '%(entries)d doctrees (%(size)d bytes) cached'),
+                       self.env.doctree_cache.stats())
+
     def read(self) -> List[str]:
         """(Re-)read all files new or changed since last update.
 
@@ -439,6 +463,8 @@ class Builder:
             self.read_doc(docname)
 
     def _read_parallel(self, docnames: List[str], nproc: int) -> None:
+        costs = self.estimate_costs(docnames)
+
         # clear all outdated docs at once
         for docname in docnames:
             self.events.emit('env-purge-doc', self.env, docname)
@@ -448,15 +474,15 @@ class Builder:
             self.env.app = self.app
             for docname in docs:
                 self.read_doc(docname)
-            # allow pickling self to send it back
-            return pickle.dumps(self.env, pickle.HIGHEST_PROTOCOL)
+            # send back only the information about the read documents
+            return pickle.dumps(self.env.extract_info(docs), pickle.HIGHEST_PROTOCOL)
 
         def merge(docs: List[str], otherenv: bytes) -> None:
             env = pickle.loads(otherenv)
             self.env.merge_info_from(docs, env, self.app)
 
-        tasks = ParallelTasks(nproc)
-        chunks = make_chunks(docnames, nproc)
+        tasks = WorkerPool(nproc)
+        chunks = make_chunks(docnames, nproc, costs=costs)
 
         for chunk in status_iterator(chunks, __('reading sources... '), "purple",
                                      len(chunks), self.app.verbosity):
@@ -466,8 +492,40 @@ class Builder:
         logger.info(bold(__('waiting for workers...')))
         tasks.join()
 
+    def estimate_costs(self, docnames: Iterable[str]) -> Dict[str, float]:
+        """Estimate the relative cost of processing each of *docnames*.
+
+        The cost is the time it took to read the document in the last build.
+        Documents that have not been read before are estimated from the size of
+        their source file.  The costs are used to balance the chunks of parallel
+        builds.
+
+        .. versionadded:: 3.3
+        """
+        durations = self.env.read_durations
+        sizes = {}  # type: Dict[str, int]
+        for docname in docnames:
+            try:
+                sizes[docname] = path.getsize(self.env.doc2path(docname))
+            except OSError:
+                sizes[docname] = 0
+
+        known = [docname for docname in sizes if docname in durations]
+        known_size = sum(sizes[docname] for docname in known)
+        if known_size:
+            # seconds per byte of the documents read before
+            rate = sum(durations[docname] for docname in known) / known_size
+        else:
+            rate = 1.0
+
+        costs = {}  # type: Dict[str, float]
+        for docname, size in sizes.items():
+            costs[docname] = durations.get(docname, size * rate)
+        return costs
+
     def read_doc(self, docname: str) -> None:
         """Parse a file and add/update inventory entries for the doctree."""
+        started = time.time()
         self.env.prepare_settings(docname)
 
         # Add confdir/docutils.conf to dependencies list if exists
@@ -484,6 +542,9 @@ class Builder:
         # For example, FAT32 has 2sec timestamp resolution.)
         self.env.all_docs[docname] = max(time.time(),
                                          path.getmtime(self.env.doc2path(docname)))
+        if self.config.source_change_detection == 'content':
+            self.env.note_source_stamps(docname)
+        self.env.read_durations[docname] = time.time() - started
 
         # cleanup
         self.env.temp_data.clear()
@@ -500,10 +561,12 @@ class Builder:
         doctree.settings.env = None
         doctree.settings.record_dependencies = None
 
+        content = self.env.doctree_serializer.dumps(doctree)
         doctree_filename = path.join(self.doctreedir, docname + '.doctree')
         ensuredir(path.dirname(doctree_filename))
         with open(doctree_filename, 'wb') as f:
-            pickle.dump(doctree, f, pickle.HIGHEST_PROTOCOL)
+            f.write(content)
+        self.env.doctree_cache.put(docname, content)
 
     def write(self, build_docnames: Iterable[str], updated_docnames: Sequence[str], method: str = 'update') -> None:  # NOQA
         if build_docnames is None or build_docnames == ['__all__']:
@@ -526,7 +589,10 @@ class Builder:
         with progress_message(__('preparing documents')):
             self.prepare_writing(docnames)
 
-        if self.parallel_ok:
+        if self.parallel_ok and self._parallel_resolve():
+            # the main process only merges the results of the subprocesses
+            self._write_parallel(sorted(docnames), nproc=self.app.parallel)
+        elif self.parallel_ok:
             # number of subprocesses is parallel-1 because the main process
             # is busy loading doctrees and doing write_doc_serialized()
             self._write_parallel(sorted(docnames),
@@ -534,6 +600,10 @@ class Builder:
         else:
             self._write_serial(sorted(docnames))
 
+    def _parallel_resolve(self) -> bool:
+        # parallel_resolve is only honoured if set by the class itself
+        return type(self).__dict__.get('parallel_resolve', False)
+
     def _write_serial(self, docnames: Sequence[str]) -> None:
         with logging.pending_warnings():
             for docname in status_iterator(docnames, __('writing output... '), "darkgreen",
@@ -545,10 +615,29 @@ class Builder:
                 self.write_doc(docname, doctree)
 
     def _write_parallel(self, docnames: Sequence[str], nproc: int) -> None:
-        def write_process(docs: List[Tuple[str, nodes.document]]) -> None:
+        def write_process(arg: Tuple[Dict[str, str], List[Tuple[str, nodes.document]]]) -> None:  # NOQA
+            images, docs = arg
             self.app.phase = BuildPhase.WRITING
+            # the images noted in the main process since the worker was forked
+            self.images.update(images)
             for docname, doctree in docs:
+                doctree.settings.env = self.env
+                doctree.reporter = LoggingReporter(self.env.doc2path(docname))
+                self.write_doc(docname, doctree)
+
+        def resolve_and_write_process(docs: List[str]) -> Any:
+            # the environment is the read-only snapshot taken at fork time
+            self.prepare_write_chunk(docs)
+            for docname in docs:
+                self.app.phase = BuildPhase.RESOLVING
+                doctree = self.env.get_and_resolve_doctree(docname, self)
+                self.app.phase = BuildPhase.WRITING
+                self.write_doc_serialized(docname, doctree)
                 self.write_doc(docname, doctree)
+            return self.get_write_results(docs)
+
+        def merge(docs: List[str], results: Any) -> None:
+            self.merge_write_results(docs, results)
 
         # warm up caches/compile templates using the first document
         firstname, docnames = docnames[0], docnames[1:]
@@ -558,18 +647,31 @@ class Builder:
         self.write_doc_serialized(firstname, doctree)
         self.write_doc(firstname, doctree)
 
-        tasks = ParallelTasks(nproc)
-        chunks = make_chunks(docnames, nproc)
+        tasks = WorkerPool(nproc)
+        chunks = make_chunks(docnames, nproc, costs=self.estimate_costs(docnames))
 
-        self.app.phase = BuildPhase.RESOLVING
-        for chunk in status_iterator(chunks, __('writing output... '), "darkgreen",
-                                     len(chunks), self.app.verbosity):
-            arg = []
-            for i, docname in enumerate(chunk):
-                doctree = self.env.get_and_resolve_doctree(docname, self)
-                self.write_doc_serialized(docname, doctree)
-                arg.append((docname, doctree))
-            tasks.add_task(write_process, arg)
+        if self._parallel_resolve():
+            # the main process only merges the results of the workers
+            for chunk in status_iterator(chunks, __('writing output... '), "darkgreen",
+                                         len(chunks), self.app.verbosity):
+                tasks.add_task(resolve_and_write_process, chunk, merge)
+        else:
+            # the workers are forked with the images noted so far
+            forked_images = set(self.images)
+            self.app.phase = BuildPhase.RESOLVING
+            for chunk in status_iterator(chunks, __('writing output... '), "darkgreen",
+                                         len(chunks), self.app.verbosity):
+                arg = []
+                for i, docname in enumerate(chunk):
+                    doctree = self.env.get_and_resolve_doctree(docname, self)
+                    self.write_doc_serialized(docname, doctree)
+                    # the doctree is sent to a worker; the worker has its own env
+                    doctree.settings.env = None
+                    doctree.reporter = None
+                    arg.append((docname, doctree))
+                images = {uri: filename for uri, filename in self.images.items()
+                          if uri not in forked_images}
+                tasks.add_task(write_process, (images, arg))
 
         # make sure all threads have finished
         logger.info(bold(__('waiting for workers...')))
@@ -586,6 +688,39 @@ class Builder:
     def write_doc_serialized(self, docname: str, doctree: nodes.document) -> None:
         """Handle parts of write_doc that must be called in the main process
         if parallel build is active.
+
+        If :attr:`parallel_resolve` is true, this is called in the parallel
+        write processes too; the state it changes is passed back to the main
+        process with :meth:`get_write_results`.
+        """
+        pass
+
+    def prepare_write_chunk(self, docnames: List[str]) -> None:
+        """Prepare a parallel write process for writing *docnames*.
+
+        Only called if :attr:`parallel_resolve` is true.  This is the place to
+        reset the state collected by :meth:`get_write_results`.
+
+        .. versionadded:: 3.3
+        """
+        pass
+
+    def get_write_results(self, docnames: List[str]) -> Any:
+        """Return the state changed by :meth:`write_doc_serialized` while
+        writing *docnames* in a parallel write process.
+
+        The result is pickled and passed to :meth:`merge_write_results` in the
+        main process.  Only called if :attr:`parallel_resolve` is true.
+
+        .. versionadded:: 3.3
+        """
+        return None
+
+    def merge_write_results(self, docnames: List[str], results: Any) -> None:
+        """Merge the *results* of writing *docnames* in a parallel write
+        process into the main process.
+
+        .. versionadded:: 3.3
         """
         pass
 
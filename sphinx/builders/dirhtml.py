@@ -27,6 +27,7 @@ class DirectoryHTMLBuilder(StandaloneHTMLBuilder):
     ``.html`` in them.
     """
     name = 'dirhtml'
+    parallel_resolve = True
 
     def get_target_uri(self, docname: str, typ: str = None) -> str:
         if docname == 'index':
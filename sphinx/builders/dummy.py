@@ -22,6 +22,7 @@ class DummyBuilder(Builder):
     epilog = __('The dummy builder generates no files.')
 
     allow_parallel = True
+    parallel_resolve = True
 
     def init(self) -> None:
         pass
@@ -9,19 +9,23 @@
 """
 
 import html
+import os
+import pickle
 import posixpath
 import re
+import shutil
 import sys
 import warnings
+from collections import Counter, OrderedDict
 from os import path
 from typing import Any, Dict, IO, Iterable, Iterator, List, Set, Tuple
 from urllib.parse import quote
 
 from docutils import nodes
-from docutils.core import publish_parts
+from docutils.core import Publisher
 from docutils.frontend import OptionParser
 from docutils.io import DocTreeInput, StringOutput
-from docutils.nodes import Node
+from docutils.nodes import Element, Node
 from docutils.utils import relative_path
 
 from sphinx import package_dir, __display_version__
@@ -36,9 +40,10 @@ from sphinx.environment.adapters.toctree import TocTree
 from sphinx.errors import ConfigError, ThemeError
 from sphinx.highlighting import PygmentsBridge
 from sphinx.locale import _, __
-from sphinx.search import js_index
+from sphinx.search import js_index, shard_filename
 from sphinx.theming import HTMLThemeFactory
 from sphinx.util import logging, progress_message, status_iterator, md5
+from sphinx.util.console import bold  # type: ignore
 from sphinx.util.docutils import is_html5_writer_available, new_document
 from sphinx.util.fileutil import copy_asset
 from sphinx.util.i18n import format_date
@@ -177,6 +182,7 @@ class StandaloneHTMLBuilder(Builder):
 
     copysource = True
     allow_parallel = True
+    parallel_resolve = True
     out_suffix = '.html'
     link_suffix = '.html'  # defaults to matching out_suffix
     indexer_format = js_index  # type: Any
@@ -188,6 +194,12 @@ class StandaloneHTMLBuilder(Builder):
     supported_remote_images = True
     supported_data_uri_images = True
     searchindex_filename = 'searchindex.js'
+    #: the file of the search index postings in the doctree directory; it is
+    #: prefixed with the builder name
+    searchpostings_filename = 'searchpostings.pickle'
+    searchshards_dirname = '_searchindex'
+    #: the number of rendered toctrees kept for reuse by other pages
+    resolved_toctree_cache_size = 100
     add_permalinks = True
     allow_sharp_as_current_path = True
     embedded = False  # for things like HTML help or Qt help: suppresses sidebar
@@ -207,6 +219,13 @@ class StandaloneHTMLBuilder(Builder):
         # JS files
         self.script_files = []  # type: List[JavaScript]
 
+        # the caches of the toctrees, reset for every build
+        self.init_toctrees()
+        # the publisher of render_partial()
+        self._publisher = None  # type: Publisher
+        # the numbers of output files written and left unchanged by handle_page()
+        self.output_stats = Counter()  # type: Dict[str, int]
+
     def init(self) -> None:
         self.build_info = self.create_build_info()
         # basename of images directory
@@ -233,6 +252,18 @@ class StandaloneHTMLBuilder(Builder):
 
         self.use_index = self.get_builder_config('use_index', 'html')
 
+    def init_toctrees(self) -> None:
+        """Reset the caches of the resolved and rendered toctrees."""
+        self.toctree_adapter = TocTree(self.env)
+        self._toctree_docs = None  # type: Set[str]
+        # the rendered toctrees of the pages that are not in the global TOC,
+        # and of the current page
+        self._toctree_fragments = {}  # type: Dict[Tuple, str]
+        self._page_toctree_fragments = (None, {})  # type: Tuple[str, Dict[Tuple, str]]
+        # the recently rendered toctrees of the pages in the global TOC, by
+        # the resolved toctree
+        self._resolved_toctree_fragments = OrderedDict()  # type: Dict[str, str]
+
     def create_build_info(self) -> BuildInfo:
         return BuildInfo(self.config, self.tags, ['html'])
 
@@ -391,12 +422,18 @@ class StandaloneHTMLBuilder(Builder):
         doc = new_document('<partial node>')
         doc.append(node)
 
-        writer = HTMLWriter(self)
-        return publish_parts(reader_name='doctree',
-                             writer=writer,
-                             source_class=DocTreeInput,
-                             settings_overrides={'output_encoding': 'unicode'},
-                             source=doc)
+        # the publisher, and its settings in particular, are expensive to set
+        # up; one is reused for all nodes
+        if self._publisher is None:
+            self._publisher = Publisher(writer=HTMLWriter(self),
+                                        source_class=DocTreeInput,
+                                        destination_class=StringOutput)
+            self._publisher.set_components('doctree', 'restructuredtext', None)
+            self._publisher.process_programmatic_settings(
+                None, {'output_encoding': 'unicode'}, None)
+        self._publisher.set_source(doc)
+        self._publisher.publish()
+        return dict(self._publisher.writer.parts)
 
     def prepare_writing(self, docnames: Set[str]) -> None:
         # create the search indexer
@@ -411,6 +448,8 @@ class StandaloneHTMLBuilder(Builder):
                                         self.config.html_search_scorer)
             self.load_indexer(docnames)
 
+        self.init_toctrees()
+        self.output_stats = Counter()
         self.docwriter = HTMLWriter(self)
         self.docsettings = OptionParser(
             defaults=self.env.settings,
@@ -609,19 +648,48 @@ class StandaloneHTMLBuilder(Builder):
         title = self.render_partial(title_node)['title'] if title_node else ''
         self.index_page(docname, doctree, title)
 
+    def prepare_write_chunk(self, docnames: List[str]) -> None:
+        # only collect the images, search data and statistics of the chunk
+        self.images = {}
+        self.output_stats = Counter()
+        if self.indexer is not None:
+            self.indexer.clear_feeds()
+
+    def get_write_results(self, docnames: List[str]) -> Any:
+        feeds = self.indexer.get_feeds() if self.indexer is not None else None
+        return self.images, feeds, self.output_stats
+
+    def merge_write_results(self, docnames: List[str], results: Any) -> None:
+        images, feeds, output_stats = results
+        self.images.update(images)
+        self.output_stats.update(output_stats)
+        if feeds is not None:
+            self.indexer.merge_feeds(feeds)
+
     def finish(self) -> None:
-        self.finish_tasks.add_task(self.gen_indices)
-        self.finish_tasks.add_task(self.gen_pages_from_extensions)
-        self.finish_tasks.add_task(self.gen_additional_pages)
-        self.finish_tasks.add_task(self.copy_image_files)
-        self.finish_tasks.add_task(self.copy_download_files)
-        self.finish_tasks.add_task(self.copy_static_files)
-        self.finish_tasks.add_task(self.copy_extra_files)
-        self.finish_tasks.add_task(self.write_buildinfo)
+        # the files are copied in forked processes while the pages are generated
+        # in the main process, as extensions may collect data while they are
+        # rendered.  The extra files are copied last as they may override others.
+        tasks = self.finish_tasks
+        copies = [tasks.add_task(self.copy_image_files, forked=True),
+                  tasks.add_task(self.copy_download_files, forked=True),
+                  tasks.add_task(self.copy_static_files, forked=True)]
+        tasks.add_task(self.gen_indices)
+        tasks.add_task(self.gen_pages_from_extensions)
+        tasks.add_task(self.gen_additional_pages)
+        if self.config.html_write_if_changed:
+            tasks.add_task(self.report_output_stats)
+        extra = tasks.add_task(self.copy_extra_files, after=copies, forked=True)
+        tasks.add_task(self.write_buildinfo, after=[extra], forked=True)
+        tasks.join()
 
         # dump the search index
         self.handle_finish()
 
+    def report_output_stats(self) -> None:
+        logger.info(bold(__('output files: %d written, %d unchanged')),
+                    self.output_stats['written'], self.output_stats['unchanged'])
+
     @progress_message(__('generating indices'))
     def gen_indices(self) -> None:
         # the global general index
@@ -846,21 +914,30 @@ class StandaloneHTMLBuilder(Builder):
                 node.replace_self(reference)
                 reference.append(node)
 
+    def get_searchpostings_filename(self) -> str:
+        # the postings are kept out of the output directory, which is published
+        return path.join(self.doctreedir, '%s-%s' % (self.name, self.searchpostings_filename))
+
     def load_indexer(self, docnames: Iterable[str]) -> None:
         keep = set(self.env.all_docs) - set(docnames)
         try:
-            searchindexfn = path.join(self.outdir, self.searchindex_filename)
-            if self.indexer_dumps_unicode:
-                with open(searchindexfn, encoding='utf-8') as ft:
-                    self.indexer.load(ft, self.indexer_format)
-            else:
-                with open(searchindexfn, 'rb') as fb:
-                    self.indexer.load(fb, self.indexer_format)
-        except (OSError, ValueError):
-            if keep:
-                logger.warning(__('search index couldn\'t be loaded, but not all '
-                                  'documents will be built: the index will be '
-                                  'incomplete.'))
+            # the postings of the last build spare parsing the search index
+            with open(self.get_searchpostings_filename(), 'rb') as fb:
+                self.indexer.load_postings(fb)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            try:
+                searchindexfn = path.join(self.outdir, self.searchindex_filename)
+                if self.indexer_dumps_unicode:
+                    with open(searchindexfn, encoding='utf-8') as ft:
+                        self.indexer.load(ft, self.indexer_format)
+                else:
+                    with open(searchindexfn, 'rb') as fb:
+                        self.indexer.load(fb, self.indexer_format)
+            except (OSError, ValueError):
+                if keep:
+                    logger.warning(__('search index couldn\'t be loaded, but not all '
+                                      'documents will be built: the index will be '
+                                      'incomplete.'))
         # delete all entries for files that will be rebuilt
         self.indexer.prune(keep)
 
@@ -889,8 +966,67 @@ class StandaloneHTMLBuilder(Builder):
             kwargs['includehidden'] = False
         if kwargs.get('maxdepth') == '':
             kwargs.pop('maxdepth')
-        return self.render_partial(TocTree(self.env).get_toctree_for(
-            docname, self, collapse, **kwargs))['fragment']
+
+        key = (collapse,) + tuple(sorted(kwargs.items()))
+        if docname in self.get_toctree_docs():
+            # the toctree marks the page as current, so it is resolved for
+            # every page; see _render_resolved_toctree() for the rendering
+            if self._page_toctree_fragments[0] != docname:
+                self._page_toctree_fragments = (docname, {})
+            fragments = self._page_toctree_fragments[1]
+        else:
+            # the toctree differs only in the links, which are relative to the
+            # directory of the page
+            key += (posixpath.dirname(self.get_target_uri(docname)),)
+            fragments = self._toctree_fragments
+
+        try:
+            return fragments[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable option values
+            fragments = {}
+
+        toctree = self.toctree_adapter.get_toctree_for(docname, self, collapse, **kwargs)
+        if toctree is not None and fragments is self._page_toctree_fragments[1]:
+            fragments[key] = self._render_resolved_toctree(toctree)
+        else:
+            fragments[key] = self.render_partial(toctree)['fragment']
+        return fragments[key]
+
+    def _render_resolved_toctree(self, toctree: Element) -> str:
+        """Render a toctree resolved for a page in the global TOC.
+
+        The rendered toctree is shared by the pages whose toctrees resolve to
+        the same tree, i.e. that have the same expanded branches and current
+        entries and the same relative links, e.g. the sibling pages below the
+        depth shown.  Only the recently rendered toctrees are kept, as the pages
+        sharing one are usually written one after the other.
+        """
+        key = toctree.pformat()
+        fragments = self._resolved_toctree_fragments
+        fragment = fragments.pop(key, None)
+        if fragment is None:
+            fragment = self.render_partial(toctree)['fragment']
+        fragments[key] = fragment
+        while len(fragments) > self.resolved_toctree_cache_size:
+            del fragments[next(iter(fragments))]
+        return fragment
+
+    def get_toctree_docs(self) -> Set[str]:
+        """Return the documents in the global TOC, i.e. the documents that are
+        included by the toctrees of the master document and their descendants.
+        """
+        if self._toctree_docs is None:
+            self._toctree_docs = set()
+            todo = [self.config.master_doc]
+            while todo:
+                docname = todo.pop()
+                if docname not in self._toctree_docs:
+                    self._toctree_docs.add(docname)
+                    todo.extend(self.env.toctree_includes.get(docname, []))
+        return self._toctree_docs
 
     def get_outfilename(self, pagename: str) -> str:
         return path.join(self.outdir, os_path(pagename) + self.out_suffix)
@@ -1025,9 +1161,20 @@ class StandaloneHTMLBuilder(Builder):
         # outfilename's path is in general different from self.outdir
         ensuredir(path.dirname(outfilename))
         try:
-            with open(outfilename, 'w', encoding=ctx['encoding'],
-                      errors='xmlcharrefreplace') as f:
-                f.write(output)
+            if self.config.html_write_if_changed:
+                # encoded as the text mode file would be
+                text = output.replace('\n', os.linesep)
+                content = text.encode(ctx['encoding'], 'xmlcharrefreplace')
+                if _has_content(outfilename, content):
+                    self.output_stats['unchanged'] += 1
+                else:
+                    with open(outfilename, 'wb') as fb:
+                        fb.write(content)
+                    self.output_stats['written'] += 1
+            else:
+                with open(outfilename, 'w', encoding=ctx['encoding'],
+                          errors='xmlcharrefreplace') as f:
+                    f.write(output)
         except OSError as err:
             logger.warning(__("error writing file %s: %s"), outfilename, err)
         if self.copysource and ctx.get('sourcename'):
@@ -1035,7 +1182,10 @@ class StandaloneHTMLBuilder(Builder):
             source_name = path.join(self.outdir, '_sources',
                                     os_path(ctx['sourcename']))
             ensuredir(path.dirname(source_name))
-            copyfile(self.env.doc2path(pagename), source_name)
+            if copyfile(self.env.doc2path(pagename), source_name):
+                self.output_stats['written'] += 1
+            else:
+                self.output_stats['unchanged'] += 1
 
     def update_page_context(self, pagename: str, templatename: str,
                             ctx: Dict, event_arg: Any) -> None:
@@ -1043,8 +1193,8 @@ class StandaloneHTMLBuilder(Builder):
 
     def handle_finish(self) -> None:
         if self.indexer:
-            self.finish_tasks.add_task(self.dump_search_index)
-        self.finish_tasks.add_task(self.dump_inventory)
+            self.finish_tasks.add_task(self.dump_search_index, forked=True)
+        self.finish_tasks.add_task(self.dump_inventory, forked=True)
 
     @progress_message(__('dumping object inventory'))
     def dump_inventory(self) -> None:
@@ -1056,7 +1206,14 @@ class StandaloneHTMLBuilder(Builder):
             searchindexfn = path.join(self.outdir, self.searchindex_filename)
             # first write to a temporary file, so that if dumping fails,
             # the existing index won't be overwritten
-            if self.indexer_dumps_unicode:
+            length = self.config.html_search_shard_length
+            sharded = length and self.indexer_format is js_index
+            if sharded:
+                frozen, shards = self.indexer.freeze_sharded(length)
+                frozen['shards'] = self.dump_search_shards(shards)
+                with open(searchindexfn + '.tmp', 'w', encoding='utf-8') as ft:
+                    js_index.dump(frozen, ft)
+            elif self.indexer_dumps_unicode:
                 with open(searchindexfn + '.tmp', 'w', encoding='utf-8') as ft:
                     self.indexer.dump(ft, self.indexer_format)
             else:
@@ -1064,6 +1221,55 @@ class StandaloneHTMLBuilder(Builder):
                     self.indexer.dump(fb, self.indexer_format)
             movefile(searchindexfn + '.tmp', searchindexfn)
 
+            if not sharded:
+                # the shards of an earlier sharded build would be published too
+                shutil.rmtree(path.join(self.outdir, self.searchshards_dirname),
+                              ignore_errors=True)
+
+            postingsfn = self.get_searchpostings_filename()
+            with open(postingsfn + '.tmp', 'wb') as fb:
+                self.indexer.dump_postings(fb)
+            movefile(postingsfn + '.tmp', postingsfn)
+
+    def dump_search_shards(self, shards: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+        """Write the shards of a sharded search index.
+
+        Return the file names of the shards by their keys, relative to the
+        output directory.  Unchanged shards are not rewritten, and the files
+        of shards that are gone are removed.
+        """
+        dirname = path.join(self.outdir, self.searchshards_dirname)
+        ensuredir(dirname)
+        filenames = {}  # type: Dict[str, str]
+        for key, shard in shards.items():
+            filename = shard_filename(key) + '.js'
+            filenames[key] = posixpath.join(self.searchshards_dirname, filename)
+            content = js_index.dumps_shard(key, shard)
+            try:
+                with open(path.join(dirname, filename), encoding='utf-8') as f:
+                    if f.read() == content:
+                        continue
+            except OSError:
+                pass
+            with open(path.join(dirname, filename), 'w', encoding='utf-8') as f:
+                f.write(content)
+
+        current = {posixpath.basename(filename) for filename in filenames.values()}
+        for filename in set(os.listdir(dirname)) - current:
+            os.unlink(path.join(dirname, filename))
+        return filenames
+
+
+def _has_content(filename: str, content: bytes) -> bool:
+    """Check if the file *filename* exists and has exactly *content*."""
+    try:
+        if path.getsize(filename) != len(content):
+            return False
+        with open(filename, 'rb') as f:
+            return f.read() == content
+    except OSError:
+        return False
+
 
 def convert_html_css_files(app: Sphinx, config: Config) -> None:
     """This converts string styled html_css_files to tuple styled one."""
@@ -1227,6 +1433,8 @@ def setup(app: Sphinx) -> Dict[str, Any]:
     app.add_config_value('html_search_language', None, 'html', [str])
     app.add_config_value('html_search_options', {}, 'html')
     app.add_config_value('html_search_scorer', '', None)
+    app.add_config_value('html_search_shard_length', 0, 'html')
+    app.add_config_value('html_write_if_changed', False, None)
     app.add_config_value('html_scaled_image_link', True, 'html')
     app.add_config_value('html_baseurl', '', 'html')
     app.add_config_value('html_codeblock_linenos_style', 'table', 'html',
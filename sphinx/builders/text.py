@@ -31,6 +31,7 @@ class TextBuilder(Builder):
 
     out_suffix = '.txt'
     allow_parallel = True
+    parallel_resolve = True
     default_translator_class = TextTranslator
 
     current_docname = None  # type: str
@@ -41,6 +41,7 @@ class XMLBuilder(Builder):
 
     out_suffix = '.xml'
     allow_parallel = True
+    parallel_resolve = True
 
     _writer_class = XMLWriter  # type: Union[Type[XMLWriter], Type[PseudoXMLWriter]]
     default_translator_class = XMLTranslator
@@ -152,6 +152,10 @@ class Config:
         'smartquotes_excludes': ({'languages': ['ja'],
                                   'builders': ['man', 'text']},
                                  'env', []),
+        'environment_storage': ('pickle', None, ENUM('pickle', 'sharded')),
+        'doctree_cache_size': (64, None, []),
+        'doctree_compression': (None, None, [str]),
+        'source_change_detection': ('mtime', None, ENUM('mtime', 'content')),
     }  # type: Dict[str, Tuple]
 
     def __init__(self, config: Dict[str, Any] = {}, overrides: Dict[str, Any] = {}) -> None:
@@ -10,7 +10,7 @@
 """
 
 import copy
-from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Tuple, Union
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Set, Tuple, Union
 from typing import cast
 
 from docutils import nodes
@@ -152,6 +152,84 @@ class Index:
         raise NotImplementedError
 
 
+class DocumentEntries(dict):
+    """A data dict of a domain that is listed in :attr:`Domain.document_data`.
+
+    The dict keeps an index of its keys by document, which follows all changes
+    made through the dict.  It is pickled (and copied) as a plain dict.
+    """
+
+    def __init__(self, data: Dict, getdocname: Callable[[Any], str]) -> None:
+        super().__init__()
+        self.getdocname = getdocname
+        self.owners = {}  # type: Dict[Any, str]
+        self.docs = {}    # type: Dict[str, Dict]
+        self.update(data)
+
+    def note(self, key: Any) -> None:
+        """Index *key* by the document of its current value."""
+        docname = self.getdocname(super().__getitem__(key))
+        if self.owners.get(key) != docname:
+            self.forget(key)
+            self.owners[key] = docname
+            self.docs.setdefault(docname, {})[key] = None
+
+    def forget(self, key: Any) -> None:
+        """Remove *key* from the index."""
+        docname = self.owners.pop(key, None)
+        if docname is not None:
+            keys = self.docs[docname]
+            del keys[key]
+            if not keys:
+                del self.docs[docname]
+
+    def pop_document(self, docname: str) -> List:
+        """Remove the entries of *docname* and return their keys."""
+        keys = list(self.docs.pop(docname, {}))
+        for key in keys:
+            del self.owners[key]
+            super().__delitem__(key)
+        return keys
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        super().__setitem__(key, value)
+        self.note(key)
+
+    def __delitem__(self, key: Any) -> None:
+        super().__delitem__(key)
+        self.forget(key)
+
+    def __ior__(self, other: Any) -> "DocumentEntries":
+        self.update(other)
+        return self
+
+    def __reduce_ex__(self, protocol: int) -> Any:
+        return dict, (dict(self),)
+
+    def clear(self) -> None:
+        super().clear()
+        self.owners.clear()
+        self.docs.clear()
+
+    def pop(self, key: Any, *args: Any) -> Any:
+        self.forget(key)
+        return super().pop(key, *args)
+
+    def popitem(self) -> Tuple[Any, Any]:
+        key, value = super().popitem()
+        self.forget(key)
+        return key, value
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args: Any, **kwargs: Any) -> None:  # type: ignore
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+
 class Domain:
     """
     A Domain is meant to be a group of "object" description directives for
@@ -198,6 +276,9 @@ class Domain:
     data = None             # type: Dict
     #: data version, bump this when the format of `self.data` changes
     data_version = 0
+    #: name of a dict in `self.data` -> function returning the docname of one
+    #: of its values; see :meth:`clear_document_entries`
+    document_data = {}      # type: Dict[str, Callable[[Any], str]]
 
     def __init__(self, env: "BuildEnvironment") -> None:
         self.env = env              # type: BuildEnvironment
@@ -300,6 +381,90 @@ class Domain:
                                   'to be able to do parallel builds!' %
                                   self.__class__)
 
+    def extract_domaindata(self, docnames: Set[str]) -> Dict:
+        """Return a new domaindata inventory that only contains the data
+        regarding *docnames*.
+
+        The result is passed to :meth:`merge_domaindata` of the main process
+        in parallel builds instead of the whole inventory.  The default
+        implementation merges the data of *docnames* into a fresh inventory.
+
+        .. versionadded:: 3.3
+        """
+        other = copy.copy(self)
+        other._reset_indices()
+        other.data = copy.deepcopy(self.initial_data)
+        other.data['version'] = self.data_version
+        for key, value in self.data.items():
+            # containers not in initial_data are created on first access
+            if isinstance(value, DocumentEntries):
+                other.data.setdefault(key, {})
+            elif key not in other.data and isinstance(value, (dict, list, set)):
+                other.data[key] = type(value)()
+        other.merge_domaindata(list(docnames), self.data)
+        return other.data
+
+    def _reset_indices(self) -> None:
+        """Drop the indices that subclasses derive from :attr:`data`; they are
+        built again on first use.  :meth:`extract_domaindata` calls this on its
+        shallow copy of the domain, so that the copy does not change the indices
+        of the domain.  The dicts listed in :attr:`document_data` carry their
+        own index, so there is nothing to drop here.
+        """
+
+    def _get_document_entries(self, name: str) -> DocumentEntries:
+        """Return the data dict *name*, indexed by document.  A plain dict,
+        e.g. a fresh or an unpickled one, is replaced by an indexed copy.
+        """
+        data = self.data.get(name)
+        if not isinstance(data, DocumentEntries):
+            data = self.data[name] = DocumentEntries(data or {}, self.document_data[name])
+        return data
+
+    def note_document_entry(self, name: str, key: Any) -> None:
+        """Note that the value of the entry *key* of the data dict *name* has
+        been changed in place.  The dicts listed in :attr:`document_data` index
+        their entries by document whenever they are set or removed, but not
+        when a value itself is changed so that it belongs to another document.
+
+        .. versionadded:: 3.3
+        """
+        data = self.data.get(name)
+        if isinstance(data, DocumentEntries) and key in data:
+            data.note(key)
+
+    def clear_document_entries(self, docname: str) -> Dict[str, List]:
+        """Remove the entries of *docname* from the data dicts listed in
+        :attr:`document_data` and return the removed keys per dict.
+
+        The dicts are indexed by document, so that this takes time
+        proportional to the number of entries of *docname* rather than to the
+        size of the dicts.  Call this from :meth:`clear_doc`.
+
+        .. versionadded:: 3.3
+        """
+        return {name: self._get_document_entries(name).pop_document(docname)
+                for name in self.document_data}
+
+    def merge_document_entries(self, docnames: Iterable[str], otherdata: Dict
+                               ) -> Dict[str, List]:
+        """Merge the entries of *docnames* from the data dicts listed in
+        :attr:`document_data` of *otherdata* and return the merged keys per
+        dict.  Call this from :meth:`merge_domaindata`.
+
+        .. versionadded:: 3.3
+        """
+        docnames = set(docnames)
+        merged = {}  # type: Dict[str, List]
+        for name, getdocname in self.document_data.items():
+            data = self._get_document_entries(name)
+            merged[name] = []
+            for key, value in otherdata.get(name, {}).items():
+                if getdocname(value) in docnames:
+                    data[key] = value
+                    merged[name].append(key)
+        return merged
+
     def process_doc(self, env: "BuildEnvironment", docname: str,
                     document: nodes.document) -> None:
         """Process a document after it is read by the environment."""
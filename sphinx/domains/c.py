@@ -9,8 +9,9 @@
 """
 
 import re
+from operator import itemgetter
 from typing import (
-    Any, Callable, Dict, Generator, Iterator, List, Type, TypeVar, Tuple, Union
+    Any, Callable, Dict, Generator, Iterable, Iterator, List, Set, Type, TypeVar, Tuple, Union
 )
 from typing import cast
 
@@ -1445,6 +1446,9 @@ class Symbol:
     debug_indent_string = "  "
     debug_lookup = False
     debug_show_tree = False
+    # on the root symbol: docname -> the symbols with a declaration from it,
+    # built by the first clear_doc()
+    _docSymbols = None  # type: Dict[str, Dict[Symbol, None]]
 
     def __copy__(self):
         assert False  # shouldn't happen
@@ -1456,6 +1460,15 @@ class Symbol:
             # the domain base class makes a copy of the initial data, which is fine
             return Symbol(None, None, None, None)
 
+    def __getstate__(self) -> Dict[str, Any]:
+        if self._docSymbols is None:
+            return self.__dict__
+        else:
+            # the index is rebuilt on demand
+            state = self.__dict__.copy()
+            del state['_docSymbols']
+            return state
+
     @staticmethod
     def debug_print(*args: Any) -> None:
         print(Symbol.debug_indent_string * Symbol.debug_indent, end="")
@@ -1488,18 +1501,35 @@ class Symbol:
         self.isRedeclaration = False
         self._assert_invariants()
 
+        # the string the lookups compare
+        self._name = str(ident) if ident is not None else None
+
         # Remember to modify Symbol.remove if modifications to the parent change.
         self._children = []  # type: List[Symbol]
         self._anonChildren = []  # type: List[Symbol]
         # note: _children includes _anonChildren
+        # _children by the string of their ident, in the same order
+        self._childrenByName = {}  # type: Dict[str, List[Symbol]]
+        # the position in _children of the parent, for ordering the lookup results
+        self._childIndex = 0
+        self._nextChildIndex = 0
         if self.parent:
-            self.parent._children.append(self)
+            self.parent._add_child(self)
         if self.declaration:
             self.declaration.symbol = self
+            self._index_declarations([self])
 
         # Do symbol addition after self._children has been initialised.
         self._add_function_params()
 
+    def _add_child(self, child: "Symbol") -> None:
+        child._childIndex = self._nextChildIndex
+        self._nextChildIndex += 1
+        self._children.append(child)
+        self._childrenByName.setdefault(child._name, []).append(child)
+        if child.ident.is_anon():
+            self._anonChildren.append(child)
+
     def _fill_empty(self, declaration: ASTDeclaration, docname: str) -> None:
         self._assert_invariants()
         assert not self.declaration
@@ -1510,6 +1540,7 @@ class Symbol:
         self.declaration.symbol = self
         self.docname = docname
         self._assert_invariants()
+        self._index_declarations([self])
         # and symbol addition should be done as well
         self._add_function_params()
 
@@ -1541,11 +1572,43 @@ class Symbol:
             return
         assert self in self.parent._children
         self.parent._children.remove(self)
+        namesakes = self.parent._childrenByName[self._name]
+        namesakes.remove(self)
+        if not namesakes:
+            del self.parent._childrenByName[self._name]
+        if self in self.parent._anonChildren:
+            self.parent._anonChildren.remove(self)
+        docSymbols = self._get_doc_index()
+        if docSymbols is not None:
+            for s in self.get_all_symbols():
+                docSymbols.get(s.docname, {}).pop(s, None)
         self.parent = None
 
+    def _get_doc_index(self) -> Dict[str, Dict["Symbol", None]]:
+        root = self
+        while root.parent:
+            root = root.parent
+        return root._docSymbols
+
+    def _index_declarations(self, symbols: Iterable["Symbol"]) -> None:
+        docSymbols = self._get_doc_index()
+        if docSymbols is not None:
+            for s in symbols:
+                if s.declaration:
+                    docSymbols.setdefault(s.docname, {})[s] = None
+
     def clear_doc(self, docname: str) -> None:
-        for sChild in self._children:
-            sChild.clear_doc(docname)
+        """Remove the declarations of *docname* from the descendants of this
+        symbol, which must be the root symbol.
+
+        The root keeps an index of the symbols by docname, so that only the
+        symbols of *docname* are visited.
+        """
+        assert self.parent is None
+        if self._docSymbols is None:
+            self._docSymbols = {}
+            self._index_declarations(self.get_all_symbols())
+        for sChild in self._docSymbols.pop(docname, {}):
             if sChild.declaration and sChild.docname == docname:
                 sChild.declaration = None
                 sChild.docname = None
@@ -1570,6 +1633,24 @@ class Symbol:
                 continue
             yield from c.children_recurse_anon
 
+    def _find_children(self, name: str, recurseInAnon: bool) -> Iterator["Symbol"]:
+        """Yield the children whose ident has the string *name*, in the order of
+        _children, or of children_recurse_anon if *recurseInAnon* is set.
+        """
+        children = self._childrenByName.get(name, [])
+        if not recurseInAnon or not self._anonChildren:
+            yield from children
+            return
+        # interleave them with the matches in the anonymous children
+        entries = [(c._childIndex, False, c) for c in children]
+        entries.extend((c._childIndex, True, c) for c in self._anonChildren)
+        entries.sort(key=lambda entry: entry[:2])
+        for index, recurse, c in entries:
+            if recurse:
+                yield from c._find_children(name, True)
+            else:
+                yield c
+
     def get_lookup_key(self) -> "LookupKey":
         # The pickle files for the environment and for each document are distinct.
         # The environment has all the symbols, but the documents has xrefs that
@@ -1629,6 +1710,8 @@ class Symbol:
             Symbol.debug_print("recurseInAnon:    ", recurseInAnon)
             Symbol.debug_print("searchInSiblings: ", searchInSiblings)
 
+        name = str(ident)
+
         def candidates() -> Generator["Symbol", None, None]:
             s = self
             if Symbol.debug_lookup:
@@ -1637,10 +1720,7 @@ class Symbol:
             while True:
                 if matchSelf:
                     yield s
-                if recurseInAnon:
-                    yield from s.children_recurse_anon
-                else:
-                    yield from s._children
+                yield from s._find_children(name, recurseInAnon)
 
                 if s.siblingAbove is None:
                     break
@@ -1898,19 +1978,37 @@ class Symbol:
 
     def merge_with(self, other: "Symbol", docnames: List[str],
                    env: "BuildEnvironment") -> None:
+        """Merge the declarations of *docnames* from the tree of *other*.
+
+        *other* may hold the declarations of more documents, e.g. of those that
+        a parallel reading process has read before; they are left out.
+        """
+        wanted = set()  # type: Set[Symbol]
+        for symbol in other.get_all_symbols():
+            if symbol.declaration and symbol.docname in docnames:
+                while symbol is not None and symbol not in wanted:
+                    wanted.add(symbol)
+                    symbol = symbol.parent
+        self._merge_with(other, docnames, env, wanted)
+
+    def _merge_with(self, other: "Symbol", docnames: List[str],
+                    env: "BuildEnvironment", wanted: Set["Symbol"]) -> None:
         if Symbol.debug_lookup:
             Symbol.debug_indent += 1
             Symbol.debug_print("merge_with:")
         assert other is not None
         for otherChild in other._children:
+            if otherChild not in wanted:
+                continue
             ourChild = self._find_first_named_symbol(
                 ident=otherChild.ident, matchSelf=False,
                 recurseInAnon=False)
             if ourChild is None:
                 # TODO: hmm, should we prune by docnames?
-                self._children.append(otherChild)
+                self._add_child(otherChild)
                 otherChild.parent = self
                 otherChild._assert_invariants()
+                self._index_declarations(otherChild.get_all_symbols())
                 continue
             if otherChild.declaration and otherChild.docname in docnames:
                 if not ourChild.declaration:
@@ -1926,7 +2024,7 @@ class Symbol:
                     # This can apparently happen, it should be safe to
                     # just ignore it, right?
                     pass
-            ourChild.merge_with(otherChild, docnames, env)
+            ourChild._merge_with(otherChild, docnames, env, wanted)
         if Symbol.debug_lookup:
             Symbol.debug_indent -= 1
 
@@ -1973,8 +2071,7 @@ class Symbol:
                 Symbol.debug_indent -= 2
             if matchSelf and current.ident == ident:
                 return current
-            children = current.children_recurse_anon if recurseInAnon else current._children
-            for s in children:
+            for s in current._find_children(str(ident), recurseInAnon):
                 if s.ident == ident:
                     return s
             if not searchInSiblings:
@@ -1990,7 +2087,7 @@ class Symbol:
         s = self
         for name, id_ in key.data:
             res = None
-            for cand in s._children:
+            for cand in s._find_children(str(name), False):
                 if cand.ident == name:
                     res = cand
                     break
@@ -3644,6 +3741,9 @@ class CDomain(Domain):
         'root_symbol': Symbol(None, None, None, None),
         'objects': {},  # fullname -> docname, node_id, objtype
     }  # type: Dict[str, Union[Symbol, Dict[str, Tuple[str, str, str]]]]
+    document_data = {
+        'objects': itemgetter(0),
+    }
 
     @property
     def objects(self) -> Dict[str, Tuple[str, str, str]]:
@@ -3664,9 +3764,7 @@ class CDomain(Domain):
             print(self.data['root_symbol'].dump(1))
             print("\tafter end")
             print("clear_doc end:", docname)
-        for fullname, (fn, _id, _l) in list(self.objects.items()):
-            if fn == docname:
-                del self.objects[fullname]
+        self.clear_document_entries(docname)
 
     def process_doc(self, env: BuildEnvironment, docname: str,
                     document: nodes.document) -> None:
@@ -3678,6 +3776,11 @@ class CDomain(Domain):
     def process_field_xref(self, pnode: pending_xref) -> None:
         pnode.attributes.update(self.env.ref_context)
 
+    def extract_domaindata(self, docnames: Set[str]) -> Dict:
+        # merge_with() takes over the symbols of the other tree,
+        # so the whole inventory is handed over
+        return self.data
+
     def merge_domaindata(self, docnames: List[str], otherdata: Dict) -> None:
         if Symbol.debug_show_tree:
             print("merge_domaindata:")
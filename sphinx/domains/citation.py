@@ -8,6 +8,7 @@
     :license: BSD, see LICENSE for details.
 """
 
+from operator import itemgetter
 from typing import Any, Dict, List, Set, Tuple
 from typing import cast
 
@@ -40,6 +41,9 @@ class CitationDomain(Domain):
     dangling_warnings = {
         'ref': 'citation not found: %(target)s',
     }
+    document_data = {
+        'citations': itemgetter(0),
+    }
 
     @property
     def citations(self) -> Dict[str, Tuple[str, str, int]]:
@@ -50,9 +54,7 @@ class CitationDomain(Domain):
         return self.data.setdefault('citation_refs', {})
 
     def clear_doc(self, docname: str) -> None:
-        for key, (fn, _l, lineno) in list(self.citations.items()):
-            if fn == docname:
-                del self.citations[key]
+        self.clear_document_entries(docname)
         for key, docnames in list(self.citation_refs.items()):
             if docnames == {docname}:
                 del self.citation_refs[key]
@@ -61,9 +63,7 @@ class CitationDomain(Domain):
 
     def merge_domaindata(self, docnames: List[str], otherdata: Dict) -> None:
         # XXX duplicates?
-        for key, data in otherdata['citations'].items():
-            if data[0] in docnames:
-                self.citations[key] = data
+        self.merge_document_entries(docnames, otherdata)
         for key, data in otherdata['citation_refs'].items():
             citation_refs = self.citation_refs.setdefault(key, set())
             for docname in data:
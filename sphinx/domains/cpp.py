@@ -8,9 +8,12 @@
     :license: BSD, see LICENSE for details.
 """
 
+import os
+import pickle
 import re
 from typing import (
-    Any, Callable, Dict, Generator, Iterator, List, Tuple, Type, TypeVar, Union, Optional
+    Any, Callable, Dict, Generator, Iterable, Iterator, List, Set, Tuple, Type, TypeVar, Union,
+    Optional, cast
 )
 
 from docutils import nodes
@@ -30,6 +33,7 @@ from sphinx.roles import SphinxRole, XRefRole
 from sphinx.transforms import SphinxTransform
 from sphinx.transforms.post_transforms import ReferencesResolver
 from sphinx.util import logging
+from sphinx.util.build_phase import BuildPhase
 from sphinx.util.cfamily import (
     NoOldIdError, ASTBaseBase, ASTAttribute, ASTBaseParenExprList,
     verify_description_mode, StringifyTransform,
@@ -3612,6 +3616,11 @@ class ASTDeclaration(ASTBase):
         # set by CPPObject._add_enumerator_to_parent
         self.enumeratorScopedSymbol = None  # type: Symbol
 
+        # the ids depend on the symbols, so they are cached for the symbols
+        # they were computed with
+        self._ids = {}  # type: Dict[Tuple[int, bool], str]
+        self._idsSymbols = (None, None)  # type: Tuple[Symbol, Symbol]
+
     def clone(self) -> "ASTDeclaration":
         templatePrefixClone = self.templatePrefix.clone() if self.templatePrefix else None
         requiresClasueClone = self.requiresClause.clone() if self.requiresClause else None
@@ -3633,6 +3642,16 @@ class ASTDeclaration(ASTBase):
         return self.declaration.function_params
 
     def get_id(self, version: int, prefixed: bool = True) -> str:
+        symbols = self._idsSymbols
+        if symbols[0] is not self.symbol or symbols[1] is not self.enumeratorScopedSymbol:
+            self._ids = {}
+            self._idsSymbols = (self.symbol, self.enumeratorScopedSymbol)
+        key = (version, prefixed)
+        if key not in self._ids:
+            self._ids[key] = self._get_id(version, prefixed)
+        return self._ids[key]
+
+    def _get_id(self, version: int, prefixed: bool) -> str:
         if version == 1:
             if self.templatePrefix:
                 raise NoOldIdError()
@@ -3789,6 +3808,9 @@ class Symbol:
     debug_indent_string = "  "
     debug_lookup = False  # overridden by the corresponding config value
     debug_show_tree = False  # overridden by the corresponding config value
+    # on the root symbol: docname -> the symbols with a declaration from it,
+    # built by the first clear_doc()
+    _docSymbols = None  # type: Dict[str, Dict[Symbol, None]]
 
     def __copy__(self):
         assert False  # shouldn't happen
@@ -3800,6 +3822,15 @@ class Symbol:
             # the domain base class makes a copy of the initial data, which is fine
             return Symbol(None, None, None, None, None, None)
 
+    def __getstate__(self) -> Dict[str, Any]:
+        if self._docSymbols is None:
+            return self.__dict__
+        else:
+            # the index is rebuilt on demand
+            state = self.__dict__.copy()
+            del state['_docSymbols']
+            return state
+
     @staticmethod
     def debug_print(*args: Any) -> None:
         print(Symbol.debug_indent_string * Symbol.debug_indent, end="")
@@ -3838,18 +3869,37 @@ class Symbol:
         self.isRedeclaration = False
         self._assert_invariants()
 
+        # the strings the lookups compare
+        self._name = str(identOrOp) if identOrOp is not None else None
+        self._templateParamsStr = str(templateParams) if templateParams else None
+        self._templateArgsStr = str(templateArgs) if templateArgs else None
+
         # Remember to modify Symbol.remove if modifications to the parent change.
         self._children = []  # type: List[Symbol]
         self._anonChildren = []  # type: List[Symbol]
         # note: _children includes _anonChildren
+        # _children by the string of their identOrOp, in the same order
+        self._childrenByName = {}  # type: Dict[str, List[Symbol]]
+        # the position in _children of the parent, for ordering the lookup results
+        self._childIndex = 0
+        self._nextChildIndex = 0
         if self.parent:
-            self.parent._children.append(self)
+            self.parent._add_child(self)
         if self.declaration:
             self.declaration.symbol = self
+            self._index_declarations([self])
 
         # Do symbol addition after self._children has been initialised.
         self._add_template_and_function_params()
 
+    def _add_child(self, child: "Symbol") -> None:
+        child._childIndex = self._nextChildIndex
+        self._nextChildIndex += 1
+        self._children.append(child)
+        self._childrenByName.setdefault(child._name, []).append(child)
+        if child.identOrOp.is_anon():
+            self._anonChildren.append(child)
+
     def _fill_empty(self, declaration: ASTDeclaration, docname: str) -> None:
         self._assert_invariants()
         assert not self.declaration
@@ -3860,6 +3910,7 @@ class Symbol:
         self.declaration.symbol = self
         self.docname = docname
         self._assert_invariants()
+        self._index_declarations([self])
         # and symbol addition should be done as well
         self._add_template_and_function_params()
 
@@ -3904,12 +3955,43 @@ class Symbol:
             return
         assert self in self.parent._children
         self.parent._children.remove(self)
+        namesakes = self.parent._childrenByName[self._name]
+        namesakes.remove(self)
+        if not namesakes:
+            del self.parent._childrenByName[self._name]
+        if self in self.parent._anonChildren:
+            self.parent._anonChildren.remove(self)
+        docSymbols = self._get_doc_index()
+        if docSymbols is not None:
+            for s in self.get_all_symbols():
+                docSymbols.get(s.docname, {}).pop(s, None)
         self.parent = None
 
+    def _get_doc_index(self) -> Dict[str, Dict["Symbol", None]]:
+        root = self
+        while root.parent:
+            root = root.parent
+        return root._docSymbols
+
+    def _index_declarations(self, symbols: Iterable["Symbol"]) -> None:
+        docSymbols = self._get_doc_index()
+        if docSymbols is not None:
+            for s in symbols:
+                if s.declaration:
+                    docSymbols.setdefault(s.docname, {})[s] = None
+
     def clear_doc(self, docname: str) -> None:
-        newChildren = []  # type: List[Symbol]
-        for sChild in self._children:
-            sChild.clear_doc(docname)
+        """Remove the declarations of *docname* from the descendants of this
+        symbol, which must be the root symbol.
+
+        The root keeps an index of the symbols by docname, so that only the
+        symbols of *docname* are visited.
+        """
+        assert self.parent is None
+        if self._docSymbols is None:
+            self._docSymbols = {}
+            self._index_declarations(self.get_all_symbols())
+        for sChild in self._docSymbols.pop(docname, {}):
             if sChild.declaration and sChild.docname == docname:
                 sChild.declaration = None
                 sChild.docname = None
@@ -3919,8 +4001,6 @@ class Symbol:
                     sChild.siblingBelow.siblingAbove = sChild.siblingAbove
                 sChild.siblingAbove = None
                 sChild.siblingBelow = None
-            newChildren.append(sChild)
-        self._children = newChildren
 
     def get_all_symbols(self) -> Iterator[Any]:
         yield self
@@ -3937,6 +4017,24 @@ class Symbol:
 
             yield from c.children_recurse_anon
 
+    def _find_children(self, name: str, recurseInAnon: bool) -> Iterator["Symbol"]:
+        """Yield the children whose identOrOp has the string *name*, in the order of
+        _children, or of children_recurse_anon if *recurseInAnon* is set.
+        """
+        children = self._childrenByName.get(name, [])
+        if not recurseInAnon or not self._anonChildren:
+            yield from children
+            return
+        # interleave them with the matches in the anonymous children
+        entries = [(c._childIndex, False, c) for c in children]
+        entries.extend((c._childIndex, True, c) for c in self._anonChildren)
+        entries.sort(key=lambda entry: entry[:2])
+        for index, recurse, c in entries:
+            if recurse:
+                yield from c._find_children(name, True)
+            else:
+                yield c
+
     def get_lookup_key(self) -> "LookupKey":
         # The pickle files for the environment and for each document are distinct.
         # The environment has all the symbols, but the documents has xrefs that
@@ -4036,6 +4134,10 @@ class Symbol:
                 if not isSpecialization():
                     templateArgs = None
 
+        name = str(identOrOp)
+        templateParamsStr = str(templateParams) if templateParams else None
+        templateArgsStr = str(templateArgs) if templateArgs else None
+
         def matches(s: "Symbol") -> bool:
             if s.identOrOp != identOrOp:
                 return False
@@ -4048,13 +4150,13 @@ class Symbol:
                     return False
             if templateParams:
                 # TODO: do better comparison
-                if str(s.templateParams) != str(templateParams):
+                if s._templateParamsStr != templateParamsStr:
                     return False
             if (s.templateArgs is None) != (templateArgs is None):
                 return False
             if s.templateArgs:
                 # TODO: do better comparison
-                if str(s.templateArgs) != str(templateArgs):
+                if s._templateArgsStr != templateArgsStr:
                     return False
             return True
 
@@ -4066,10 +4168,7 @@ class Symbol:
             while True:
                 if matchSelf:
                     yield s
-                if recurseInAnon:
-                    yield from s.children_recurse_anon
-                else:
-                    yield from s._children
+                yield from s._find_children(name, recurseInAnon)
 
                 if s.siblingAbove is None:
                     break
@@ -4396,6 +4495,21 @@ class Symbol:
 
     def merge_with(self, other: "Symbol", docnames: List[str],
                    env: "BuildEnvironment") -> None:
+        """Merge the declarations of *docnames* from the tree of *other*.
+
+        *other* may hold the declarations of more documents, e.g. of those that
+        a parallel reading process has read before; they are left out.
+        """
+        wanted = set()  # type: Set[Symbol]
+        for symbol in other.get_all_symbols():
+            if symbol.declaration and symbol.docname in docnames:
+                while symbol is not None and symbol not in wanted:
+                    wanted.add(symbol)
+                    symbol = symbol.parent
+        self._merge_with(other, docnames, env, wanted)
+
+    def _merge_with(self, other: "Symbol", docnames: List[str],
+                    env: "BuildEnvironment", wanted: Set["Symbol"]) -> None:
         if Symbol.debug_lookup:
             Symbol.debug_indent += 1
             Symbol.debug_print("merge_with:")
@@ -4403,13 +4517,16 @@ class Symbol:
 
         def unconditionalAdd(self, otherChild):
             # TODO: hmm, should we prune by docnames?
-            self._children.append(otherChild)
+            self._add_child(otherChild)
             otherChild.parent = self
             otherChild._assert_invariants()
+            self._index_declarations(otherChild.get_all_symbols())
 
         if Symbol.debug_lookup:
             Symbol.debug_indent += 1
         for otherChild in other._children:
+            if otherChild not in wanted:
+                continue
             if Symbol.debug_lookup:
                 Symbol.debug_print("otherChild:\n", otherChild.to_string(Symbol.debug_indent))
                 Symbol.debug_indent += 1
@@ -4486,7 +4603,7 @@ class Symbol:
                     msg += "ourChild:\n" + ourChild.to_string(1)
                     msg += "\notherChild:\n" + otherChild.to_string(1)
                     logger.warning(msg, location=otherChild.docname)
-            ourChild.merge_with(otherChild, docnames, env)
+            ourChild._merge_with(otherChild, docnames, env, wanted)
         if Symbol.debug_lookup:
             Symbol.debug_indent -= 2
 
@@ -4543,8 +4660,7 @@ class Symbol:
                 Symbol.debug_indent -= 2
             if matchSelf and current.identOrOp == identOrOp:
                 return current
-            children = current.children_recurse_anon if recurseInAnon else current._children
-            for s in children:
+            for s in current._find_children(str(identOrOp), recurseInAnon):
                 if s.identOrOp == identOrOp:
                     return s
             if not searchInSiblings:
@@ -4561,7 +4677,7 @@ class Symbol:
         for name, templateParams, id_ in key.data:
             if id_ is not None:
                 res = None
-                for cand in s._children:
+                for cand in s._find_children(str(name.identOrOp), False):
                     if cand.declaration is None:
                         continue
                     if cand.declaration.get_newest_id() == id_:
@@ -6831,10 +6947,18 @@ class CPPObject(ObjectDescription):
     def handle_signature(self, sig: str, signode: desc_signature) -> ASTDeclaration:
         parentSymbol = self.env.temp_data['cpp:parent_symbol']
 
-        parser = DefinitionParser(sig, location=signode, config=self.env.config)
-        try:
+        def parse(parser: DefinitionParser) -> ASTDeclaration:
             ast = self.parse_definition(parser)
             parser.assert_end()
+            return ast
+
+        parser = DefinitionParser(sig, location=signode, config=self.env.config)
+        try:
+            if type(self).parse_definition is CPPObject.parse_definition:
+                domain = cast(CPPDomain, self.env.get_domain('cpp'))
+                ast = domain.parse(parser, (self.object_type, self.objtype), parse)
+            else:
+                ast = parse(parser)
         except DefinitionError as e:
             logger.warning(e, location=signode)
             # It is easier to assume some phony name than handling the error in
@@ -7201,7 +7325,8 @@ class CPPExprRole(SphinxRole):
         # attempt to mimic XRefRole classes, except that...
         classes = ['xref', 'cpp', self.class_type]
         try:
-            ast = parser.parse_expression()
+            domain = cast(CPPDomain, self.env.get_domain('cpp'))
+            ast = domain.parse(parser, 'expression', DefinitionParser.parse_expression)
         except DefinitionError as ex:
             logger.warning('Unparseable C++ expression: %r\n%s', text, ex,
                            location=self.get_source_info())
@@ -7280,9 +7405,60 @@ class CPPDomain(Domain):
     }
     initial_data = {
         'root_symbol': Symbol(None, None, None, None, None, None),
-        'names': {}  # full name for indexing -> docname
+        'names': {},  # full name for indexing -> docname
+        'parse_cache': {},  # (kind, definition, attributes) -> pickled AST
+    }
+    document_data = {
+        'names': lambda docname: docname,
     }
 
+    #: the maximum number of ASTs kept in the parse cache
+    parse_cache_size = 10000
+
+    def __init__(self, env: BuildEnvironment) -> None:
+        super().__init__(env)
+        # the ASTs parsed in a worker process of a parallel read, which are
+        # sent back to the main process with the domain data; the worker
+        # processes of other phases send back no domain data
+        self._pid = os.getpid()
+        self._new_parses = {}  # type: Dict[Tuple, bytes]
+
+    @property
+    def parse_cache(self) -> Dict[Tuple, bytes]:
+        return self.data.setdefault('parse_cache', {})
+
+    def parse(self, parser: DefinitionParser, kind: Any,
+              parse: Callable[[DefinitionParser], Any]) -> Any:
+        """Return ``parse(parser)``, the AST of the definition of *parser*.
+
+        The ASTs are cached in the environment by *kind*, the definition and the
+        attribute configuration, so that a definition that occurs again, in the
+        same or in a later build, is not parsed again.  Each call returns a
+        fresh copy of the AST, as the callers modify it.  Definitions that fail
+        to parse or give warnings are not cached.
+        """
+        key = (kind, parser.definition,
+               tuple(parser.id_attributes), tuple(parser.paren_attributes))
+        cache = self.parse_cache
+        content = cache.pop(key, None)
+        if content is not None:
+            cache[key] = content  # most recently used
+            return pickle.loads(content)
+
+        ast = parse(parser)
+        if not parser.warned:
+            content = pickle.dumps(ast, pickle.HIGHEST_PROTOCOL)
+            self._add_parse(key, content)
+            if os.getpid() != self._pid and self.env.app.phase == BuildPhase.READING:
+                self._new_parses[key] = content
+        return ast
+
+    def _add_parse(self, key: Tuple, content: bytes) -> None:
+        cache = self.parse_cache
+        cache[key] = content
+        while len(cache) > self.parse_cache_size:
+            del cache[next(iter(cache))]
+
     def clear_doc(self, docname: str) -> None:
         if Symbol.debug_show_tree:
             print("clear_doc:", docname)
@@ -7298,9 +7474,7 @@ class CPPDomain(Domain):
             print(self.data['root_symbol'].dump(1))
             print("\tafter end")
             print("clear_doc end:", docname)
-        for name, nDocname in list(self.data['names'].items()):
-            if nDocname == docname:
-                del self.data['names'][name]
+        self.clear_document_entries(docname)
 
     def process_doc(self, env: BuildEnvironment, docname: str,
                     document: nodes.document) -> None:
@@ -7312,6 +7486,14 @@ class CPPDomain(Domain):
     def process_field_xref(self, pnode: pending_xref) -> None:
         pnode.attributes.update(self.env.ref_context)
 
+    def extract_domaindata(self, docnames: Set[str]) -> Dict:
+        # merge_with() takes over the symbols of the other tree,
+        # so the whole inventory is handed over, except for the ASTs
+        # that were parsed before
+        data = dict(self.data, parse_cache=self._new_parses)
+        self._new_parses = {}
+        return data
+
     def merge_domaindata(self, docnames: List[str], otherdata: Dict) -> None:
         if Symbol.debug_show_tree:
             print("merge_domaindata:")
@@ -7330,6 +7512,8 @@ class CPPDomain(Domain):
                 if name not in ourNames:
                     ourNames[name] = docname
                 # no need to warn on duplicates, the symbol merge already does that
+        for key, content in otherdata.get('parse_cache', {}).items():
+            self._add_parse(key, content)
         if Symbol.debug_show_tree:
             print("\tresult:")
             print(self.data['root_symbol'].dump(1))
@@ -7344,7 +7528,7 @@ class CPPDomain(Domain):
             target += '()'
         parser = DefinitionParser(target, location=node, config=env.config)
         try:
-            ast, isShorthand = parser.parse_xref_object()
+            ast, isShorthand = self.parse(parser, 'xref', DefinitionParser.parse_xref_object)
         except DefinitionError as e:
             # as arg to stop flake8 from complaining
             def findWarning(e: Exception) -> Tuple[str, Exception]:
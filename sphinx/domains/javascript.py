@@ -8,6 +8,7 @@
     :license: BSD, see LICENSE for details.
 """
 
+from operator import itemgetter
 from typing import Any, Dict, Iterator, List, Tuple
 from typing import cast
 
@@ -351,6 +352,10 @@ class JavaScriptDomain(Domain):
         'objects': {},  # fullname -> docname, node_id, objtype
         'modules': {},  # modname  -> docname, node_id
     }  # type: Dict[str, Dict[str, Tuple[str, str]]]
+    document_data = {
+        'objects': itemgetter(0),
+        'modules': itemgetter(0),
+    }
 
     @property
     def objects(self) -> Dict[str, Tuple[str, str, str]]:
@@ -372,21 +377,11 @@ class JavaScriptDomain(Domain):
         self.modules[modname] = (self.env.docname, node_id)
 
     def clear_doc(self, docname: str) -> None:
-        for fullname, (pkg_docname, node_id, _l) in list(self.objects.items()):
-            if pkg_docname == docname:
-                del self.objects[fullname]
-        for modname, (pkg_docname, node_id) in list(self.modules.items()):
-            if pkg_docname == docname:
-                del self.modules[modname]
+        self.clear_document_entries(docname)
 
     def merge_domaindata(self, docnames: List[str], otherdata: Dict) -> None:
         # XXX check duplicates
-        for fullname, (fn, node_id, objtype) in otherdata['objects'].items():
-            if fn in docnames:
-                self.objects[fullname] = (fn, node_id, objtype)
-        for mod_name, (pkg_docname, node_id) in otherdata['modules'].items():
-            if pkg_docname in docnames:
-                self.modules[mod_name] = (pkg_docname, node_id)
+        self.merge_document_entries(docnames, otherdata)
 
     def find_obj(self, env: BuildEnvironment, mod_name: str, prefix: str, name: str,
                  typ: str, searchorder: int = 0) -> Tuple[str, Tuple[str, str, str]]:
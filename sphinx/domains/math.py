@@ -9,6 +9,7 @@
 """
 
 import warnings
+from operator import itemgetter
 from typing import Any, Dict, Iterable, List, Tuple
 
 from docutils import nodes
@@ -49,6 +50,9 @@ class MathDomain(Domain):
         'objects': {},  # labelid -> (docname, eqno)
         'has_equations': {},  # docname -> bool
     }  # type: Dict
+    document_data = {
+        'objects': itemgetter(0),
+    }
     dangling_warnings = {
         'eq': 'equation not found: %(target)s',
     }
@@ -85,17 +89,11 @@ class MathDomain(Domain):
         self.data['has_equations'][docname] = any(document.traverse(math_node))
 
     def clear_doc(self, docname: str) -> None:
-        for equation_id, (doc, eqno) in list(self.equations.items()):
-            if doc == docname:
-                del self.equations[equation_id]
-
+        self.clear_document_entries(docname)
         self.data['has_equations'].pop(docname, None)
 
     def merge_domaindata(self, docnames: Iterable[str], otherdata: Dict) -> None:
-        for labelid, (doc, eqno) in otherdata['objects'].items():
-            if doc in docnames:
-                self.equations[labelid] = (doc, eqno)
-
+        self.merge_document_entries(docnames, otherdata)
         for docname in docnames:
             self.data['has_equations'][docname] = otherdata['has_equations'][docname]
 
@@ -15,6 +15,7 @@ import sys
 import typing
 import warnings
 from inspect import Parameter
+from operator import attrgetter
 from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Tuple
 from typing import cast
 
@@ -1186,11 +1187,46 @@ class PythonDomain(Domain):
     indices = [
         PythonModuleIndex,
     ]
+    document_data = {
+        'objects': attrgetter('docname'),
+        'modules': attrgetter('docname'),
+    }
+
+    # the full names of the objects by the last component of their names,
+    # for the "fuzzy" search of find_obj(); built on first use
+    _object_names = None  # type: Dict[str, Dict[str, None]]
 
     @property
     def objects(self) -> Dict[str, ObjectEntry]:
         return self.data.setdefault('objects', {})  # fullname -> ObjectEntry
 
+    def _reset_indices(self) -> None:
+        super()._reset_indices()
+        self._object_names = None
+
+    def _get_object_names(self, name: str) -> Iterable[str]:
+        """Return the full names of the objects whose last name component is
+        the last component of *name*, in the order of :attr:`objects`.
+        """
+        if self._object_names is None:
+            self._object_names = {}
+            for fullname in self.objects:
+                self._add_object_name(fullname)
+        return self._object_names.get(name.rpartition('.')[2], {})
+
+    def _add_object_name(self, fullname: str) -> None:
+        if self._object_names is not None:
+            shortname = fullname.rpartition('.')[2]
+            self._object_names.setdefault(shortname, {})[fullname] = None
+
+    def _remove_object_name(self, fullname: str) -> None:
+        if self._object_names is not None:
+            shortname = fullname.rpartition('.')[2]
+            fullnames = self._object_names.get(shortname, {})
+            fullnames.pop(fullname, None)
+            if not fullnames:
+                self._object_names.pop(shortname, None)
+
     def note_object(self, name: str, objtype: str, node_id: str, location: Any = None) -> None:
         """Note a python object for cross reference.
 
@@ -1202,6 +1238,7 @@ class PythonDomain(Domain):
                               'other instance in %s, use :noindex: for one of them'),
                            name, other.docname, location=location)
         self.objects[name] = ObjectEntry(self.env.docname, node_id, objtype)
+        self._add_object_name(name)
 
     @property
     def modules(self) -> Dict[str, ModuleEntry]:
@@ -1217,21 +1254,13 @@ class PythonDomain(Domain):
                                          synopsis, platform, deprecated)
 
     def clear_doc(self, docname: str) -> None:
-        for fullname, obj in list(self.objects.items()):
-            if obj.docname == docname:
-                del self.objects[fullname]
-        for modname, mod in list(self.modules.items()):
-            if mod.docname == docname:
-                del self.modules[modname]
+        for fullname in self.clear_document_entries(docname)['objects']:
+            self._remove_object_name(fullname)
 
     def merge_domaindata(self, docnames: List[str], otherdata: Dict) -> None:
         # XXX check duplicates?
-        for fullname, obj in otherdata['objects'].items():
-            if obj.docname in docnames:
-                self.objects[fullname] = obj
-        for modname, mod in otherdata['modules'].items():
-            if mod.docname in docnames:
-                self.modules[modname] = mod
+        for fullname in self.merge_document_entries(docnames, otherdata)['objects']:
+            self._add_object_name(fullname)
 
     def find_obj(self, env: BuildEnvironment, modname: str, classname: str,
                  name: str, type: str, searchmode: int = 0
@@ -1268,7 +1297,8 @@ class PythonDomain(Domain):
                     else:
                         # "fuzzy" searching mode
                         searchname = '.' + name
-                        matches = [(oname, self.objects[oname]) for oname in self.objects
+                        matches = [(oname, self.objects[oname])
+                                   for oname in self._get_object_names(name)
                                    if oname.endswith(searchname) and
                                    self.objects[oname].objtype in objtypes]
         else:
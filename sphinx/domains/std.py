@@ -12,6 +12,7 @@ import re
 import unicodedata
 import warnings
 from copy import copy
+from operator import itemgetter
 from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from typing import cast
 
@@ -607,6 +608,13 @@ class StandardDomain(Domain):
         },
     }
 
+    document_data = {
+        'progoptions': itemgetter(0),
+        'objects': itemgetter(0),
+        'labels': itemgetter(0),
+        'anonlabels': itemgetter(0),
+    }
+
     dangling_warnings = {
         'term': 'term not in glossary: %(target)s',
         'ref':  'undefined label: %(target)s (if the link has no caption '
@@ -689,34 +697,11 @@ class StandardDomain(Domain):
         return self.data.setdefault('anonlabels', {})  # labelname -> docname, labelid
 
     def clear_doc(self, docname: str) -> None:
-        key = None  # type: Any
-        for key, (fn, _l) in list(self.progoptions.items()):
-            if fn == docname:
-                del self.progoptions[key]
-        for key, (fn, _l) in list(self.objects.items()):
-            if fn == docname:
-                del self.objects[key]
-        for key, (fn, _l, _l) in list(self.labels.items()):
-            if fn == docname:
-                del self.labels[key]
-        for key, (fn, _l) in list(self.anonlabels.items()):
-            if fn == docname:
-                del self.anonlabels[key]
+        self.clear_document_entries(docname)
 
     def merge_domaindata(self, docnames: List[str], otherdata: Dict) -> None:
         # XXX duplicates?
-        for key, data in otherdata['progoptions'].items():
-            if data[0] in docnames:
-                self.progoptions[key] = data
-        for key, data in otherdata['objects'].items():
-            if data[0] in docnames:
-                self.objects[key] = data
-        for key, data in otherdata['labels'].items():
-            if data[0] in docnames:
-                self.labels[key] = data
-        for key, data in otherdata['anonlabels'].items():
-            if data[0] in docnames:
-                self.anonlabels[key] = data
+        self.merge_document_entries(docnames, otherdata)
 
     def process_doc(self, env: "BuildEnvironment", docname: str, document: nodes.document) -> None:  # NOQA
         for name, explicit in document.nametypes.items():
@@ -9,22 +9,23 @@
 """
 
 import os
-import pickle
 import warnings
 from collections import defaultdict
 from copy import copy
 from os import path
-from typing import Any, Callable, Dict, Generator, Iterator, List, Set, Tuple, Union
+from typing import Any, Callable, Dict, Generator, Iterable, Iterator, List, Set, Tuple, Union
 from typing import cast
 
 from docutils import nodes
 from docutils.nodes import Node
 
-from sphinx import addnodes
+from sphinx import __version__, addnodes
 from sphinx.config import Config
 from sphinx.deprecation import RemovedInSphinx40Warning
 from sphinx.domains import Domain
 from sphinx.environment.adapters.toctree import TocTree
+from sphinx.environment.digests import Stamp, restamp_files, stamp_files
+from sphinx.environment.doctrees import DoctreeCache, DoctreeSerializer
 from sphinx.errors import SphinxError, BuildEnvironmentError, DocumentError, ExtensionError
 from sphinx.events import EventManager
 from sphinx.locale import __
@@ -61,7 +62,10 @@ default_settings = {
 
 # This is increased every time an environment attribute is added
 # or changed to properly invalidate pickle files.
-ENV_VERSION = 56
+ENV_VERSION = 59
+
+# stamped on the doctree files; doctrees written by another version are reread
+DOCTREE_VERSION = '%s/%d' % (__version__, ENV_VERSION)
 
 # config status
 CONFIG_OK = 1
@@ -121,9 +125,16 @@ class BuildEnvironment:
         self.all_docs = {}          # type: Dict[str, float]
                                     # docname -> mtime at the time of reading
                                     # contains all read docnames
+        self.read_durations = {}    # type: Dict[str, float]
+                                    # docname -> seconds taken to read it,
+                                    # used to balance parallel builds
         self.dependencies = defaultdict(set)    # type: Dict[str, Set[str]]
                                     # docname -> set of dependent file
                                     # names, relative to documentation root
+        self.source_stamps = {}     # type: Dict[str, Dict[str, Stamp]]
+                                    # docname -> file name of the source and
+                                    # the dependencies -> (mtime, size, digest)
+                                    # for source_change_detection = 'content'
         self.included = defaultdict(set)        # type: Dict[str, Set[str]]
                                     # docname -> set of included file
                                     # docnames included from other documents
@@ -176,6 +187,11 @@ class BuildEnvironment:
         # the original URI for images
         self.original_image_uri = {}  # type: Dict[str, str]
 
+        # in-memory cache of the content of the doctree files (not pickled)
+        self.doctree_cache = DoctreeCache(0)
+        # converts the doctrees to the content of the doctree files (not pickled)
+        self.doctree_serializer = DoctreeSerializer(DOCTREE_VERSION)
+
         # temporary data storage while reading a document
         self.temp_data = {}         # type: Dict[str, Any]
         # context for cross-references (e.g. current module or class)
@@ -190,7 +206,8 @@ class BuildEnvironment:
     def __getstate__(self) -> Dict:
         """Obtains serializable data for pickling."""
         __dict__ = self.__dict__.copy()
-        __dict__.update(app=None, domains={}, events=None)  # clear unpickable attributes
+        __dict__.update(app=None, domains={}, events=None,  # clear unpickable attributes
+                        doctree_cache=None, doctree_serializer=None)
         return __dict__
 
     def __setstate__(self, state: Dict) -> None:
@@ -225,6 +242,10 @@ class BuildEnvironment:
         # initialize config
         self._update_config(app.config)
 
+        self.doctree_cache = DoctreeCache(app.config.doctree_cache_size * 1024 * 1024)
+        self.doctree_serializer = DoctreeSerializer(DOCTREE_VERSION,
+                                                    app.config.doctree_compression)
+
         # initialie settings
         self._update_settings(app.config)
 
@@ -291,11 +312,15 @@ class BuildEnvironment:
         if docname in self.all_docs:
             self.all_docs.pop(docname, None)
             self.included.pop(docname, None)
+            self.source_stamps.pop(docname, None)
+            self.read_durations.pop(docname, None)
             self.reread_always.discard(docname)
 
         for domain in self.domains.values():
             domain.clear_doc(docname)
 
+        self.doctree_cache.discard(docname)
+
     def merge_info_from(self, docnames: List[str], other: "BuildEnvironment",
                         app: "Sphinx") -> None:
         """Merge global information gathered about *docnames* while reading them
@@ -307,6 +332,10 @@ class BuildEnvironment:
         for docname in docnames:
             self.all_docs[docname] = other.all_docs[docname]
             self.included[docname] = other.included[docname]
+            if docname in other.read_durations:
+                self.read_durations[docname] = other.read_durations[docname]
+            if docname in other.source_stamps:
+                self.source_stamps[docname] = other.source_stamps[docname]
             if docname in other.reread_always:
                 self.reread_always.add(docname)
 
@@ -314,6 +343,67 @@ class BuildEnvironment:
             domain.merge_domaindata(docnames, other.domaindata[domainname])
         self.events.emit('env-merge-info', self, docnames, other)
 
+    def extract_info(self, docnames: Iterable[str]) -> "BuildEnvironment":
+        """Return a copy of the environment that only contains the information
+        gathered about *docnames*.
+
+        The result can be passed to :meth:`merge_info_from` of another
+        environment.  It is used by parallel read processes to send back
+        their results without pickling the whole environment.
+        """
+        docnames = set(docnames)
+
+        def only(mapping: Dict[str, Any], result: Dict[str, Any] = None) -> Dict[str, Any]:
+            if result is None:
+                result = {}
+            for docname in docnames & mapping.keys():
+                result[docname] = mapping[docname]
+            return result
+
+        other = copy(self)  # app, domains and events are cleared by __getstate__
+        other.settings = self.settings.copy()
+        other.settings['env'] = other
+        other.project = copy(self.project)
+        other.project._dircache = {}
+
+        other.all_docs = only(self.all_docs)
+        other.read_durations = only(self.read_durations)
+        other.dependencies = only(self.dependencies, defaultdict(set))
+        other.included = only(self.included, defaultdict(set))
+        other.source_stamps = only(self.source_stamps)
+        other.reread_always = self.reread_always & docnames
+        other.metadata = only(self.metadata, defaultdict(dict))
+        other.titles = only(self.titles)
+        other.longtitles = only(self.longtitles)
+        other.tocs = only(self.tocs)
+        other.toc_num_entries = only(self.toc_num_entries)
+        other.toc_secnumbers = only(self.toc_secnumbers)
+        other.toc_fignumbers = only(self.toc_fignumbers)
+        other.toctree_includes = only(self.toctree_includes)
+        other.files_to_rebuild = {}
+        for subfn, fnset in self.files_to_rebuild.items():
+            if not fnset.isdisjoint(docnames):
+                other.files_to_rebuild[subfn] = fnset & docnames
+        other.glob_toctrees = self.glob_toctrees & docnames
+        other.numbered_toctrees = self.numbered_toctrees & docnames
+
+        other.images = FilenameUniqDict()
+        for filename, (docs, unique) in self.images.items():
+            if not docs.isdisjoint(docnames):
+                other.images[filename] = (docs & docnames, unique)
+        other.dlfiles = DownloadFiles()
+        for filename, (docs, dest) in self.dlfiles.items():
+            if not docs.isdisjoint(docnames):
+                other.dlfiles[filename] = (docs & docnames, dest)
+
+        other.domaindata = {}
+        for domainname, domain in self.domains.items():
+            other.domaindata[domainname] = domain.extract_domaindata(docnames)
+
+        other.temp_data = {}
+        other.ref_context = {}
+        return other
+
     def path2doc(self, filename: str) -> str:
         """Return the docname for the filename if the file is document.
 
@@ -408,19 +498,31 @@ class BuildEnvironment:
             # config values affect e.g. substitutions
             added = self.found_docs
         else:
+            check_content = self.config.source_change_detection == 'content'
+            stamps = {}  # type: Dict[str, Stamp]
             for docname in self.found_docs:
                 if docname not in self.all_docs:
                     added.add(docname)
                     continue
-                # if the doctree file is not there, rebuild
+                # if the doctree file is not there or was written by
+                # another version, rebuild
                 filename = path.join(self.doctreedir, docname + '.doctree')
-                if not path.isfile(filename):
+                if not self.doctree_serializer.is_current(filename):
                     changed.add(docname)
                     continue
                 # check the "reread always" list
                 if docname in self.reread_always:
                     changed.add(docname)
                     continue
+                if check_content:
+                    # the stamps of the document and its dependencies are
+                    # checked below, for all documents at once
+                    docstamps = self.source_stamps.get(docname, {})
+                    if all(f in docstamps for f in self.source_files(docname)):
+                        stamps.update(docstamps)
+                    else:
+                        changed.add(docname)
+                    continue
                 # check the mtime of the document
                 mtime = self.all_docs[docname]
                 newmtime = path.getmtime(self.doc2path(docname))
@@ -444,8 +546,46 @@ class BuildEnvironment:
                         changed.add(docname)
                         break
 
+            if stamps:
+                self._check_source_stamps(stamps, added | changed, changed)
+
         return added, changed, removed
 
+    def _check_source_stamps(self, stamps: Dict[str, Stamp], skip: Set[str],
+                             changed: Set[str]) -> None:
+        """Add the documents whose source or dependencies have another content
+        than when they were read to *changed*.
+
+        *stamps* are the recorded stamps of the files to check.
+        """
+        stamps.update(restamp_files(stamps))
+        for docname in self.found_docs - skip:
+            docstamps = self.source_stamps[docname]
+            for filename, (_, _, digest) in docstamps.items():
+                if stamps[filename] is None or stamps[filename][2] != digest:
+                    changed.add(docname)
+                    break
+            else:
+                # remember the new mtimes of touched files to skip hashing them
+                # next time
+                docstamps.update((filename, stamps[filename]) for filename in docstamps)
+
+    def source_files(self, docname: str) -> List[str]:
+        """Return the absolute file names of the source of *docname* and of
+        its dependencies.
+        """
+        # path.join() does the right thing when dep is absolute too
+        return ([self.doc2path(docname)] +
+                [path.join(self.srcdir, dep) for dep in sorted(self.dependencies[docname])])
+
+    def note_source_stamps(self, docname: str) -> None:
+        """Record the stamps of the files returned by :meth:`source_files`.
+
+        They are used by :meth:`get_outdated_files` if
+        :confval:`source_change_detection` is ``'content'``.
+        """
+        self.source_stamps[docname] = stamp_files(self.source_files(docname))
+
     def check_dependents(self, app: "Sphinx", already: Set[str]) -> Generator[str, None, None]:
         to_rewrite = []  # type: List[str]
         for docnames in self.events.emit('env-get-updated', self):
@@ -518,10 +658,14 @@ class BuildEnvironment:
     # --------- RESOLVING REFERENCES AND TOCTREES ------------------------------
 
     def get_doctree(self, docname: str) -> nodes.document:
-        """Read the doctree for a file from the pickle and return it."""
-        filename = path.join(self.doctreedir, docname + '.doctree')
-        with open(filename, 'rb') as f:
-            doctree = pickle.load(f)
+        """Read the doctree for a file from the doctree file and return it."""
+        content = self.doctree_cache.get(docname)
+        if content is None:
+            filename = path.join(self.doctreedir, docname + '.doctree')
+            with open(filename, 'rb') as f:
+                content = f.read()
+            self.doctree_cache.put(docname, content)
+        doctree = self.doctree_serializer.loads(content)
         doctree.settings.env = self
         doctree.reporter = LoggingReporter(self.doc2path(docname))
         return doctree
@@ -8,7 +8,7 @@
     :license: BSD, see LICENSE for details.
 """
 
-from typing import Any, Iterable, List
+from typing import Any, Dict, Iterable, List, Tuple
 from typing import cast
 
 from docutils import nodes
@@ -32,6 +32,9 @@ logger = logging.getLogger(__name__)
 class TocTree:
     def __init__(self, env: "BuildEnvironment") -> None:
         self.env = env
+        # the pruned TOCs of the documents, reused by every toctree resolved
+        # with this instance
+        self._tocs = {}  # type: Dict[Tuple[str, bool, bool], Element]
 
     def note(self, docname: str, toctreenode: addnodes.toctree) -> None:
         """Note a TOC tree directive in a document and gather information about
@@ -156,11 +159,8 @@ class TocTree:
                                            location=ref, type='toc', subtype='circular')
                             continue
                         refdoc = ref
-                        toc = self.env.tocs[ref].deepcopy()
-                        maxdepth = self.env.metadata[ref].get('tocdepth', 0)
-                        if ref not in toctree_ancestors or (prune and maxdepth > 0):
-                            self._toctree_prune(toc, 2, maxdepth, collapse)
-                        process_only_nodes(toc, builder.tags)
+                        toc = self._get_toc(ref, builder, ref in toctree_ancestors,
+                                            prune, collapse)
                         if title and toc.children and len(toc.children) == 1:
                             child = toc.children[0]
                             for refnode in child.traverse(nodes.reference):
@@ -277,6 +277,26 @@ class TocTree:
             d = parent[d]
         return ancestors
 
+    def _get_toc(self, docname: str, builder: "Builder", is_ancestor: bool,
+                 prune: bool, collapse: bool) -> Element:
+        """Return a copy of the TOC of *docname* to include in a toctree.
+
+        Unless the document is an ancestor of the document the toctree is
+        resolved for, the TOC is pruned to its *tocdepth*.  The pruned TOCs are
+        cached, as they are the same for every document.
+        """
+        toc = self.env.tocs[docname]
+        maxdepth = self.env.metadata[docname].get('tocdepth', 0)
+        pruned = not is_ancestor or (prune and maxdepth > 0)
+        key = (docname, pruned, collapse)
+        if key not in self._tocs:
+            toc = toc.deepcopy()
+            if pruned:
+                self._toctree_prune(toc, 2, maxdepth, collapse)
+            process_only_nodes(toc, builder.tags)
+            self._tocs[key] = toc
+        return self._tocs[key].deepcopy()
+
     def _toctree_prune(self, node: Element, depth: int, maxdepth: int, collapse: bool = False
                        ) -> None:
         """Utility: Cut a TOC at a specified depth."""
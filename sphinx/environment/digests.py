@@ -0,0 +1,73 @@
+"""
+    sphinx.environment.digests
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Content digests of the source files for the outdated check.
+
+    :copyright: Copyright 2007-2020 by the Sphinx team, see AUTHORS.
+    :license: BSD, see LICENSE for details.
+"""
+
+import concurrent.futures
+import os
+from typing import Dict, Iterable, Tuple
+
+from sphinx.util import md5
+
+#: (mtime in nanoseconds, size, content digest) of a file
+Stamp = Tuple[int, int, str]
+
+# the number of files above which they are hashed in several threads
+PARALLEL_THRESHOLD = 16
+
+
+def file_digest(filename: str) -> str:
+    """Return the hex digest of the content of *filename*."""
+    digest = md5()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stamp_file(filename: str) -> Stamp:
+    """Return the stamp of *filename*, or None if it cannot be read."""
+    try:
+        stat = os.stat(filename)
+        return stat.st_mtime_ns, stat.st_size, file_digest(filename)
+    except OSError:
+        return None
+
+
+def stamp_files(filenames: Iterable[str]) -> Dict[str, Stamp]:
+    """Return the stamps of the readable files among *filenames*."""
+    stamps = {}  # type: Dict[str, Stamp]
+    for filename in filenames:
+        stamp = stamp_file(filename)
+        if stamp:
+            stamps[filename] = stamp
+    return stamps
+
+
+def restamp_files(stamps: Dict[str, Stamp]) -> Dict[str, Stamp]:
+    """Return the current stamps of the files whose stamps have changed.
+
+    A file whose modification time and size are unchanged is assumed to be
+    unchanged and is not read; only the others are hashed, in several threads.
+    A file that cannot be read anymore is mapped to None.
+    """
+    restamp = []
+    for filename, (mtime, size, _) in stamps.items():
+        try:
+            stat = os.stat(filename)
+            if stat.st_mtime_ns != mtime or stat.st_size != size:
+                restamp.append(filename)
+        except OSError:
+            restamp.append(filename)
+
+    if len(restamp) < PARALLEL_THRESHOLD:
+        return {filename: stamp_file(filename) for filename in restamp}
+
+    # hashlib releases the GIL while hashing larger data
+    with concurrent.futures.ThreadPoolExecutor(min(32, (os.cpu_count() or 1) + 4)) as pool:
+        return dict(zip(restamp, pool.map(stamp_file, restamp)))
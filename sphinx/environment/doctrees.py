@@ -0,0 +1,211 @@
+"""
+    sphinx.environment.doctrees
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Serialization and caching of the doctrees in the doctree directory.
+
+    :copyright: Copyright 2007-2020 by the Sphinx team, see AUTHORS.
+    :license: BSD, see LICENSE for details.
+"""
+
+import pickle
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+from docutils import nodes
+
+from sphinx.locale import __
+from sphinx.util import logging
+
+try:
+    import bz2
+except ImportError:
+    bz2 = None
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+
+logger = logging.getLogger(__name__)
+
+#: The first bytes of every doctree file.
+DOCTREE_MAGIC = b'#sphinx-doctree'
+
+#: The compression methods for doctree files: name -> (compress, decompress).
+#: Extensions may register further methods here.
+compressors = {
+    'zlib': (lambda data: zlib.compress(data, 1), zlib.decompress),
+}  # type: Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]]
+
+if bz2:
+    compressors['bz2'] = (lambda data: bz2.compress(data, 1), bz2.decompress)
+
+if lzma:
+    compressors['lzma'] = (lambda data: lzma.compress(data, preset=0), lzma.decompress)
+
+if zstandard:
+    compressors['zstd'] = (zstandard.ZstdCompressor().compress,
+                           zstandard.ZstdDecompressor().decompress)
+
+if lz4:
+    compressors['lz4'] = (lz4.frame.compress, lz4.frame.decompress)
+
+
+class DoctreeFormatError(ValueError):
+    """Raised if the content of a doctree file cannot be decoded, e.g. if it is
+    compressed with a method that is not available."""
+
+
+class DoctreeSerializer:
+    """Converts doctrees to the content of the doctree files and back.
+
+    The doctree is pickled with the highest protocol and compressed with one
+    of the :data:`compressors` if *compression* is given.  If that method is
+    not available, ``'zlib'`` is used instead.
+
+    Every file starts with a header line giving *version*, the version of
+    Sphinx and of the environment that wrote it, and the compression method.
+    :meth:`is_current` compares it to the current version by reading only the
+    header.
+    """
+
+    def __init__(self, version: str, compression: str = None) -> None:
+        if compression and compression not in compressors:
+            logger.warning(__('doctree compression %r is not available; '
+                              'using zlib instead'), compression)
+            compression = 'zlib'
+
+        self.version = version.encode()
+        self.compression = compression
+        self.header = b'%s %s %s\n' % (DOCTREE_MAGIC, self.version,
+                                       (compression or 'none').encode())
+
+    def dumps(self, doctree: nodes.document) -> bytes:
+        content = pickle.dumps(doctree, pickle.HIGHEST_PROTOCOL)
+        if self.compression:
+            compress, _ = compressors[self.compression]
+            content = compress(content)
+        return self.header + content
+
+    def loads(self, content: bytes) -> nodes.document:
+        """Return the doctree of *content*.
+
+        Raise DoctreeFormatError if the header is invalid or the content cannot
+        be decompressed.
+        """
+        if not content.startswith(DOCTREE_MAGIC):
+            # written by an older version of Sphinx
+            return pickle.loads(content)
+
+        try:
+            end = content.index(b'\n')
+            _, version, compression = content[:end].decode().split()
+        except ValueError as exc:
+            raise DoctreeFormatError('invalid doctree header') from exc
+
+        content = content[end + 1:]
+        if compression != 'none':
+            if compression not in compressors:
+                raise DoctreeFormatError('doctree compression %r is not available' %
+                                         compression)
+            _, decompress = compressors[compression]
+            try:
+                content = decompress(content)
+            except Exception as exc:
+                raise DoctreeFormatError('doctree cannot be decompressed: %s' % exc) from exc
+        return pickle.loads(content)
+
+    def read_header(self, filename: str) -> Tuple[str, str]:
+        """Return the version and the compression method of a doctree file.
+
+        Raise ValueError if the file has no valid header.
+        """
+        with open(filename, 'rb') as f:
+            header = f.readline(256)
+        if not header.startswith(DOCTREE_MAGIC) or not header.endswith(b'\n'):
+            raise ValueError('no doctree header: %s' % filename)
+        _, version, compression = header.decode().split()
+        return version, compression
+
+    def is_current(self, filename: str) -> bool:
+        """Check if the doctree file exists and was written by this version."""
+        try:
+            version, compression = self.read_header(filename)
+        except (OSError, ValueError):
+            return False
+
+        if version != self.version.decode():
+            return False
+        return compression == 'none' or compression in compressors
+
+
+class DoctreeCache:
+    """An in-memory LRU cache of the serialized doctrees.
+
+    The cache keeps the bytes of the doctree files, not the doctree objects:
+    the callers of :meth:`.BuildEnvironment.get_doctree` modify the doctree
+    they get, so every call has to deserialize a fresh copy.  The cache saves
+    opening and reading the file again.
+
+    *maxsize* is the memory budget in bytes; the least recently used doctrees
+    are evicted once it is exceeded.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # type: Dict[str, bytes]
+
+    def __contains__(self, docname: str) -> bool:
+        return docname in self._data
+
+    def get(self, docname: str) -> bytes:
+        """Return the cached content for *docname*, or None."""
+        content = self._data.get(docname)
+        if content is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._data.move_to_end(docname)  # type: ignore
+        return content
+
+    def put(self, docname: str, content: bytes) -> None:
+        """Store *content* for *docname*, evicting old entries as needed."""
+        self.discard(docname)
+        if len(content) > self.maxsize:
+            return
+
+        self._data[docname] = content
+        self.size += len(content)
+        while self.size > self.maxsize:
+            _, evicted = self._data.popitem(last=False)  # type: ignore
+            self.size -= len(evicted)
+
+    def discard(self, docname: str) -> None:
+        content = self._data.pop(docname, None)
+        if content is not None:
+            self.size -= len(content)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.size = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return the hit/miss statistics of the cache."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self._data), 'size': self.size}
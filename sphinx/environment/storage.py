@@ -0,0 +1,305 @@
+"""
+    sphinx.environment.storage
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Sharded on-disk storage of the build environment.
+
+    :copyright: Copyright 2007-2020 by the Sphinx team, see AUTHORS.
+    :license: BSD, see LICENSE for details.
+"""
+
+import os
+import pickle
+import shutil
+from collections import defaultdict
+from os import path
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+from sphinx.util import md5
+from sphinx.util.osutil import ensuredir
+
+if False:
+    # For type annotation
+    from sphinx.environment import BuildEnvironment
+
+ENV_SHARDS_DIRNAME = 'environment.shards'
+
+#: The attributes of BuildEnvironment that are stored per document.  The data
+#: of a document is loaded from its shard on first access.
+DOCUMENT_ATTRIBUTES = ('metadata', 'titles', 'longtitles', 'tocs', 'toc_num_entries',
+                       'toc_secnumbers', 'toc_fignumbers', 'toctree_includes')
+
+
+def _write(content: bytes, filename: str) -> None:
+    """Write *content* to *filename*, replacing the file atomically."""
+    ensuredir(path.dirname(filename))
+    with open(filename + '.tmp', 'wb') as f:
+        f.write(content)
+    os.replace(filename + '.tmp', filename)
+
+
+def _dump(obj: Any, filename: str) -> None:
+    _write(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL), filename)
+
+
+def _load(filename: str) -> Any:
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+
+class LazyDomainData(dict):
+    """The data of a domain that is loaded from its shard on first access.
+
+    Only the ``'version'`` key, which is checked when the domain is set up,
+    is available without loading the shard.
+    """
+
+    def __init__(self, filename: str, version: int) -> None:
+        super().__init__(version=version)
+        self.filename = filename
+        self.loaded = False
+
+    def load(self) -> None:
+        if not self.loaded:
+            self.loaded = True
+            super().update(_load(self.filename))
+
+    def __getitem__(self, key: Any) -> Any:
+        if key != 'version':
+            self.load()
+        return super().__getitem__(key)
+
+    def __reduce_ex__(self, protocol: int) -> Any:
+        self.load()
+        return dict, (dict(self),)
+
+
+class DocumentShards:
+    """The document shards of a stored environment that are not loaded yet."""
+
+    def __init__(self, storage: "ShardedStorage", docnames: Iterable[str]) -> None:
+        self.storage = storage
+        self.pending = set(docnames)
+        self.attributes = {}  # type: Dict[str, LazyDocumentData]
+
+    def load(self, docname: str) -> None:
+        """Load the data of *docname* into the attributes."""
+        if docname in self.pending:
+            self.pending.discard(docname)
+            for name, value in _load(self.storage.doc_filename(docname)).items():
+                dict.__setitem__(self.attributes[name], docname, value)
+
+    def load_all(self) -> None:
+        for docname in sorted(self.pending):
+            self.load(docname)
+
+
+class LazyDocumentData(dict):
+    """A per-document attribute of the environment, e.g. ``env.titles``.
+
+    The entry of a document is loaded from its shard when the document is
+    accessed; operations on the whole mapping load all documents.  With a
+    *default_factory*, missing entries are created like in a defaultdict.
+    """
+
+    def __init__(self, shards: DocumentShards, default_factory: Callable = None) -> None:
+        super().__init__()
+        self.shards = shards
+        self.default_factory = default_factory
+
+    def __missing__(self, key: str) -> Any:
+        if self.default_factory is None:
+            raise KeyError(key)
+        value = self.default_factory()
+        dict.__setitem__(self, key, value)
+        return value
+
+    def __reduce_ex__(self, protocol: int) -> Any:
+        self.shards.load_all()
+        if self.default_factory is None:
+            return dict, (dict(self),)
+        else:
+            return defaultdict, (self.default_factory, dict(self))
+
+
+def _make_loading(name: str, load: Callable) -> Callable:
+    method = getattr(dict, name)
+
+    def loading(self: dict, *args: Any, **kwargs: Any) -> Any:
+        load(self, *args)
+        return method(self, *args, **kwargs)
+    loading.__name__ = name
+    return loading
+
+
+def _load_domain(data: LazyDomainData, *args: Any) -> None:
+    data.load()
+
+
+def _load_document(data: LazyDocumentData, docname: str = None, *args: Any) -> None:
+    data.shards.load(docname)
+
+
+def _load_documents(data: LazyDocumentData, *args: Any) -> None:
+    data.shards.load_all()
+
+
+for _name in ('__contains__', '__delitem__', '__eq__', '__iter__', '__len__', '__ne__',
+              '__repr__', '__setitem__', 'clear', 'copy', 'get', 'items', 'keys', 'pop',
+              'popitem', 'setdefault', 'update', 'values'):
+    setattr(LazyDomainData, _name, _make_loading(_name, _load_domain))
+
+# the methods that take a docname only load the shard of that document
+for _name in ('__contains__', '__delitem__', '__getitem__', '__setitem__', 'get', 'pop',
+              'setdefault'):
+    setattr(LazyDocumentData, _name, _make_loading(_name, _load_document))
+
+for _name in ('__eq__', '__iter__', '__len__', '__ne__', '__repr__', 'clear', 'copy',
+              'items', 'keys', 'popitem', 'update', 'values'):
+    setattr(LazyDocumentData, _name, _make_loading(_name, _load_documents))
+
+
+def load_environment(doctreedir: str) -> "BuildEnvironment":
+    """Load the environment stored in *doctreedir*, from its shards if there
+    are any and from ``environment.pickle`` otherwise.
+
+    The environment is not set up for an application yet.
+    """
+    from sphinx.application import ENV_PICKLE_FILENAME
+
+    storage = ShardedStorage(doctreedir)
+    if storage.exists():
+        return storage.load()
+    else:
+        return _load(path.join(doctreedir, ENV_PICKLE_FILENAME))
+
+
+class ShardedStorage:
+    """Stores a build environment as separate shards under *doctreedir*.
+
+    The environment itself, without per-document and domain data, is kept in
+    an index file.  The data of each document and of each domain lives in its
+    own file, so that an incremental build only rewrites the shards of the
+    documents that were read and of the domains whose data has changed.  The
+    shard of a document is loaded on first access of its entry in one of the
+    :data:`DOCUMENT_ATTRIBUTES`, a domain shard on first access of the data of
+    the domain.
+
+    The manifest records the size of every shard, so that missing or
+    truncated shards are detected when the environment is loaded.
+    """
+
+    def __init__(self, doctreedir: str) -> None:
+        self.dirname = path.join(doctreedir, ENV_SHARDS_DIRNAME)
+        self.index_filename = path.join(self.dirname, 'index.pickle')
+        self.manifest_filename = path.join(self.dirname, 'manifest.pickle')
+
+    def doc_filename(self, docname: str) -> str:
+        return path.join(self.dirname, 'docs', docname + '.pickle')
+
+    def domain_filename(self, domainname: str) -> str:
+        return path.join(self.dirname, 'domains', domainname + '.pickle')
+
+    def exists(self) -> bool:
+        return path.isfile(self.index_filename)
+
+    def remove(self) -> None:
+        shutil.rmtree(self.dirname, ignore_errors=True)
+
+    def load_manifest(self) -> Dict[str, Any]:
+        try:
+            return _load(self.manifest_filename)
+        except Exception:
+            return {'documents': {}, 'domains': {}}
+
+    def validate(self, manifest: Dict[str, Any]) -> None:
+        """Check that the shards of *manifest* exist and have the recorded size.
+
+        Raise OSError otherwise.
+        """
+        shards = [(self.doc_filename(docname), size)
+                  for docname, size in manifest['documents'].items()]
+        shards.extend((self.domain_filename(domainname), size)
+                      for domainname, (digest, version, size) in manifest['domains'].items())
+        for filename, size in shards:
+            if os.stat(filename).st_size != size:
+                raise OSError('environment shard is truncated: %s' % filename)
+
+    def load(self) -> "BuildEnvironment":
+        """Load the environment index.
+
+        The shards of the documents and the domains are validated, but not
+        loaded yet.  Raise an exception if the storage is incomplete.
+        """
+        from sphinx.environment import BuildEnvironment
+
+        manifest = _load(self.manifest_filename)
+        self.validate(manifest)
+        env = BuildEnvironment.__new__(BuildEnvironment)
+        env.__setstate__(_load(self.index_filename))
+        env.settings['env'] = env
+        for domainname, (digest, version, size) in manifest['domains'].items():
+            filename = self.domain_filename(domainname)
+            env.domaindata[domainname] = LazyDomainData(filename, version)
+
+        shards = DocumentShards(self, manifest['documents'])
+        for name in DOCUMENT_ATTRIBUTES:
+            default_factory = dict if name == 'metadata' else None
+            shards.attributes[name] = LazyDocumentData(shards, default_factory)
+        env.__dict__.update(shards.attributes)
+        return env
+
+    def dump(self, env: "BuildEnvironment", docnames: Iterable[str]) -> None:
+        """Store *env*.
+
+        Only the document shards of *docnames* (and of documents that have no
+        shard yet) are written; shards of removed documents are deleted.
+        """
+        manifest = self.load_manifest()
+        stored = manifest['documents']  # type: Dict[str, int]
+        current = set(env.all_docs)
+
+        for docname in set(stored) - current:
+            try:
+                os.unlink(self.doc_filename(docname))
+            except OSError:
+                pass
+        documents = {docname: stored[docname] for docname in current & set(stored)}
+        for docname in (set(docnames) | (current - set(stored))) & current:
+            docdata = {}  # type: Dict[str, Any]
+            for name in DOCUMENT_ATTRIBUTES:
+                attribute = getattr(env, name)
+                if docname in attribute:
+                    docdata[name] = attribute[docname]
+            content = pickle.dumps(docdata, pickle.HIGHEST_PROTOCOL)
+            _write(content, self.doc_filename(docname))
+            documents[docname] = len(content)
+        manifest['documents'] = documents
+
+        # domain data is rewritten only when it has changed
+        domains = {}  # type: Dict[str, Tuple[str, int, int]]
+        for domainname, domaindata in env.domaindata.items():
+            filename = self.domain_filename(domainname)
+            if (isinstance(domaindata, LazyDomainData) and not domaindata.loaded and
+                    domainname in manifest['domains']):
+                # not accessed during this build
+                domains[domainname] = manifest['domains'][domainname]
+                continue
+
+            content = pickle.dumps(domaindata, pickle.HIGHEST_PROTOCOL)
+            digest = md5(content).hexdigest()
+            domains[domainname] = (digest, domaindata['version'], len(content))
+            if manifest['domains'].get(domainname) != domains[domainname] or \
+                    not path.isfile(filename):
+                _write(content, filename)
+        manifest['domains'] = domains
+        _dump(manifest, self.manifest_filename)
+
+        # the index is stored as a plain state dict; pickling a BuildEnvironment
+        # would pull the per-document data into it
+        index = env.__getstate__()
+        for name in DOCUMENT_ATTRIBUTES:
+            del index[name]
+        index['domaindata'] = {}
+        index['settings'] = dict(env.settings, env=None)
+        _dump(index, self.index_filename)
@@ -41,8 +41,8 @@ class DurationDomain(Domain):
     def clear_doc(self, docname: str) -> None:
         self.reading_durations.pop(docname, None)
 
-    def merge_domaindata(self, docnames: List[str], otherdata: Dict[str, timedelta]) -> None:
-        for docname, duration in otherdata.items():
+    def merge_domaindata(self, docnames: List[str], otherdata: Dict[str, Any]) -> None:
+        for docname, duration in otherdata.get('reading_durations', {}).items():
             if docname in docnames:
                 self.reading_durations[docname] = duration
 
@@ -8,11 +8,15 @@
     :license: BSD, see LICENSE for details.
 """
 
+import os
 from os import path
 from pprint import pformat
 from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
 
-from jinja2 import FileSystemLoader, BaseLoader, TemplateNotFound, contextfunction
+from jinja2 import (
+    BaseLoader, FileSystemBytecodeCache, FileSystemLoader, TemplateNotFound, contextfunction
+)
+from jinja2.bccache import Bucket
 from jinja2.environment import Environment
 from jinja2.sandbox import SandboxedEnvironment
 from jinja2.utils import open_if_exists
@@ -20,12 +24,15 @@ from jinja2.utils import open_if_exists
 from sphinx.application import TemplateBridge
 from sphinx.theming import Theme
 from sphinx.util import logging
-from sphinx.util.osutil import mtimes_of_files
+from sphinx.util.osutil import ensuredir, mtimes_of_files
 
 if False:
     # For type annotation
     from sphinx.builders import Builder
 
+#: The directory in the doctree directory that holds the compiled templates.
+TEMPLATE_CACHE_DIRNAME = 'templates.cache'
+
 
 def _tobool(val: str) -> bool:
     if isinstance(val, str):
@@ -138,6 +145,43 @@ class SphinxFileSystemLoader(FileSystemLoader):
         raise TemplateNotFound(template)
 
 
+class SphinxBytecodeCache(FileSystemBytecodeCache):
+    """
+    FileSystemBytecodeCache subclass that keeps the compiled templates across
+    builds and processes.
+
+    The cache files are looked up by the name and path of the template and by
+    the extensions of the environment, and are discarded when the source of
+    the template has changed.  They are replaced atomically, so parallel
+    writer processes never read a partially written file.
+    """
+
+    def __init__(self, directory: str, extensions: List[str] = []) -> None:
+        super().__init__(directory, '%s.cache')
+        self.extensions = sorted(extensions)
+
+    def get_cache_key(self, name: str, filename: str = None) -> str:
+        return super().get_cache_key('|'.join([name] + self.extensions), filename)
+
+    def load_bytecode(self, bucket: Bucket) -> None:
+        try:
+            super().load_bytecode(bucket)
+        except Exception:
+            # a broken cache file; the template is compiled again
+            bucket.reset()
+
+    def dump_bytecode(self, bucket: Bucket) -> None:
+        filename = self._get_cache_filename(bucket)
+        tmpname = '%s.%d.tmp' % (filename, os.getpid())
+        try:
+            ensuredir(self.directory)
+            with open(tmpname, 'wb') as f:
+                bucket.write_bytecode(f)
+            os.replace(tmpname, filename)
+        except OSError:
+            pass
+
+
 class BuiltinTemplateLoader(TemplateBridge, BaseLoader):
     """
     Interfaces the rendering environment of jinja2 for use in Sphinx.
@@ -175,8 +219,19 @@ class BuiltinTemplateLoader(TemplateBridge, BaseLoader):
 
         use_i18n = builder.app.translator is not None
         extensions = ['jinja2.ext.i18n'] if use_i18n else []
+        doctreedir = getattr(builder, 'doctreedir', None)
+        if isinstance(doctreedir, str):
+            cachedir = path.join(doctreedir, TEMPLATE_CACHE_DIRNAME)
+            bytecode_cache = SphinxBytecodeCache(cachedir, extensions)
+        else:
+            bytecode_cache = None
+
+        # the templates do not change during a build, so they are not checked
+        # for changes once they are loaded
         self.environment = SandboxedEnvironment(loader=self,
-                                                extensions=extensions)
+                                                extensions=extensions,
+                                                auto_reload=False,
+                                                bytecode_cache=bytecode_cache)
         self.environment.filters['tobool'] = _tobool
         self.environment.filters['toint'] = _toint
         self.environment.filters['todim'] = _todim
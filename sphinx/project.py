@@ -8,11 +8,13 @@
     :license: BSD, see LICENSE for details.
 """
 
+import concurrent.futures
 import os
+import time
+import unicodedata
 from glob import glob
 
 from sphinx.locale import __
-from sphinx.util import get_matching_files
 from sphinx.util import logging
 from sphinx.util import path_stabilize
 from sphinx.util.matching import compile_matchers
@@ -20,7 +22,7 @@ from sphinx.util.osutil import SEP, relpath
 
 if False:
     # For type annotation
-    from typing import Dict, List, Set  # NOQA
+    from typing import Callable, Dict, List, Match, Set, Tuple  # NOQA
 
 
 logger = logging.getLogger(__name__)
@@ -41,10 +43,15 @@ class Project:
         #: The name of documents belongs to this project.
         self.docnames = set()  # type: Set[str]
 
+        # the listings of the directories scanned by the last discover():
+        # dirname -> (mtime, subdirectories, files)
+        self._dircache = {}  # type: Dict[str, Tuple[int, List[str], List[str]]]
+
     def restore(self, other):
         # type: (Project) -> None
         """Take over a result of last build."""
         self.docnames = other.docnames
+        self._dircache = getattr(other, '_dircache', {})
 
     def discover(self, exclude_paths=[]):
         # type: (List[str]) -> Set[str]
@@ -52,8 +59,7 @@ class Project:
         :attr:`docnames`.
         """
         self.docnames = set()
-        excludes = compile_matchers(exclude_paths + EXCLUDE_PATHS)
-        for filename in get_matching_files(self.srcdir, excludes):  # type: ignore
+        for filename in self._find_files(exclude_paths + EXCLUDE_PATHS):
             docname = self.path2doc(filename)
             if docname:
                 if docname in self.docnames:
@@ -69,6 +75,79 @@ class Project:
 
         return self.docnames
 
+    def _find_files(self, exclude_paths):
+        # type: (List[str]) -> List[str]
+        """Return all file names in the source directory, recursively.
+
+        Files and directories matching one of *exclude_paths* are left out;
+        excluded directories are not scanned at all.  The directories of a
+        level are scanned in parallel.
+        """
+        matchers = compile_matchers(exclude_paths)
+
+        def exclude(name):
+            # type: (str) -> bool
+            return any(matcher(name) for matcher in matchers)
+
+        dircache = self._dircache
+        self._dircache = {}
+
+        filenames = []  # type: List[str]
+        dirnames = ['']
+        with concurrent.futures.ThreadPoolExecutor(8) as pool:
+            while dirnames:
+                subdirs = []  # type: List[str]
+                listings = pool.map(lambda dirname: self._scandir(dirname, dircache),
+                                    dirnames)
+                for dirname, (dirs, files) in zip(dirnames, listings):
+                    prefix = dirname + SEP if dirname else ''
+                    for name in files:
+                        filename = prefix + unicodedata.normalize('NFC', name)
+                        if not exclude(filename):
+                            filenames.append(filename)
+                    for name in dirs:
+                        subdir = prefix + unicodedata.normalize('NFC', name)
+                        if not exclude(subdir):
+                            subdirs.append(subdir)
+                dirnames = subdirs
+
+        return filenames
+
+    def _scandir(self, dirname, dircache):
+        # type: (str, Dict[str, Tuple[int, List[str], List[str]]]) -> Tuple[List[str], List[str]]  # NOQA
+        """Return the names of the subdirectories and files of *dirname*.
+
+        The listing of the last build is reused if the modification time of
+        the directory has not changed since then.
+        """
+        fullpath = os.path.join(self.srcdir, dirname)
+        dirs = []  # type: List[str]
+        files = []  # type: List[str]
+        try:
+            mtime = os.stat(fullpath).st_mtime_ns
+            cached = dircache.get(dirname)
+            if cached and cached[0] == mtime:
+                self._dircache[dirname] = cached
+                return cached[1], cached[2]
+
+            for entry in os.scandir(fullpath):
+                if entry.is_dir():  # follows symbolic links
+                    dirs.append(entry.name)
+                else:
+                    files.append(entry.name)
+        except OSError:
+            # ignored like os.walk() does
+            return dirs, files
+
+        dirs.sort()
+        files.sort()
+
+        # a directory changed within the resolution of the timestamps could
+        # change again without changing its modification time
+        if mtime < (time.time() - 2) * 10 ** 9:
+            self._dircache[dirname] = (mtime, dirs, files)
+        return dirs, files
+
     def path2doc(self, filename):
         # type: (str) -> str
         """Return the docname for the filename if the file is document.
@@ -8,9 +8,13 @@
     :license: BSD, see LICENSE for details.
 """
 import html
+import json
+import math
 import pickle
 import re
+import string
 import warnings
+from collections import Counter
 from importlib import import_module
 from os import path
 from typing import Any, Dict, IO, Iterable, List, Tuple, Set
@@ -95,6 +99,18 @@ var Stemmer = function() {
         """
         return self._word_re.findall(input)
 
+    def split_texts(self, texts: List[str]) -> List[str]:
+        """
+        This method splits several texts into words at once.  Unless
+        :meth:`split` is overridden, the texts are joined and split in one go.
+
+        .. versionadded:: 3.3
+        """
+        if type(self).split is SearchLanguage.split:
+            return self._word_re.findall('\n'.join(texts))
+        else:
+            return [word for text in texts for word in self.split(text)]
+
     def stem(self, word: str) -> str:
         """
         This method implements stemming algorithm of the Python version.
@@ -164,20 +180,34 @@ class _JavaScriptIndex:
     """
     The search index as javascript file that calls a function
     on the documentation search object to register the index.
+
+    The index itself is written as JSON.  Files written by older versions of
+    Sphinx, which used :mod:`sphinx.util.jsdump`, can still be read.
     """
 
     PREFIX = 'Search.setIndex('
+    SHARD_PREFIX = 'Search.setShard('
     SUFFIX = ')'
 
     def dumps(self, data: Any) -> str:
-        return self.PREFIX + jsdump.dumps(data) + self.SUFFIX
+        return self.PREFIX + json.dumps(data, sort_keys=True, separators=(',', ':')) + \
+            self.SUFFIX
+
+    def dumps_shard(self, key: str, data: Any) -> str:
+        """Return the content of the file of a shard of a sharded index."""
+        return (self.SHARD_PREFIX + json.dumps(key) + ',' +
+                json.dumps(data, sort_keys=True, separators=(',', ':')) + self.SUFFIX)
 
     def loads(self, s: str) -> Any:
         data = s[len(self.PREFIX):-len(self.SUFFIX)]
         if not data or not s.startswith(self.PREFIX) or not \
            s.endswith(self.SUFFIX):
             raise ValueError('invalid data')
-        return jsdump.loads(data)
+        try:
+            return json.loads(data)
+        except ValueError:
+            # the keys are not quoted in the old format
+            return jsdump.loads(data)
 
     def dump(self, data: Any, f: IO) -> None:
         f.write(self.dumps(data))
@@ -188,6 +218,24 @@ class _JavaScriptIndex:
 
 js_index = _JavaScriptIndex()
 
+# the characters used as they are in the file names of the shards
+SHARD_FILENAME_CHARS = frozenset(string.ascii_lowercase + string.digits)
+
+
+def shard_key(term: str, length: int) -> str:
+    """Return the key of the shard of a sharded search index holding *term*.
+
+    Like searchtools.js, this takes the first *length* UTF-16 code units of
+    the term and lowercases them.
+    """
+    units = term.encode('utf-16-le', 'surrogatepass')[:length * 2]
+    return units.decode('utf-16-le', 'surrogatepass').lower()
+
+
+def shard_filename(key: str) -> str:
+    """Return a file name for the shard *key* that is safe on all platforms."""
+    return ''.join(c if c in SHARD_FILENAME_CHARS else '_%06x' % ord(c) for c in key)
+
 
 class WordCollector(nodes.NodeVisitor):
     """
@@ -199,6 +247,16 @@ class WordCollector(nodes.NodeVisitor):
         self.found_words = []           # type: List[str]
         self.found_title_words = []     # type: List[str]
         self.lang = lang
+        # the texts are split into words by split_texts() all at once
+        self.texts = []                 # type: List[str]
+        self.title_texts = []           # type: List[str]
+
+    def split_texts(self) -> None:
+        """Split the texts found in the document into words."""
+        self.found_words.extend(self.lang.split_texts(self.texts))
+        self.found_title_words.extend(self.lang.split_texts(self.title_texts))
+        self.texts = []
+        self.title_texts = []
 
     def is_meta_keywords(self, node: addnodes.meta, nodetype: Any = None) -> bool:
         if nodetype is not None:
@@ -225,12 +283,12 @@ class WordCollector(nodes.NodeVisitor):
                 nodetext = re.sub(r'(?is)<style.*?</style>', '', node.astext())
                 nodetext = re.sub(r'(?is)<script.*?</script>', '', nodetext)
                 nodetext = re.sub(r'<[^<]+?>', '', nodetext)
-                self.found_words.extend(self.lang.split(nodetext))
+                self.texts.append(nodetext)
             raise nodes.SkipNode
         elif isinstance(node, nodes.Text):
-            self.found_words.extend(self.lang.split(node.astext()))
+            self.texts.append(node.astext())
         elif isinstance(node, nodes.title):
-            self.found_title_words.extend(self.lang.split(node.astext()))
+            self.title_texts.append(node.astext())
         elif isinstance(node, addnodes.meta) and self.is_meta_keywords(node):
             keywords = node['content']
             keywords = [keyword.strip() for keyword in keywords.split(',')]
@@ -242,7 +300,15 @@ class IndexBuilder:
     Helper class that creates a searchindex based on the doctrees
     passed to the `feed` method.
     """
+    # the version of the format of the postings, see dump_postings()
+    postings_version = 2
+
+    # the parameters of the BM25 weights of the terms in the documents
+    bm25_k1 = 1.2
+    bm25_b = 0.75
+
     formats = {
+        'json':     json,
         'jsdump':   jsdump,
         'pickle':   pickle
     }
@@ -257,8 +323,13 @@ class IndexBuilder:
                                     # stemmed word -> set(docname)
         self._title_mapping = {}    # type: Dict[str, Set[str]]
                                     # stemmed words in titles -> set(docname)
+        self._doc_terms = {}        # type: Dict[str, Tuple[Dict[str, int], Dict[str, int]]]
+                                    # docname -> (stemmed word -> frequency,
+                                    #             stemmed word in titles -> frequency)
         self._stem_cache = {}       # type: Dict[str, str]
                                     # word -> stemmed word
+        self._new_stems = {}        # type: Dict[str, str]
+                                    # word -> stemmed word, added since clear_feeds()
         self._objtypes = {}         # type: Dict[Tuple[str, str], int]
                                     # objtype -> index
         self._objnames = {}         # type: Dict[int, Tuple[str, str, str]]
@@ -296,6 +367,9 @@ class IndexBuilder:
         if not isinstance(frozen, dict) or \
            frozen.get('envversion') != self.env.version:
             raise ValueError('old format')
+        if 'terms' not in frozen:
+            # the terms are in the shards of a sharded index
+            raise ValueError('sharded index')
         index2fn = frozen['docnames']
         self._filenames = dict(zip(index2fn, frozen['filenames']))  # type: ignore
         self._titles = dict(zip(index2fn, frozen['titles']))  # type: ignore
@@ -313,12 +387,49 @@ class IndexBuilder:
         self._title_mapping = load_terms(frozen['titleterms'])
         # no need to load keywords/objtypes
 
+        # the frequencies of the terms are not in the frozen index
+        self._doc_terms = {docname: ({}, {}) for docname in index2fn}
+        for i, mapping in enumerate((self._mapping, self._title_mapping)):
+            for word, docnames in mapping.items():
+                for docname in docnames:
+                    self._doc_terms[docname][i][word] = 1
+
     def dump(self, stream: IO, format: Any) -> None:
         """Dump the frozen index to a stream."""
         if isinstance(format, str):
             format = self.formats[format]
         format.dump(self.freeze(), stream)
 
+    def load_postings(self, stream: IO) -> None:
+        """Load the postings of the documents dumped by :meth:`dump_postings`.
+
+        Unlike :meth:`load`, this needs neither parsing the frozen index nor
+        inverting it to find the terms of each document.  The stems of the
+        words found so far are loaded as well, so that they are not computed
+        again.
+        """
+        postings = pickle.load(stream)
+        if not isinstance(postings, dict) or \
+           postings.get('version') != self.postings_version or \
+           postings.get('envversion') != self.env.version or \
+           postings.get('lang') != self.lang.lang:
+            raise ValueError('old format')
+        self._titles = postings['titles']
+        self._filenames = postings['filenames']
+        self._mapping = postings['terms']
+        self._title_mapping = postings['titleterms']
+        self._doc_terms = postings['docterms']
+        self._stem_cache = postings.get('stems', {})
+
+    def dump_postings(self, stream: IO) -> None:
+        """Dump the postings of the documents to a binary stream."""
+        postings = dict(titles=self._titles, filenames=self._filenames,
+                        terms=self._mapping, titleterms=self._title_mapping,
+                        docterms=self._doc_terms, stems=self._stem_cache,
+                        envversion=self.env.version,
+                        lang=self.lang.lang, version=self.postings_version)
+        pickle.dump(postings, stream, pickle.HIGHEST_PROTOCOL)
+
     def get_objects(self, fn2index: Dict[str, int]
                     ) -> Dict[str, Dict[str, Tuple[int, int, int, str]]]:
         rv = {}  # type: Dict[str, Dict[str, Tuple[int, int, int, str]]]
@@ -368,70 +479,177 @@ class IndexBuilder:
                     rv[k] = sorted([fn2index[fn] for fn in v if fn in fn2index])  # type: ignore  # NOQA
         return rvs
 
+    def get_term_weights(self, fn2index: Dict
+                         ) -> Tuple[Dict[str, List[int]], Dict[str, List[int]]]:
+        """Return the weights of the terms in the documents, in tenths.
+
+        The weights are the BM25 scores of the terms, computed separately for
+        the text and the titles of the documents.  They are in the same order
+        as the postings returned by :meth:`get_terms`.
+
+        The weights of a term are left out if they are the same in all of its
+        documents: every result of a search contains all the words searched
+        for, so such a term adds the same weight to each of them and cannot
+        change their order.  This keeps them out of most of the index, as
+        many terms appear in a single document.
+        """
+        k1, b = self.bm25_k1, self.bm25_b
+        rvs = {}, {}  # type: Tuple[Dict[str, List[int]], Dict[str, List[int]]]
+        for i, (rv, mapping) in enumerate(zip(rvs, (self._mapping, self._title_mapping))):
+            lengths = {}  # type: Dict[str, int]
+            for docname in fn2index:
+                lengths[docname] = sum(self._doc_terms.get(docname, ({}, {}))[i].values())
+            avglength = sum(lengths.values()) / max(len(lengths), 1) or 1
+            for word, docnames in mapping.items():
+                docs = sorted((fn2index[fn], fn) for fn in docnames if fn in fn2index)
+                idf = math.log(1 + (len(fn2index) - len(docs) + 0.5) / (len(docs) + 0.5))
+                weights = []
+                for _, fn in docs:
+                    freq = self._doc_terms.get(fn, ({}, {}))[i].get(word, 1)
+                    norm = k1 * (1 - b + b * lengths[fn] / avglength)
+                    weights.append(round(10 * idf * freq * (k1 + 1) / (freq + norm)))
+                if len(set(weights)) > 1:
+                    rv[word] = weights
+        return rvs
+
     def freeze(self) -> Dict[str, Any]:
         """Create a usable data structure for serializing."""
         docnames, titles = zip(*sorted(self._titles.items()))
         filenames = [self._filenames.get(docname) for docname in docnames]
         fn2index = {f: i for (i, f) in enumerate(docnames)}
         terms, title_terms = self.get_terms(fn2index)
+        weights, title_weights = self.get_term_weights(fn2index)
 
         objects = self.get_objects(fn2index)  # populates _objtypes
         objtypes = {v: k[0] + ':' + k[1] for (k, v) in self._objtypes.items()}
         objnames = self._objnames
         return dict(docnames=docnames, filenames=filenames, titles=titles, terms=terms,
                     objects=objects, objtypes=objtypes, objnames=objnames,
-                    titleterms=title_terms, envversion=self.env.version)
+                    titleterms=title_terms, weights=weights, titleweights=title_weights,
+                    envversion=self.env.version)
+
+    def freeze_sharded(self, length: int) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+        """Create the data structures for a sharded index.
+
+        Return the result of :meth:`freeze` without the terms, the title terms
+        and their weights but with the *length* of the shard keys, and the
+        shards holding the terms by their keys.  A term is stored in
+        the shard named by its first *length* characters (see
+        :func:`shard_key`).  The postings of the terms in the shards are
+        delta-encoded: each document index is stored as the difference to the
+        previous one.
+        """
+        frozen = self.freeze()
+        shards = {}  # type: Dict[str, Dict[str, Any]]
+        for name, weightsname in (('terms', 'weights'), ('titleterms', 'titleweights')):
+            weights = frozen.pop(weightsname)
+            for word, postings in frozen.pop(name).items():
+                key = shard_key(word, length)
+                if key not in shards:
+                    shards[key] = {'terms': {}, 'titleterms': {},
+                                   'weights': {}, 'titleweights': {}}
+                if isinstance(postings, list):
+                    postings = postings[:1] + [b - a for a, b in zip(postings, postings[1:])]
+                shards[key][name][word] = postings
+                if word in weights:
+                    shards[key][weightsname][word] = weights[word]
+        frozen['shardlength'] = length
+        return frozen, shards
 
     def label(self) -> str:
         return "%s (code: %s)" % (self.lang.language_name, self.lang.lang)
 
     def prune(self, docnames: Iterable[str]) -> None:
         """Remove data for all docnames not in the list."""
-        new_titles = {}
-        new_filenames = {}
-        for docname in docnames:
-            if docname in self._titles:
-                new_titles[docname] = self._titles[docname]
-                new_filenames[docname] = self._filenames[docname]
-        self._titles = new_titles
-        self._filenames = new_filenames
-        for wordnames in self._mapping.values():
-            wordnames.intersection_update(docnames)
-        for wordnames in self._title_mapping.values():
-            wordnames.intersection_update(docnames)
+        for docname in set(self._titles).difference(docnames):
+            self._remove(docname)
+
+    def _remove(self, docname: str) -> None:
+        """Remove the data of *docname*, touching only the terms it contains."""
+        self._titles.pop(docname, None)
+        self._filenames.pop(docname, None)
+        terms, title_terms = self._doc_terms.pop(docname, ((), ()))
+        for words, mapping in ((terms, self._mapping), (title_terms, self._title_mapping)):
+            for word in words:
+                wordnames = mapping[word]
+                wordnames.discard(docname)
+                if not wordnames:
+                    del mapping[word]
 
     def feed(self, docname: str, filename: str, title: str, doctree: nodes.document) -> None:
         """Feed a doctree to the index."""
+        self._remove(docname)
         self._titles[docname] = title
         self._filenames[docname] = filename
 
         visitor = WordCollector(doctree, self.lang)
         doctree.walk(visitor)
+        visitor.split_texts()
 
-        # memoize self.lang.stem
-        def stem(word: str) -> str:
-            try:
-                return self._stem_cache[word]
-            except KeyError:
-                self._stem_cache[word] = self.lang.stem(word).lower()
-                return self._stem_cache[word]
+        stem_cache = self._stem_cache
         _filter = self.lang.word_filter
 
-        for word in visitor.found_title_words:
-            stemmed_word = stem(word)
-            if _filter(stemmed_word):
-                self._title_mapping.setdefault(stemmed_word, set()).add(docname)
-            elif _filter(word): # stemmer must not remove words from search index
+        def get_terms(words: List[str]) -> Dict[str, int]:
+            # every distinct word is stemmed and filtered only once
+            terms = Counter()  # type: Dict[str, int]
+            for word, count in Counter(words).items():
+                try:
+                    stemmed_word = stem_cache[word]
+                except KeyError:
+                    stemmed_word = stem_cache[word] = self.lang.stem(word).lower()
+                    self._new_stems[word] = stemmed_word
+                if _filter(stemmed_word):
+                    terms[stemmed_word] += count
+                elif _filter(word): # stemmer must not remove words from search index
+                    terms[word] += count
+            return terms
+
+        title_terms = get_terms(visitor.found_title_words)
+        terms = get_terms(visitor.found_words)
+        for word in title_terms:
+            # already indexed as a word of the titles
+            terms.pop(word, None)
+
+        for word in title_terms:
+            self._title_mapping.setdefault(word, set()).add(docname)
+        for word in terms:
+            self._mapping.setdefault(word, set()).add(docname)
+        self._doc_terms[docname] = (terms, title_terms)
+
+    def get_feeds(self) -> Tuple[Dict[str, str], Dict[str, str],
+                                 Dict[str, Tuple[Dict[str, int], Dict[str, int]]],
+                                 Dict[str, str]]:
+        """Return the data of the documents fed to the index.
+
+        It is passed from the parallel write processes to :meth:`merge_feeds`
+        of the index in the main process.
+        """
+        return self._titles, self._filenames, self._doc_terms, self._new_stems
+
+    def clear_feeds(self) -> None:
+        """Forget the data of the documents fed to the index."""
+        self._titles = {}
+        self._filenames = {}
+        self._mapping = {}
+        self._title_mapping = {}
+        self._doc_terms = {}
+        self._new_stems = {}
+
+    def merge_feeds(self, feeds: Tuple[Dict[str, str], Dict[str, str],
+                                       Dict[str, Tuple[Dict[str, int], Dict[str, int]]],
+                                       Dict[str, str]]) -> None:
+        """Merge the data returned by :meth:`get_feeds` of another index."""
+        titles, filenames, doc_terms, stems = feeds
+        self._stem_cache.update(stems)
+        for docname, (terms, title_terms) in doc_terms.items():
+            self._remove(docname)
+            for word in terms:
+                self._mapping.setdefault(word, set()).add(docname)
+            for word in title_terms:
                 self._title_mapping.setdefault(word, set()).add(docname)
-
-        for word in visitor.found_words:
-            stemmed_word = stem(word)
-            # again, stemmer must not remove words from search index
-            if not _filter(stemmed_word) and _filter(word):
-                stemmed_word = word
-            already_indexed = docname in self._title_mapping.get(stemmed_word, set())
-            if _filter(stemmed_word) and not already_indexed:
-                self._mapping.setdefault(stemmed_word, set()).add(docname)
+        self._titles.update(titles)
+        self._filenames.update(filenames)
+        self._doc_terms.update(doc_terms)
 
     def context_for_searchtool(self) -> Dict[str, Any]:
         if self.lang.js_splitter_code:
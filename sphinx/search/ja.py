@@ -138,6 +138,9 @@ class JanomeSplitter(BaseSplitter):
 
 
 class DefaultSplitter(BaseSplitter):
+    #: the number of split texts that are kept for reuse
+    cache_size = 10000
+
     patterns_ = {re.compile(pattern): value for pattern, value in {
         '[一二三四五六七八九十百千万億兆]': 'M',
         '[一-龠々〆ヵヶ]': 'H',
@@ -407,6 +410,13 @@ class DefaultSplitter(BaseSplitter):
              '相': 753, '社': -507, '福': 974, '空': -822, '者': 1811, '連': 463,
              '郎': 1082, '１': -270, 'Ｅ１': 306, 'ﾙ': -673, 'ﾝ': -496}
 
+    def __init__(self, options: Dict) -> None:
+        super().__init__(options)
+        self._ctype = {}           # type: Dict[str, str]
+        self._ctype_scores = {}    # type: Dict[str, int]
+        self._state_scores = {}    # type: Dict[str, int]
+        self._results = {}         # type: Dict[str, List[str]]
+
     # ctype_
     def ctype_(self, char: str) -> str:
         for pattern, value in self.patterns_.items():
@@ -425,93 +435,102 @@ class DefaultSplitter(BaseSplitter):
         if not input:
             return []
 
-        result = []
-        seg = ['B3', 'B2', 'B1']
-        ctype = ['O', 'O', 'O']
+        # the same text blocks (titles, admonitions, field names, ...) recur
+        # throughout a project
+        result = self._results.get(input)
+        if result is None:
+            result = self._split(input)
+            if len(self._results) >= self.cache_size:
+                self._results.clear()
+            self._results[input] = result
+        return list(result)
+
+    def _split(self, input: str) -> List[str]:
+        ctype = self._ctype.get
+        ctypes = ['O', 'O', 'O']
         for t in input:
-            seg.append(t)
-            ctype.append(self.ctype_(t))
-        seg.append('E1')
-        seg.append('E2')
-        seg.append('E3')
-        ctype.append('O')
-        ctype.append('O')
-        ctype.append('O')
-        word = seg[3]
-        p1 = 'U'
-        p2 = 'U'
-        p3 = 'U'
+            c = ctype(t)
+            if c is None:
+                c = self._ctype[t] = self.ctype_(t)
+            ctypes.append(c)
+        ctypes += ['O', 'O', 'O']
+        ctypestr = ''.join(ctypes)
+        seg = ['B3', 'B2', 'B1'] + list(input) + ['E1', 'E2', 'E3']
+
+        UW1, UW2, UW3 = self.UW1__.get, self.UW2__.get, self.UW3__.get
+        UW4, UW5, UW6 = self.UW4__.get, self.UW5__.get, self.UW6__.get
+        BW1, BW2, BW3 = self.BW1__.get, self.BW2__.get, self.BW3__.get
+        TW1, TW2 = self.TW1__.get, self.TW2__.get
+        TW3, TW4 = self.TW3__.get, self.TW4__.get
+        ctype_scores = self._ctype_scores
+        state_scores = self._state_scores
 
+        result = []
+        word = seg[3]
+        state = 'UUU'
         for i in range(4, len(seg) - 3):
-            score = self.BIAS__
-            w1 = seg[i-3]
-            w2 = seg[i-2]
-            w3 = seg[i-1]
-            w4 = seg[i]
-            w5 = seg[i+1]
-            w6 = seg[i+2]
-            c1 = ctype[i-3]
-            c2 = ctype[i-2]
-            c3 = ctype[i-1]
-            c4 = ctype[i]
-            c5 = ctype[i+1]
-            c6 = ctype[i+2]
-            score += self.ts_(self.UP1__, p1)
-            score += self.ts_(self.UP2__, p2)
-            score += self.ts_(self.UP3__, p3)
-            score += self.ts_(self.BP1__, p1 + p2)
-            score += self.ts_(self.BP2__, p2 + p3)
-            score += self.ts_(self.UW1__, w1)
-            score += self.ts_(self.UW2__, w2)
-            score += self.ts_(self.UW3__, w3)
-            score += self.ts_(self.UW4__, w4)
-            score += self.ts_(self.UW5__, w5)
-            score += self.ts_(self.UW6__, w6)
-            score += self.ts_(self.BW1__, w2 + w3)
-            score += self.ts_(self.BW2__, w3 + w4)
-            score += self.ts_(self.BW3__, w4 + w5)
-            score += self.ts_(self.TW1__, w1 + w2 + w3)
-            score += self.ts_(self.TW2__, w2 + w3 + w4)
-            score += self.ts_(self.TW3__, w3 + w4 + w5)
-            score += self.ts_(self.TW4__, w4 + w5 + w6)
-            score += self.ts_(self.UC1__, c1)
-            score += self.ts_(self.UC2__, c2)
-            score += self.ts_(self.UC3__, c3)
-            score += self.ts_(self.UC4__, c4)
-            score += self.ts_(self.UC5__, c5)
-            score += self.ts_(self.UC6__, c6)
-            score += self.ts_(self.BC1__, c2 + c3)
-            score += self.ts_(self.BC2__, c3 + c4)
-            score += self.ts_(self.BC3__, c4 + c5)
-            score += self.ts_(self.TC1__, c1 + c2 + c3)
-            score += self.ts_(self.TC2__, c2 + c3 + c4)
-            score += self.ts_(self.TC3__, c3 + c4 + c5)
-            score += self.ts_(self.TC4__, c4 + c5 + c6)
-#           score += self.ts_(self.TC5__, c4 + c5 + c6)
-            score += self.ts_(self.UQ1__, p1 + c1)
-            score += self.ts_(self.UQ2__, p2 + c2)
-            score += self.ts_(self.UQ1__, p3 + c3)
-            score += self.ts_(self.BQ1__, p2 + c2 + c3)
-            score += self.ts_(self.BQ2__, p2 + c3 + c4)
-            score += self.ts_(self.BQ3__, p3 + c2 + c3)
-            score += self.ts_(self.BQ4__, p3 + c3 + c4)
-            score += self.ts_(self.TQ1__, p2 + c1 + c2 + c3)
-            score += self.ts_(self.TQ2__, p2 + c2 + c3 + c4)
-            score += self.ts_(self.TQ3__, p3 + c1 + c2 + c3)
-            score += self.ts_(self.TQ4__, p3 + c2 + c3 + c4)
-            p = 'O'
+            w1, w2, w3, w4, w5, w6 = seg[i - 3:i + 3]
+            w23 = w2 + w3
+            w34 = w3 + w4
+            w45 = w4 + w5
+            score = (UW1(w1, 0) + UW2(w2, 0) + UW3(w3, 0) +
+                     UW4(w4, 0) + UW5(w5, 0) + UW6(w6, 0) +
+                     BW1(w23, 0) + BW2(w34, 0) + BW3(w45, 0) +
+                     TW1(w1 + w23, 0) + TW2(w2 + w34, 0) +
+                     TW3(w3 + w45, 0) + TW4(w45 + w6, 0))
+
+            window = ctypestr[i - 3:i + 3]
+            try:
+                score += ctype_scores[window]
+            except KeyError:
+                score += ctype_scores.setdefault(window, self._ctype_score(window))
+            key = state + window[:4]
+            try:
+                score += state_scores[key]
+            except KeyError:
+                score += state_scores.setdefault(key, self._state_score(key))
+
             if score > 0:
                 result.append(word.strip())
                 word = ''
-                p = 'B'
-            p1 = p2
-            p2 = p3
-            p3 = p
-            word += seg[i]
+                state = state[1:] + 'B'
+            else:
+                state = state[1:] + 'O'
+            word += w4
 
         result.append(word.strip())
         return result
 
+    def _ctype_score(self, window: str) -> int:
+        """The part of the score that depends only on the character types
+        ``c1`` to ``c6`` around the boundary.
+        """
+        c1, c2, c3, c4, c5, c6 = list(window)
+        ts = self.ts_
+        return (self.BIAS__ +
+                ts(self.UC1__, c1) + ts(self.UC2__, c2) + ts(self.UC3__, c3) +
+                ts(self.UC4__, c4) + ts(self.UC5__, c5) + ts(self.UC6__, c6) +
+                ts(self.BC1__, c2 + c3) + ts(self.BC2__, c3 + c4) +
+                ts(self.BC3__, c4 + c5) +
+                ts(self.TC1__, c1 + c2 + c3) + ts(self.TC2__, c2 + c3 + c4) +
+                ts(self.TC3__, c3 + c4 + c5) + ts(self.TC4__, c4 + c5 + c6))
+
+    def _state_score(self, key: str) -> int:
+        """The part of the score that depends on the previous boundaries
+        ``p1`` to ``p3`` and the character types ``c1`` to ``c4``.
+        """
+        p1, p2, p3, c1, c2, c3, c4 = list(key)
+        ts = self.ts_
+        # UQ1__ for p3 + c3 is what the original TinySegmenter does
+        return (ts(self.UP1__, p1) + ts(self.UP2__, p2) + ts(self.UP3__, p3) +
+                ts(self.BP1__, p1 + p2) + ts(self.BP2__, p2 + p3) +
+                ts(self.UQ1__, p1 + c1) + ts(self.UQ2__, p2 + c2) +
+                ts(self.UQ1__, p3 + c3) +
+                ts(self.BQ1__, p2 + c2 + c3) + ts(self.BQ2__, p2 + c3 + c4) +
+                ts(self.BQ3__, p3 + c2 + c3) + ts(self.BQ4__, p3 + c3 + c4) +
+                ts(self.TQ1__, p2 + c1 + c2 + c3) + ts(self.TQ2__, p2 + c2 + c3 + c4) +
+                ts(self.TQ3__, p3 + c1 + c2 + c3) + ts(self.TQ4__, p3 + c2 + c3 + c4))
+
 
 TinySegmenter = DefaultSplitter  # keep backward compatibility until Sphinx-1.6
 
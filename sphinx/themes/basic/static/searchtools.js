@@ -55,6 +55,8 @@ if (!splitQuery) {
 var Search = {
 
   _index : null,
+  _shards : {},
+  _loading_shards : 0,
   _queued_query : null,
   _pulse_status : -1,
 
@@ -103,6 +105,70 @@ var Search = {
       return this._index !== null;
   },
 
+  loadShard : function(key) {
+    var url = DOCUMENTATION_OPTIONS.URL_ROOT + this._index.shards[key];
+    this._shards[key] = null;
+    this._loading_shards++;
+    $.ajax({type: "GET", url: url, data: null,
+            dataType: "script", cache: true,
+            complete: function(jqxhr, textstatus) {
+              if (textstatus != "success") {
+                var script = document.createElement("script");
+                script.src = url;
+                script.onerror = function() {
+                  Search.setShard(key, {terms: {}, titleterms: {}});
+                };
+                document.body.appendChild(script);
+              }
+            }});
+  },
+
+  setShard : function(key, shard) {
+    var q;
+    if (this._shards[key])
+      return;
+    // the postings are delta-encoded
+    $.each([shard.terms, shard.titleterms], function() {
+      for (var word in this) {
+        var files = this[word];
+        for (var i = 1; i < files.length; i++)
+          files[i] += files[i - 1];
+      }
+    });
+    this._shards[key] = shard;
+    this._loading_shards--;
+    if (this._loading_shards === 0 && (q = this._queued_query) !== null) {
+      this._queued_query = null;
+      Search.query(q);
+    }
+  },
+
+  /**
+   * return the terms and title terms of the shards holding the given words
+   * of a sharded index, or null if some of these have to be loaded first
+   */
+  getShardTerms : function(words) {
+    var i, key, word;
+    var length = this._index.shardlength;
+    var result = {terms: {}, titleterms: {}, weights: {}, titleweights: {}};
+    for (i = 0; i < words.length; i++) {
+      key = words[i].substr(0, length).toLowerCase();
+      if (!this._index.shards.hasOwnProperty(key))
+        continue;
+      if (this._shards[key] === undefined)
+        this.loadShard(key);
+      if (!this._shards[key])
+        continue;
+      for (var name in result) {
+        for (word in this._shards[key][name])
+          result[name][word] = this._shards[key][name][word];
+      }
+    }
+    if (this._loading_shards > 0)
+      return null;
+    return result;
+  },
+
   deferQuery : function(query) {
       this._queued_query = query;
   },
@@ -199,6 +265,20 @@ var Search = {
     // prepare search
     var terms = this._index.terms;
     var titleterms = this._index.titleterms;
+    var weights = this._index.weights;
+    var titleweights = this._index.titleweights;
+    if (this._index.shards) {
+      // the terms are in separate files that are loaded as needed
+      var shardterms = this.getShardTerms(searchterms.concat(excluded));
+      if (shardterms === null) {
+        this.deferQuery(query);
+        return;
+      }
+      terms = shardterms.terms;
+      titleterms = shardterms.titleterms;
+      weights = shardterms.weights;
+      titleweights = shardterms.titleweights;
+    }
 
     // array of [filename, title, anchor, descr, score]
     var results = [];
@@ -212,7 +292,8 @@ var Search = {
     }
 
     // lookup as search terms in fulltext
-    results = results.concat(this.performTermsSearch(searchterms, excluded, terms, titleterms));
+    results = results.concat(this.performTermsSearch(searchterms, excluded, terms, titleterms,
+                                                     weights, titleweights));
 
     // let the scorer override scores with a custom scoring function
     if (Scorer.score) {
@@ -381,35 +462,47 @@ var Search = {
 
   /**
    * search for full-text terms in the index
+   *
+   * the weights of the terms in the documents, precomputed when the index is
+   * built, only break ties between results of the same score: they are
+   * scaled to [0, 0.5] for the query before they are added to the scores.
+   * Terms with the same weight in all of their documents, and older
+   * indices, have no weights.
    */
-  performTermsSearch : function(searchterms, excluded, terms, titleterms) {
+  performTermsSearch : function(searchterms, excluded, terms, titleterms,
+                                weights, titleweights) {
     var docnames = this._index.docnames;
     var filenames = this._index.filenames;
     var titles = this._index.titles;
+    weights = weights || {};
+    titleweights = titleweights || {};
 
     var i, j, file;
     var fileMap = {};
     var scoreMap = {};
+    var weightMap = {};
     var results = [];
+    var resultWeights = [];
 
     // perform the search on the required terms
     for (i = 0; i < searchterms.length; i++) {
       var word = searchterms[i];
       var files = [];
       var _o = [
-        {files: terms[word], score: Scorer.term},
-        {files: titleterms[word], score: Scorer.title}
+        {files: terms[word], weights: weights[word], score: Scorer.term},
+        {files: titleterms[word], weights: titleweights[word], score: Scorer.title}
       ];
       // add support for partial matches
       if (word.length > 2) {
         for (var w in terms) {
           if (w.match(word) && !terms[word]) {
-            _o.push({files: terms[w], score: Scorer.partialTerm})
+            _o.push({files: terms[w], weights: weights[w], score: Scorer.partialTerm})
           }
         }
         for (var w in titleterms) {
           if (w.match(word) && !titleterms[word]) {
-              _o.push({files: titleterms[w], score: Scorer.partialTitle})
+              _o.push({files: titleterms[w], weights: titleweights[w],
+                       score: Scorer.partialTitle})
           }
         }
       }
@@ -421,11 +514,14 @@ var Search = {
       // found search word in contents
       $u.each(_o, function(o) {
         var _files = o.files;
+        var _weights = o.weights;
         if (_files === undefined)
           return
 
-        if (_files.length === undefined)
+        if (_files.length === undefined) {
           _files = [_files];
+          _weights = [_weights];
+        }
         files = files.concat(_files);
 
         // set score for the word in each file to Scorer.term
@@ -434,6 +530,9 @@ var Search = {
           if (!(file in scoreMap))
             scoreMap[file] = {};
           scoreMap[file][word] = o.score;
+          // the weights are given in tenths
+          if (_weights !== undefined && _weights[j] !== undefined)
+            weightMap[file] = (weightMap[file] || 0) + _weights[j] / 10;
         }
       });
 
@@ -472,12 +571,19 @@ var Search = {
 
       // if we have still a valid result we can add it to the result list
       if (valid) {
-        // select one (max) score for the file.
-        // for better ranking, we should calculate ranking by using words statistics like basic tf-idf...
+        // select one (max) score for the file
         var score = $u.max($u.map(fileMap[file], function(w){return scoreMap[file][w]}));
         results.push([docnames[file], titles[file], '', null, score, filenames[file]]);
+        resultWeights.push(weightMap[file] || 0);
       }
     }
+
+    // add the weights of the words in the files, relative to the largest one
+    var maxWeight = Math.max.apply(null, resultWeights.concat([0]));
+    if (maxWeight > 0) {
+      for (i = 0; i < results.length; i++)
+        results[i][4] += resultWeights[i] / (2 * maxWeight);
+    }
     return results;
   },
 
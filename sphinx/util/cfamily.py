@@ -245,6 +245,8 @@ class BaseParser:
         self.last_match = None  # type: Match
         self._previous_state = (0, None)  # type: Tuple[int, Match]
         self.otherErrors = []  # type: List[DefinitionError]
+        # whether a warning has been emitted while parsing
+        self.warned = False
 
         # in our tests the following is set to False to capture bad parsing
         self.allowFallbackExpressionParsing = True
@@ -293,6 +295,7 @@ class BaseParser:
         raise self._make_multi_error(errors, '')
 
     def warn(self, msg: str) -> None:
+        self.warned = True
         logger.warning(msg, location=self.location)
 
     def match(self, regex: Pattern) -> bool:
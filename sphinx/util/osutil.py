@@ -118,17 +118,23 @@ def copytimes(source: str, dest: str) -> None:
         os.utime(dest, (st.st_atime, st.st_mtime))
 
 
-def copyfile(source: str, dest: str) -> None:
+def copyfile(source: str, dest: str) -> bool:
     """Copy a file and its modification times, if possible.
 
-    Note: ``copyfile`` skips copying if the file has not been changed"""
-    if not path.exists(dest) or not filecmp.cmp(source, dest):
-        shutil.copyfile(source, dest)
-        try:
-            # don't do full copystat because the source may be read-only
-            copytimes(source, dest)
-        except OSError:
-            pass
+    Note: ``copyfile`` skips copying if the file has not been changed
+
+    Return True if the file was copied.
+    """
+    if path.exists(dest) and filecmp.cmp(source, dest):
+        return False
+
+    shutil.copyfile(source, dest)
+    try:
+        # don't do full copystat because the source may be read-only
+        copytimes(source, dest)
+    except OSError:
+        pass
+    return True
 
 
 no_fn_re = re.compile(r'[^a-zA-Z0-9_-]')
@@ -13,15 +13,18 @@ import platform
 import sys
 import time
 import traceback
+from collections import OrderedDict
 from math import sqrt
-from typing import Any, Callable, Dict, List, Sequence
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Set, Tuple
 
 try:
     import multiprocessing
+    from multiprocessing.connection import wait
 except ImportError:
     multiprocessing = None
 
 from sphinx.errors import SphinxParallelError
+from sphinx.locale import __
 from sphinx.util import logging
 
 logger = logging.getLogger(__name__)
@@ -40,15 +43,19 @@ class SerialTasks:
     """Has the same interface as ParallelTasks, but executes tasks directly."""
 
     def __init__(self, nproc: int = 1) -> None:
-        pass
+        self._taskid = 0
 
-    def add_task(self, task_func: Callable, arg: Any = None, result_func: Callable = None) -> None:  # NOQA
+    def add_task(self, task_func: Callable, arg: Any = None, result_func: Callable = None,
+                 after: Iterable[int] = (), forked: bool = False) -> int:
         if arg is not None:
             res = task_func(arg)
         else:
             res = task_func()
         if result_func:
             result_func(res)
+        # tasks run right away, so the tasks in *after* have run already
+        self._taskid += 1
+        return self._taskid - 1
 
     def join(self) -> None:
         pass
@@ -128,7 +135,288 @@ class ParallelTasks:
             self._pworking += 1
 
 
-def make_chunks(arguments: Sequence[str], nproc: int, maxbatch: int = 10) -> List[Any]:
+class ConcurrentTasks(ParallelTasks):
+    """Executes tasks concurrently, in the order given by their dependencies.
+
+    :meth:`add_task` returns the ID of the task; the task starts only after
+    the tasks whose IDs are given in *after* have finished.  Tasks added with
+    ``forked=True`` run in a forked process each, at most *nproc* at a time,
+    as soon as they are ready.  The logs of a forked task are emitted when it
+    has finished.
+
+    The other tasks may change the state of the main process; they run there
+    one after the other, in the order they were added.  Like with
+    :class:`SerialTasks`, such a task runs right away in :meth:`add_task` if
+    it has no dependencies and no earlier task of the main process is
+    waiting; otherwise it runs when :meth:`join` is called.
+
+    If a task fails, the processes still running are terminated.
+    """
+
+    def __init__(self, nproc: int) -> None:
+        super().__init__(nproc)
+        # tasks not started yet: task ID -> (function, dependencies, forked)
+        self._pending = OrderedDict()  # type: Dict[int, Tuple[Callable, Set[int], bool]]
+        # forked tasks running: task ID -> (process, receiving pipe connection)
+        self._running = {}  # type: Dict[int, Tuple[multiprocessing.Process, Any]]
+        # IDs of the finished tasks
+        self._finished = set()  # type: Set[int]
+
+    def add_task(self, task_func: Callable, arg: Any = None, result_func: Callable = None,
+                 after: Iterable[int] = (), forked: bool = False) -> int:
+        tid = self._taskid
+        self._taskid += 1
+        self._result_funcs[tid] = result_func or (lambda arg, result: None)
+        self._args[tid] = arg
+        self._pending[tid] = (task_func, set(after), forked)
+        try:
+            self._start_forked()
+            if self._next_main_task() == tid and not after:
+                self._run_main_task(tid)
+        except BaseException:
+            self.terminate()
+            raise
+        return tid
+
+    def join(self) -> None:
+        try:
+            while self._pending or self._running:
+                self._start_forked()
+                tid = self._next_main_task()
+                if tid is not None and self._pending[tid][1] <= self._finished:
+                    self._run_main_task(tid)
+                elif self._running:
+                    self._join_forked()
+                else:
+                    raise SphinxParallelError(__('unsatisfiable task dependencies'), '')
+        except BaseException:
+            self.terminate()
+            raise
+
+    def terminate(self) -> None:
+        """Kill the running processes and drop the pending tasks."""
+        for proc, precv in self._running.values():
+            proc.terminate()
+            proc.join()
+            precv.close()
+        self._running.clear()
+        self._pending.clear()
+
+    def _next_main_task(self) -> int:
+        """Return the ID of the first pending task of the main process, if any."""
+        return next((tid for tid, (_, _, forked) in self._pending.items()
+                     if not forked), None)
+
+    def _run_main_task(self, tid: int) -> None:
+        func = self._pending.pop(tid)[0]
+        arg = self._args[tid]
+        self._finish(tid, func() if arg is None else func(arg))
+
+    def _start_forked(self) -> None:
+        for tid, (func, after, forked) in list(self._pending.items()):
+            if len(self._running) >= self.nproc:
+                break
+            if forked and after <= self._finished:
+                del self._pending[tid]
+                precv, psend = multiprocessing.Pipe(False)
+                proc = multiprocessing.Process(target=self._process,
+                                               args=(psend, func, self._args[tid]))
+                proc.start()
+                # the pipe reports EOF once the process has exited, even if it
+                # died before sending its result
+                psend.close()
+                self._running[tid] = (proc, precv)
+
+    def _join_forked(self) -> None:
+        conns = []  # type: List[Any]
+        for proc, precv in self._running.values():
+            conns += [precv, proc.sentinel]
+        wait(conns)
+        for tid, (proc, precv) in list(self._running.items()):
+            if not precv.poll():
+                continue
+            try:
+                exc, logs, result = precv.recv()
+            except (EOFError, OSError) as err:
+                # the process died without sending a result
+                raise SphinxParallelError(__('a task process exited unexpectedly'),
+                                          '') from err
+            if exc:
+                raise SphinxParallelError(*result)
+            for log in logs:
+                logger.handle(log)
+            proc.join()
+            del self._running[tid]
+            self._finish(tid, result)
+
+    def _finish(self, tid: int, result: Any) -> None:
+        self._result_funcs.pop(tid)(self._args.pop(tid), result)
+        self._finished.add(tid)
+
+
+class WorkerPool:
+    """Executes tasks in *nproc* long-lived worker processes.
+
+    Unlike :class:`ParallelTasks`, which forks a new process for every task,
+    the workers are forked once (when the first task is added) and pull tasks
+    from a shared work queue until :meth:`join` is called.  Results are
+    handled as soon as a worker sends them back.
+
+    The workers inherit the task functions at fork time, so closures can be
+    used as task functions.  Adding a task with a function the running
+    workers do not know yet waits for the pending tasks and restarts them.
+    """
+
+    def __init__(self, nproc: int) -> None:
+        self.nproc = nproc
+        # (optional) function performed by each task on the result of main task
+        self._result_funcs = {}  # type: Dict[int, Callable]
+        # arguments of pending tasks
+        self._args = {}  # type: Dict[int, Any]
+        # task functions known to the workers
+        self._funcs = []  # type: List[Callable]
+        # worker processes
+        self._procs = []  # type: List[multiprocessing.Process]
+        # receiving pipe connections of the workers
+        self._precvs = []  # type: List[Any]
+        # shared work queue
+        self._queue = None  # type: multiprocessing.Queue
+        # task number of each task
+        self._taskid = 0
+
+    def _work(self, queue: Any, pipe: Any) -> None:
+        while True:
+            task = queue.get()
+            if task is None:
+                break
+
+            tid, funcid, arg = task
+            func = self._funcs[funcid]
+            try:
+                collector = logging.LogCollector()
+                with collector.collect():
+                    if arg is None:
+                        ret = func()
+                    else:
+                        ret = func(arg)
+                failed = False
+            except BaseException as err:
+                failed = True
+                errmsg = traceback.format_exception_only(err.__class__, err)[0].strip()
+                ret = (errmsg, traceback.format_exc())
+            logging.convert_serializable(collector.logs)
+            pipe.send((tid, failed, collector.logs, ret))
+
+    def _start(self) -> None:
+        self._queue = multiprocessing.Queue()
+        for i in range(self.nproc):
+            precv, psend = multiprocessing.Pipe(False)
+            proc = multiprocessing.Process(target=self._work, args=(self._queue, psend),
+                                           daemon=True)
+            proc.start()
+            psend.close()
+            self._procs.append(proc)
+            self._precvs.append(precv)
+
+    def _stop(self) -> None:
+        for _ in range(len(self._procs)):
+            self._queue.put(None)
+        for proc in self._procs:
+            proc.join()
+        for precv in self._precvs:
+            precv.close()
+        self._queue.close()
+        self._queue.join_thread()
+        self._procs = []
+        self._precvs = []
+        self._queue = None
+
+    def terminate(self) -> None:
+        """Kill all workers and drop the pending tasks."""
+        for proc in self._procs:
+            proc.terminate()
+            proc.join()
+        for precv in self._precvs:
+            precv.close()
+        if self._queue:
+            self._queue.close()
+            self._queue.cancel_join_thread()
+        self._procs = []
+        self._precvs = []
+        self._queue = None
+        self._result_funcs.clear()
+        self._args.clear()
+
+    def add_task(self, task_func: Callable, arg: Any = None, result_func: Callable = None) -> None:  # NOQA
+        if task_func not in self._funcs:
+            if self._procs:
+                # the running workers were forked before task_func was known
+                self.join()
+            self._funcs.append(task_func)
+        if not self._procs:
+            self._start()
+
+        tid = self._taskid
+        self._taskid += 1
+        self._result_funcs[tid] = result_func or (lambda arg, result: None)
+        self._args[tid] = arg
+        self._queue.put((tid, self._funcs.index(task_func), arg))
+
+        # handle finished tasks; block if too many tasks are queued already
+        if len(self._args) >= 2 * self.nproc:
+            self._join_one(timeout=None)
+        else:
+            self._join_one(timeout=0)
+
+    def join(self) -> None:
+        try:
+            while self._args:
+                self._join_one(timeout=None)
+        except BaseException:
+            self.terminate()
+            raise
+
+        if self._procs:
+            self._stop()
+
+    def _join_one(self, timeout: float = None) -> None:
+        sentinels = {proc.sentinel: proc for proc in self._procs}
+        ready = wait(self._precvs + list(sentinels), timeout)
+        received = died = False
+        for pipe in ready:
+            if pipe in sentinels:
+                died = True
+                continue
+            try:
+                tid, exc, logs, result = pipe.recv()
+            except EOFError:
+                died = True
+                continue
+            received = True
+            if exc:
+                self.terminate()
+                raise SphinxParallelError(*result)
+            for log in logs:
+                logger.handle(log)
+            self._result_funcs.pop(tid)(self._args.pop(tid), result)
+
+        if died and not received:
+            self.terminate()
+            raise SphinxParallelError(__('a worker process exited unexpectedly'), '')
+
+
+def make_chunks(arguments: Sequence[str], nproc: int, maxbatch: int = 10,
+                costs: Dict[str, float] = None) -> List[Any]:
+    """Partition *arguments* into chunks that are processed by one task.
+
+    If *costs*, the estimated processing time of each argument, are given,
+    the chunks are cut by cost: the arguments are ordered from the most to the
+    least expensive, and each chunk takes a share of the remaining cost that
+    shrinks as the work progresses.  The first chunks hold the expensive
+    arguments, each on its own if need be, and the last chunks are small, so
+    that the workers that become idle pick them up and finish at about the
+    same time.
+    """
     # determine how many documents to read in one go
     nargs = len(arguments)
     chunksize = nargs // nproc
@@ -137,8 +425,38 @@ def make_chunks(arguments: Sequence[str], nproc: int, maxbatch: int = 10) -> Lis
         chunksize = int(sqrt(nargs / nproc * maxbatch))
     if chunksize == 0:
         chunksize = 1
+    if costs is not None and nargs:
+        return _make_balanced_chunks(arguments, nproc, chunksize, costs)
+
     nchunks, rest = divmod(nargs, chunksize)
     if rest:
         nchunks += 1
     # partition documents in "chunks" that will be written by one Process
     return [arguments[i * chunksize:(i + 1) * chunksize] for i in range(nchunks)]
+
+
+def _make_balanced_chunks(arguments: Sequence[str], nproc: int, chunksize: int,
+                          costs: Dict[str, float]) -> List[List[str]]:
+    arguments = sorted(arguments, key=lambda arg: costs.get(arg, 0), reverse=True)
+    remaining = sum(costs.get(arg, 0) for arg in arguments)
+    # do not cut more chunks than by count; each task has some overhead
+    min_limit = remaining / -(-len(arguments) // chunksize)
+
+    chunks = []  # type: List[List[str]]
+    chunk = []  # type: List[str]
+    chunk_cost = limit = 0.0
+    for arg in arguments:
+        cost = costs.get(arg, 0)
+        if chunk and (chunk_cost + cost > limit or len(chunk) >= chunksize):
+            chunks.append(chunk)
+            remaining -= chunk_cost
+            chunk = []
+            chunk_cost = 0.0
+        if not chunk:
+            # guided scheduling: a chunk takes a share of the remaining work
+            limit = max(remaining / (2 * nproc), min_limit)
+        chunk.append(arg)
+        chunk_cost += cost
+    if chunk:
+        chunks.append(chunk)
+    return chunks
@@ -8,7 +8,6 @@
     :copyright: Copyright 2007-2020 by the Sphinx team, see AUTHORS.
     :license: BSD, see LICENSE for details.
 """
-import pickle
 from itertools import product, zip_longest
 from operator import itemgetter
 from os import path
@@ -17,6 +16,7 @@ from uuid import uuid4
 
 from docutils.nodes import Node
 
+from sphinx.environment.doctrees import DoctreeFormatError
 from sphinx.transforms import SphinxTransform
 
 if False:
@@ -163,8 +163,8 @@ class UIDTransform(SphinxTransform):
             try:
                 filename = path.join(env.doctreedir, env.docname + '.doctree')
                 with open(filename, 'rb') as f:
-                    old_doctree = pickle.load(f)
-            except OSError:
+                    old_doctree = env.doctree_serializer.loads(f.read())
+            except (OSError, DoctreeFormatError):
                 pass
 
         # add uids for versioning
@@ -0,0 +1,48 @@
+describe('Search', function() {
+
+  describe('performTermsSearch', function() {
+
+    beforeEach(function() {
+      Search._index = {
+        docnames: ['index', 'title', 'text', 'rare'],
+        filenames: ['index.rst', 'title.rst', 'text.rst', 'rare.rst'],
+        titles: ['Index', 'Title', 'Text', 'Rare']
+      };
+    });
+
+    function scores(results) {
+      var res = {};
+      $.each(results, function(i, result) {
+        res[result[0]] = result[4];
+      });
+      return res;
+    }
+
+    it('should only break ties with the weights of the terms', function() {
+      var terms = {sphinx: [2, 3]};
+      var titleterms = {sphinx: 1};
+      var weights = {sphinx: [90, 40]};
+      // the weights of a term in a single document are not stored
+      var titleweights = {};
+      var res = scores(Search.performTermsSearch(['sphinx'], [], terms, titleterms,
+                                                 weights, titleweights));
+
+      // a match in the title outranks any match in the text
+      expect(res['title']).toBeGreaterThanOrEqual(Scorer.title);
+      expect(res['title']).toBeLessThan(Scorer.title + 1);
+      expect(res['text']).toBeGreaterThan(res['rare']);
+      expect(res['rare']).toBeGreaterThan(Scorer.term);
+      expect(res['text']).toBeLessThan(Scorer.term + 1);
+    });
+
+    it('should keep the scores of indices without weights', function() {
+      var terms = {sphinx: [2, 3]};
+      var titleterms = {sphinx: 1};
+      var res = scores(Search.performTermsSearch(['sphinx'], [], terms, titleterms));
+
+      expect(res).toEqual({title: Scorer.title, text: Scorer.term, rare: Scorer.term});
+    });
+
+  });
+
+});
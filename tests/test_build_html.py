@@ -13,13 +13,21 @@ import re
 from itertools import cycle, chain
 
 import pytest
+from docutils import nodes
+from docutils.core import publish_parts
+from docutils.io import DocTreeInput
 from html5lib import HTMLParser
 
-from sphinx.builders.html import validate_html_extra_path, validate_html_static_path
+from sphinx.builders.dirhtml import DirectoryHTMLBuilder
+from sphinx.builders.html import (
+    StandaloneHTMLBuilder, validate_html_extra_path, validate_html_static_path
+)
 from sphinx.errors import ConfigError
 from sphinx.testing.util import strip_escseq
 from sphinx.util import docutils, md5
 from sphinx.util.inventory import InventoryFile
+from sphinx.util.parallel import parallel_available
+from sphinx.writers.html import HTMLWriter
 
 
 ENV_WARNINGS = """\
@@ -1592,3 +1600,81 @@ def test_html_codeblock_linenos_style_inline(app):
     content = (app.outdir / 'index.html').read_text()
 
     assert '<span class="lineno">1 </span>' in content
+
+
+@pytest.mark.skipif(not parallel_available, reason="parallel build is not available")
+@pytest.mark.sphinx('html', srcdir='html_parallel_write', freshenv=True)
+def test_html_parallel_write(app):
+    app.parallel = 2
+    app.build()
+
+    # the results of the write processes are merged into the main process
+    assert (app.outdir / '_images' / 'img.png').exists()
+    assert (app.outdir / '_images' / 'rimg.png').exists()
+    assert set(app.builder.indexer._titles) == app.env.found_docs
+    searchindex = (app.outdir / 'searchindex.js').read_text()
+    assert '"subdir/images"' in searchindex
+    assert '"footnot":' in searchindex
+
+
+@pytest.mark.sphinx('html', testroot='basic')
+def test_render_partial(app):
+    def publish(node):
+        doc = docutils.new_document('<partial node>')
+        doc.append(node)
+        return publish_parts(reader_name='doctree',
+                             writer=HTMLWriter(app.builder),
+                             source_class=DocTreeInput,
+                             settings_overrides={'output_encoding': 'unicode'},
+                             source=doc)
+
+    title = nodes.title('', 'Sphinx ', nodes.emphasis('', '<world>'))
+    items = nodes.bullet_list('', nodes.list_item('', nodes.paragraph('', 'item')))
+    assert app.builder.render_partial(None) == {'fragment': ''}
+    for node in (title, items, title):
+        # the reused publisher gives the same parts as publish_parts()
+        parts = app.builder.render_partial(node)
+        assert parts == publish(node)
+
+    assert app.builder.render_partial(title)['title'] == 'Sphinx <em>&lt;world&gt;</em>'
+
+
+@pytest.mark.sphinx('html', testroot='basic', srcdir='html_write_if_changed',
+                    confoverrides={'html_write_if_changed': True})
+def test_html_write_if_changed(app, status, warning):
+    app.build()
+    assert app.builder.output_stats['unchanged'] == 0
+    assert 'output files: %d written, 0 unchanged' % app.builder.output_stats['written'] \
+        in status.getvalue()
+
+    index = app.outdir / 'index.html'
+    source = app.outdir / '_sources' / 'index.rst.txt'
+    content = index.read_bytes()
+    os.utime(index, (0, 0))
+    os.utime(source, (0, 0))
+
+    # identical files are left alone
+    app.builder.build_all()
+    assert app.builder.output_stats['written'] == 0
+    assert app.builder.output_stats['unchanged'] > 0
+    assert index.stat().st_mtime == 0
+    assert source.stat().st_mtime == 0
+    assert index.read_bytes() == content
+
+    # changed ones are written
+    (app.srcdir / 'index.rst').write_text((app.srcdir / 'index.rst').read_text() + '\nadded\n')
+    app.build()
+    assert app.builder.output_stats['written'] == 2
+    assert index.stat().st_mtime > 0
+    assert source.stat().st_mtime > 0
+    assert 'added' in index.read_text()
+
+
+def test_html_parallel_resolve_not_inherited():
+    class CustomHTMLBuilder(StandaloneHTMLBuilder):
+        pass
+
+    for builder, parallel_resolve in [(StandaloneHTMLBuilder, True),
+                                      (DirectoryHTMLBuilder, True),
+                                      (CustomHTMLBuilder, False)]:
+        assert builder._parallel_resolve(builder.__new__(builder)) is parallel_resolve
@@ -512,6 +512,67 @@ def test_attributes():
     check('function', 'LIGHTGBM_C_EXPORT int LGBM_BoosterFree(int handle)',
           {1: 'LGBM_BoosterFree'})
 
+
+def test_symbol_lookup():
+    from sphinx.domains.c import ASTIdentifier
+
+    def add(rootSymbol, name, string, docname='TestDoc'):
+        return rootSymbol.add_declaration(parse(name, string), docname=docname)
+
+    def find(rootSymbol, name, recurseInAnon=True):
+        return rootSymbol.find_identifier(ASTIdentifier(name), matchSelf=False,
+                                          recurseInAnon=recurseInAnon,
+                                          searchInSiblings=False)
+
+    rootSymbol = Symbol(None, None, None, None)
+    add(rootSymbol, 'member', 'int @a.y')
+    add(rootSymbol, 'member', 'int y')
+    add(rootSymbol, 'member', 'int z')
+    add(rootSymbol, 'member', 'int @b.z')
+    for i in range(100):
+        add(rootSymbol, 'function', 'void f%d()' % i)
+
+    for symbol in rootSymbol.get_all_symbols():
+        if symbol.declaration:
+            assert rootSymbol.direct_lookup(symbol.get_lookup_key()) is symbol
+
+    # members of anonymous entities are found in the order of the declarations
+    assert find(rootSymbol, 'y').parent.ident.is_anon()
+    assert find(rootSymbol, 'y', recurseInAnon=False).parent is rootSymbol
+    assert find(rootSymbol, 'z').parent is rootSymbol
+
+    find(rootSymbol, 'f42').remove()
+    assert find(rootSymbol, 'f42') is None
+
+    otherSymbol = Symbol(None, None, None, None)
+    add(otherSymbol, 'function', 'void g()', docname='OtherDoc')
+    rootSymbol.merge_with(otherSymbol, ['OtherDoc'], env=None)
+    assert str(find(rootSymbol, 'g').declaration) == 'void g()'
+
+
+def test_symbol_clear_doc():
+    def declarations(rootSymbol):
+        return sorted((str(s.declaration), s.docname)
+                      for s in rootSymbol.get_all_symbols()
+                      if s.declaration and s.declaration.objectType == 'function')
+
+    rootSymbol = Symbol(None, None, None, None)
+    for docname in ('a', 'b'):
+        for i in range(3):
+            ast = parse('function', 'void %s_f%d(int %s)' % (docname, i, docname))
+            rootSymbol.add_declaration(ast, docname=docname)
+
+    rootSymbol.clear_doc('a')
+    assert declarations(rootSymbol) == [
+        ('void b_f0(int b)', 'b'), ('void b_f1(int b)', 'b'), ('void b_f2(int b)', 'b')]
+
+    # symbols declared after the index has been built are indexed as well
+    rootSymbol.add_declaration(parse('function', 'void a_f0(int a)'), docname='a')
+    rootSymbol.clear_doc('b')
+    assert declarations(rootSymbol) == [('void a_f0(int a)', 'a')]
+    rootSymbol.clear_doc('a')
+    assert declarations(rootSymbol) == []
+
 # def test_print():
 #     # used for getting all the ids out for checking
 #     for a in ids:
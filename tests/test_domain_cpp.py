@@ -8,6 +8,7 @@
     :license: BSD, see LICENSE for details.
 """
 
+import pickle
 import re
 
 import pytest
@@ -19,6 +20,7 @@ from sphinx.domains.cpp import DefinitionParser, DefinitionError, NoOldIdError
 from sphinx.domains.cpp import Symbol, _max_id, _id_prefix
 from sphinx.testing import restructuredtext
 from sphinx.testing.util import assert_node
+from sphinx.util.build_phase import BuildPhase
 from sphinx.util import docutils
 
 
@@ -964,6 +966,119 @@ def test_xref_parsing():
     check('T f()')
 
 
+def test_symbol_lookup():
+    from sphinx.domains.cpp import ASTIdentifier
+
+    def names(symbols):
+        return [str(s.declaration) for s in symbols]
+
+    def add(rootSymbol, name, string, docname='TestDoc'):
+        return rootSymbol.add_declaration(parse(name, string), docname=docname)
+
+    rootSymbol = Symbol(None, None, None, None, None, None)
+    add(rootSymbol, 'member', 'int @a::y')
+    add(rootSymbol, 'member', 'int y')
+    add(rootSymbol, 'member', 'int z')
+    add(rootSymbol, 'member', 'int @b::z')
+    add(rootSymbol, 'class', 'template<typename T> B')
+    add(rootSymbol, 'class', 'template<> B<int>')
+    f1 = add(rootSymbol, 'function', 'void f(int)')
+    f2 = add(rootSymbol, 'function', 'void f(double)')
+    for i in range(100):
+        add(rootSymbol, 'function', 'void g%d()' % i)
+
+    for symbol in rootSymbol.get_all_symbols():
+        if symbol.declaration:
+            assert rootSymbol.direct_lookup(symbol.get_lookup_key()) is symbol
+
+    # the overloads, in the order of declaration
+    symbols = rootSymbol._find_named_symbols(
+        ASTIdentifier('f'), None, None, templateShorthand=False, matchSelf=False,
+        recurseInAnon=False, correctPrimaryTemplateArgs=False, searchInSiblings=False)
+    assert list(symbols) == [f1, f2]
+
+    # members of anonymous entities are found in the order of the declarations
+    def find(name, recurseInAnon=True):
+        return rootSymbol.find_identifier(ASTIdentifier(name), matchSelf=False,
+                                          recurseInAnon=recurseInAnon,
+                                          searchInSiblings=False)
+    assert find('y').parent.identOrOp.is_anon()
+    assert find('y', recurseInAnon=False).parent is rootSymbol
+    assert find('z').parent is rootSymbol
+
+    f2.remove()
+    symbols = rootSymbol._find_named_symbols(
+        ASTIdentifier('f'), None, None, templateShorthand=False, matchSelf=False,
+        recurseInAnon=False, correctPrimaryTemplateArgs=False, searchInSiblings=False)
+    assert list(symbols) == [f1]
+
+    otherSymbol = Symbol(None, None, None, None, None, None)
+    add(otherSymbol, 'function', 'void f(int)', docname='OtherDoc')
+    add(otherSymbol, 'function', 'void h()', docname='OtherDoc')
+    rootSymbol.merge_with(otherSymbol, ['OtherDoc'], env=None)
+    assert names(rootSymbol._find_children('f', False)) == ['void f(int)']
+    assert names(rootSymbol._find_children('h', False)) == ['void h()']
+
+
+def test_symbol_clear_doc():
+    import pickle
+
+    def declarations(rootSymbol):
+        return sorted((str(s.declaration), s.docname)
+                      for s in rootSymbol.get_all_symbols()
+                      if s.declaration and s.declaration.objectType == 'function')
+
+    rootSymbol = Symbol(None, None, None, None, None, None)
+    for docname in ('a', 'b'):
+        for i in range(3):
+            ast = parse('function', 'void %s::f%d(int %s)' % (docname, i, docname))
+            rootSymbol.add_declaration(ast, docname=docname)
+
+    rootSymbol.clear_doc('a')
+    assert rootSymbol._docSymbols is not None
+    assert 'a' not in rootSymbol._docSymbols
+    assert declarations(rootSymbol) == [
+        ('void b::f0(int b)', 'b'), ('void b::f1(int b)', 'b'), ('void b::f2(int b)', 'b')]
+
+    # symbols declared after the index has been built are indexed as well
+    rootSymbol.add_declaration(parse('function', 'void a::f0(int a)'), docname='a')
+    rootSymbol.add_declaration(parse('function', 'void c::g()'), docname='c')
+    rootSymbol.clear_doc('b')
+    rootSymbol.clear_doc('c')
+    assert declarations(rootSymbol) == [('void a::f0(int a)', 'a')]
+
+    # the index is not pickled
+    rootSymbol = pickle.loads(pickle.dumps(rootSymbol))
+    assert rootSymbol._docSymbols is None
+    rootSymbol.clear_doc('a')
+    assert declarations(rootSymbol) == []
+
+
+
+def test_declaration_id_cache():
+    rootSymbol = Symbol(None, None, None, None, None, None)
+    ast = parse('function', 'void f(int)')
+    symbol = rootSymbol.add_declaration(ast, docname='a')
+    assert ast.get_id(4) == '_CPPv41fi'
+    assert ast._ids == {(4, True): '_CPPv41fi'}
+
+    # the ids are computed again for another symbol
+    otherRootSymbol = Symbol(None, None, None, None, None, None)
+    nsAst = parse('class', 'ns')
+    ns = otherRootSymbol.add_declaration(nsAst, docname='a')
+    ast.symbol = ns.add_declaration(parse('function', 'void f(int)'), docname='a')
+    assert ast.get_id(4) == '_CPPv4N2ns1fEi'
+    ast.symbol = symbol
+    assert ast.get_id(4) == '_CPPv41fi'
+
+    # ids that do not exist are not cached
+    templAst = parse('function', 'template<typename T> void g(T)')
+    rootSymbol.add_declaration(templAst, docname='a')
+    for i in range(2):
+        with pytest.raises(NoOldIdError):
+            templAst.get_id(1)
+
+
 # def test_print():
 #     # used for getting all the ids out for checking
 #     for a in ids:
@@ -1236,3 +1351,72 @@ def test_noindexentry(app):
     assert_node(doctree, (addnodes.index, desc, addnodes.index, desc))
     assert_node(doctree[0], addnodes.index, entries=[('single', 'f (C++ function)', '_CPPv41fv', '', None)])
     assert_node(doctree[2], addnodes.index, entries=[])
+
+
+def test_parse_cache(app):
+    domain = app.env.get_domain('cpp')
+    domain.parse_cache.clear()
+    text = (".. cpp:function:: void f(int i)\n"
+            ".. cpp:function:: void f(int i)\n"
+            "   :noindex:\n"
+            ".. cpp:function:: void g(int i\n")
+    restructuredtext.parse(app, text)
+    assert list(domain.parse_cache) == [
+        (('function', 'function'), 'void f(int i)', (), ())]
+
+    # a hit returns a fresh copy of the AST
+    parser = DefinitionParser('void f(int i)', location=None, config=app.config)
+    key = ('function', 'function')
+    ast = domain.parse(parser, key, lambda parser: None)
+    assert str(ast) == 'void f(int i)'
+    assert ast is not domain.parse(parser, key, lambda parser: None)
+
+    # the cache is bounded, dropping the least recently used ASTs
+    domain.parse_cache_size = 2
+    for definition in ('a', 'b', 'a', 'c'):
+        parser = DefinitionParser(definition, location=None, config=app.config)
+        domain.parse(parser, 'xref', DefinitionParser.parse_xref_object)
+    assert [key[1] for key in domain.parse_cache] == ['a', 'c']
+    del domain.parse_cache_size
+
+
+def test_parse_cache_of_workers(app):
+    domain = app.env.get_domain('cpp')
+    domain._new_parses.clear()
+    pid, domain._pid = domain._pid, -1  # as in a worker process
+    phase = app.phase
+
+    # the ASTs parsed while reading are sent back to the main process
+    app.phase = BuildPhase.READING
+    parser = DefinitionParser('read', location=None, config=app.config)
+    domain.parse(parser, 'xref', DefinitionParser.parse_xref_object)
+    assert [key[1] for key in domain._new_parses] == ['read']
+    assert [key[1] for key in domain.extract_domaindata({'index'})['parse_cache']] == ['read']
+    assert domain._new_parses == {}
+
+    # the workers of the other phases send back nothing
+    app.phase = BuildPhase.WRITING
+    parser = DefinitionParser('written', location=None, config=app.config)
+    domain.parse(parser, 'xref', DefinitionParser.parse_xref_object)
+    assert domain._new_parses == {}
+    domain._pid = pid
+    app.phase = phase
+
+
+def test_merge_domaindata_of_docnames(app):
+    domain = app.env.get_domain('cpp')
+    for docname in ('merge1', 'merge2', 'merge3'):
+        restructuredtext.parse(app, ".. cpp:class:: MergeCommon\n", docname)
+
+    def declarations():
+        return sorted(s.docname for s in domain.data['root_symbol'].get_all_symbols()
+                      if s.declaration and s.docname.startswith('merge'))
+
+    assert declarations() == ['merge1', 'merge2', 'merge3']
+
+    # the tree handed over holds the declarations of other documents as well,
+    # e.g. of those a parallel reading process has read before
+    otherdata = pickle.loads(pickle.dumps(domain.data))
+    domain.clear_doc('merge3')
+    domain.merge_domaindata(['merge3'], otherdata)
+    assert declarations() == ['merge1', 'merge2', 'merge3']
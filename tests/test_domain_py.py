@@ -9,7 +9,7 @@
 """
 
 import sys
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 import pytest
 from docutils import nodes
@@ -22,7 +22,8 @@ from sphinx.addnodes import (
 )
 from sphinx.domains import IndexEntry
 from sphinx.domains.python import (
-    py_sig_re, _parse_annotation, _pseudo_parse_arglist, PythonDomain, PythonModuleIndex
+    py_sig_re, _parse_annotation, _pseudo_parse_arglist, ObjectEntry, PythonDomain,
+    PythonModuleIndex
 )
 from sphinx.testing import restructuredtext
 from sphinx.testing.util import assert_node
@@ -208,6 +209,44 @@ def test_domain_py_find_obj(app, status, warning):
               ('roles', 'NestedParentA.NestedChildA.subchild_1', 'method'))])
 
 
+@pytest.mark.sphinx('dummy', testroot='domain-py')
+def test_domain_py_find_obj_fuzzy(app, status, warning):
+    app.builder.build_all()
+    domain = app.env.get_domain('py')
+
+    def find_obj(name, type):
+        return [fullname for fullname, _ in
+                domain.find_obj(app.env, None, None, name, type, searchmode=1)]
+
+    assert find_obj('child_1', 'meth') == ['NestedParentA.child_1', 'NestedParentB.child_1']
+    assert find_obj('NestedParentB.child_1', 'meth') == ['NestedParentB.child_1']
+    assert find_obj('submodule.ModTopLevel', 'class') == ['module_a.submodule.ModTopLevel',
+                                                          'module_b.submodule.ModTopLevel']
+    assert find_obj('child_1', 'class') == []
+    assert find_obj('hild_1', 'meth') == []
+
+    # the index of the names follows the changes of the objects
+    domain.clear_doc('roles')
+    assert find_obj('child_1', 'meth') == []
+    app.env.temp_data['docname'] = 'other'
+    domain.note_object('Other.child_1', 'method', 'Other.child_1')
+    assert find_obj('child_1', 'meth') == ['Other.child_1']
+    domain.merge_domaindata(['roles'], {'objects': {
+        'NestedParentA.child_1': ObjectEntry('roles', 'NestedParentA.child_1', 'method')
+    }, 'modules': {}})
+    assert find_obj('child_1', 'meth') == ['Other.child_1', 'NestedParentA.child_1']
+
+    # the copy of the domain made by extract_domaindata() has its own index
+    merge_domaindata = PythonDomain.merge_domaindata
+    with patch.object(PythonDomain, 'merge_domaindata', autospec=True,
+                      side_effect=merge_domaindata) as merge:
+        domain.extract_domaindata(['other'])
+    other = merge.call_args[0][0]
+    assert other is not domain
+    other.clear_doc('other')
+    assert find_obj('child_1', 'meth') == ['Other.child_1', 'NestedParentA.child_1']
+
+
 def test_get_full_qualified_name():
     env = Mock(domaindata={})
     domain = PythonDomain(env)
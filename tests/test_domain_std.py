@@ -8,10 +8,11 @@
     :license: BSD, see LICENSE for details.
 """
 
-import pytest
-
+import pickle
 from unittest import mock
 
+import pytest
+
 from docutils import nodes
 from docutils.nodes import definition, definition_list, definition_list_item, term
 
@@ -394,3 +395,54 @@ def test_disabled_docref(app):
     assert_node(doctree, ([nodes.paragraph, ([pending_xref, nodes.inline, "index"],
                                              "\n",
                                              [nodes.inline, "index"])],))
+
+
+@pytest.mark.sphinx(testroot='root')
+def test_clear_document_entries(app):
+    app.build()
+    domain = app.env.get_domain('std')
+    labels = dict(domain.labels)
+    objects = dict(domain.objects)
+    assert any(docname == 'markup' for docname, _l, _l in labels.values())
+
+    removed = domain.clear_document_entries('markup')
+    assert removed['labels']
+    assert [name for name, (docname, _l, _l) in domain.labels.items()
+            if docname == 'markup'] == []
+    assert domain.objects == {key: value for key, value in objects.items()
+                              if value[0] != 'markup'}
+
+    domain.merge_document_entries(['markup'], {'labels': labels, 'objects': objects})
+    assert domain.labels == labels
+    assert domain.objects == objects
+
+    # entries changed directly in the dicts are picked up as well
+    domain.labels['new-label'] = ('markup', 'new-label', 'New label')
+    domain.clear_doc('markup')
+    assert 'new-label' not in domain.labels
+
+    # an entry that moved to another document is kept
+    domain.labels['moved'] = ('markup', 'moved', 'Moved')
+    domain.anonlabels['moved'] = ('markup', 'moved')
+    domain.labels['moved'] = ('index', 'moved', 'Moved')
+    domain.anonlabels['moved'] = ('index', 'moved')
+    domain.clear_doc('markup')
+    assert domain.labels['moved'] == ('index', 'moved', 'Moved')
+    domain.clear_doc('index')
+    assert 'moved' not in domain.labels
+    assert 'moved' not in domain.anonlabels
+
+    # so is an entry replacing another one
+    domain.labels['old'] = ('markup', 'old', 'Old')
+    del domain.labels['old']
+    domain.labels['new'] = ('markup', 'new', 'New')
+    domain.clear_doc('markup')
+    assert 'new' not in domain.labels
+
+    # the data is pickled as plain dicts, and indexed again on first use
+    app.env.domaindata['std'] = domain.data = pickle.loads(pickle.dumps(domain.data))
+    assert type(domain.data['labels']) is dict
+    domain.merge_document_entries(['markup'], {'labels': labels, 'objects': objects})
+    domain.clear_doc('markup')
+    assert [name for name, (docname, _l, _l) in domain.labels.items()
+            if docname == 'markup'] == []
@@ -8,13 +8,21 @@
     :license: BSD, see LICENSE for details.
 """
 import os
+import pickle
 import shutil
+import time
 import pytest
+from docutils import nodes
 
 from sphinx.builders.html import StandaloneHTMLBuilder
 from sphinx.builders.latex import LaTeXBuilder
 from sphinx.environment import CONFIG_OK, CONFIG_CHANGED, CONFIG_EXTENSIONS_CHANGED, CONFIG_NEW
+from sphinx.environment.doctrees import (
+    DoctreeCache, DoctreeFormatError, DoctreeSerializer, compressors
+)
+from sphinx.environment.storage import ShardedStorage, load_environment
 from sphinx.testing.comparer import PathComparer
+from sphinx.util.docutils import new_document
 
 
 @pytest.mark.sphinx('dummy', testroot='basic')
@@ -105,6 +113,217 @@ def test_object_inventory(app):
     assert app.env.domains['c'].data is app.env.domaindata['c']
 
 
+@pytest.mark.sphinx('dummy')
+def test_extract_info(app):
+    app.build()
+    env = app.env
+    docnames = {'objects', 'images'}
+    other = pickle.loads(pickle.dumps(env.extract_info(docnames)))
+
+    assert set(other.all_docs) == docnames
+    assert set(other.read_durations) == docnames
+    assert set(other.titles) == docnames
+    assert set(other.tocs) == docnames
+    assert {obj.docname for obj in other.domaindata['py']['objects'].values()} == {'objects'}
+    labels = other.domaindata['std']['labels']
+    assert not {doc for doc, _, _ in labels.values()} & (env.found_docs - docnames)
+    assert all(docs <= docnames for docs, _ in other.images.values())
+    assert 'img.png' in other.images
+
+    # merging the extracted information restores the environment
+    py_objects = dict(env.domaindata['py']['objects'])
+    std_labels = dict(env.domaindata['std']['labels'])
+    titles = {docname: title.astext() for docname, title in env.titles.items()}
+    for docname in docnames:
+        env.clear_doc(docname)
+    assert py_objects != env.domaindata['py']['objects']
+    env.merge_info_from(docnames, other, app)
+    assert env.domaindata['py']['objects'] == py_objects
+    assert env.domaindata['std']['labels'] == std_labels
+    assert {docname: title.astext() for docname, title in env.titles.items()} == titles
+
+
+@pytest.mark.sphinx('dummy')
+def test_estimate_costs(app):
+    app.build()
+    app.env.read_durations = {'index': 2.0, 'images': 1.0}
+    costs = app.builder.estimate_costs(['index', 'images', 'objects'])
+    assert costs['index'] == 2.0
+    assert costs['images'] == 1.0
+
+    # estimated from the size of the source file
+    sizes = {docname: os.path.getsize(app.env.doc2path(docname))
+             for docname in ('index', 'images', 'objects')}
+    rate = 3.0 / (sizes['index'] + sizes['images'])
+    assert costs['objects'] == pytest.approx(sizes['objects'] * rate)
+
+
+@pytest.mark.sphinx('dummy', confoverrides={'environment_storage': 'sharded'})
+def test_sharded_storage(make_app, app_params):
+    args, kwargs = app_params
+    app1 = make_app(*args, freshenv=True, **kwargs)
+    app1.build()
+    storage = ShardedStorage(app1.doctreedir)
+    assert storage.exists()
+    assert os.path.isfile(storage.doc_filename('subdir/images'))
+    assert os.path.isfile(storage.domain_filename('py'))
+    assert not os.path.exists(os.path.join(app1.doctreedir, 'environment.pickle'))
+
+    # the data of a document is loaded on first access
+    app2 = make_app(*args, **kwargs)
+    shards = app2.env.titles.shards
+    assert shards.pending == set(app1.env.all_docs)
+    assert not app2.env.domaindata['py'].loaded
+    assert app2.env.domaindata['py'] == app1.env.domaindata['py']
+    assert app2.env.titles['images'].astext() == app1.env.titles['images'].astext()
+    assert 'images' in app2.env.tocs
+    assert shards.pending == set(app1.env.all_docs) - {'images'}
+    assert app2.env.metadata['images'] == app1.env.metadata['images']
+    assert app2.env.metadata['unknown'] == {}
+    assert set(app2.env.tocs) == set(app1.env.tocs)
+    assert shards.pending == set()
+
+    # only the shards of updated documents are rewritten
+    mtime = os.stat(storage.doc_filename('images')).st_mtime_ns
+    (app2.srcdir / 'objects.txt').write_text((app2.srcdir / 'objects.txt').read_text() +
+                                             '\n.. py:function:: new_function()\n')
+    app2.build()
+    assert os.stat(storage.doc_filename('images')).st_mtime_ns == mtime
+
+    app3 = make_app(*args, **kwargs)
+    assert 'new_function' in app3.env.domaindata['py']['objects']
+    assert set(app3.env.titles) == set(app1.env.titles)
+    env = load_environment(app3.doctreedir)
+    assert 'new_function' in env.domaindata['py']['objects']
+
+    # a truncated shard is detected when the environment is loaded
+    with open(storage.doc_filename('images'), 'r+b') as f:
+        f.truncate(10)
+    app4 = make_app(*args, **kwargs)
+    assert type(app4.env.titles) is dict
+    assert app4.env.titles == {}
+
+    # switching back to a single pickle file removes the shards
+    kwargs['confoverrides'] = {'environment_storage': 'pickle'}
+    app5 = make_app(*args, freshenv=True, **kwargs)
+    app5.build()
+    assert not storage.exists()
+    assert os.path.exists(os.path.join(app5.doctreedir, 'environment.pickle'))
+
+
+@pytest.mark.sphinx('dummy', srcdir='source_change_detection', freshenv=True,
+                    confoverrides={'source_change_detection': 'content'})
+def test_source_change_detection(app):
+    app.build()
+    stamps = app.env.source_stamps['includes']
+    assert set(stamps) == set(app.env.source_files('includes'))
+    assert app.srcdir / 'literal.inc' in stamps
+
+    # touching the files does not make the documents outdated
+    mtime = int(time.time() + 10) * 10 ** 9
+    for filename in app.srcdir.listdir():
+        if filename != '_build' and (app.srcdir / filename).isfile():
+            os.utime(app.srcdir / filename, ns=(mtime, mtime))
+    assert app.env.get_outdated_files(config_changed=False) == (set(), set(), set())
+    assert app.env.source_stamps['includes'][app.srcdir / 'literal.inc'][0] == mtime
+
+    # changing the content of a dependency does
+    (app.srcdir / 'literal.inc').write_text('changed')
+    assert app.env.get_outdated_files(config_changed=False) == (set(), {'includes'}, set())
+
+
+def test_DoctreeCache():
+    cache = DoctreeCache(10)
+    cache.put('foo', b'12345')
+    cache.put('bar', b'1234')
+    assert cache.get('foo') == b'12345'
+    assert cache.get('baz') is None
+
+    # 'bar' is the least recently used entry
+    cache.put('baz', b'123')
+    assert 'bar' not in cache
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'entries': 2, 'size': 8}
+
+    # too large to be cached at all
+    cache.put('qux', b'12345678901')
+    assert 'qux' not in cache
+    assert cache.size == 8
+
+    cache.discard('foo')
+    assert cache.size == 3
+
+
+@pytest.mark.sphinx('dummy', testroot='basic')
+def test_get_doctree_cached(app):
+    app.build()
+    app.env.doctree_cache.hits = app.env.doctree_cache.misses = 0
+    doctree1 = app.env.get_doctree('index')
+    doctree2 = app.env.get_doctree('index')
+    assert app.env.doctree_cache.hits == 2
+    assert app.env.doctree_cache.misses == 0
+    assert doctree1 is not doctree2
+
+    app.env.clear_doc('index')
+    assert 'index' not in app.env.doctree_cache
+
+
+def test_DoctreeSerializer(tempdir, monkeypatch):
+    doctree = new_document('index')
+    doctree += nodes.paragraph(text='Hello world')
+    doctree.settings.env = None  # unpicklable
+
+    plain = DoctreeSerializer('1.0/1')
+    compressed = DoctreeSerializer('1.0/1', 'zlib')
+    for serializer in (plain, compressed):
+        content = serializer.dumps(doctree)
+        assert content.startswith(serializer.header)
+        assert plain.loads(content).astext() == 'Hello world'
+
+    filename = tempdir / 'index.doctree'
+    filename.write_bytes(compressed.dumps(doctree))
+    assert compressed.read_header(filename) == ('1.0/1', 'zlib')
+    assert plain.is_current(filename)
+    assert not DoctreeSerializer('1.0/2').is_current(filename)
+    assert not plain.is_current(tempdir / 'unknown.doctree')
+
+    # doctrees written by older versions have no header
+    filename.write_bytes(pickle.dumps(doctree))
+    assert not plain.is_current(filename)
+    assert plain.loads(filename.read_bytes()).astext() == 'Hello world'
+
+    # unavailable methods fall back to zlib, e.g. bz2 and lzma if Python is
+    # built without them
+    assert DoctreeSerializer('1.0/1', 'unknown').compression == 'zlib'
+    monkeypatch.delitem(compressors, 'bz2', raising=False)
+    assert DoctreeSerializer('1.0/1', 'bz2').compression == 'zlib'
+
+    # doctrees that cannot be decoded raise DoctreeFormatError
+    with pytest.raises(DoctreeFormatError):
+        plain.loads(b'#sphinx-doctree 1.0/1 unknown\n' + pickle.dumps(doctree))
+    with pytest.raises(DoctreeFormatError):
+        plain.loads(b'#sphinx-doctree 1.0/1 bz2\n' + pickle.dumps(doctree))
+    with pytest.raises(DoctreeFormatError):
+        plain.loads(b'#sphinx-doctree 1.0/1 zlib\nnot compressed')
+    with pytest.raises(DoctreeFormatError):
+        plain.loads(b'#sphinx-doctree broken')
+
+
+@pytest.mark.sphinx('dummy', testroot='basic', freshenv=True,
+                    confoverrides={'doctree_compression': 'zlib'})
+def test_doctree_compression(app):
+    app.build()
+    filename = app.doctreedir / 'index.doctree'
+    assert app.env.doctree_serializer.read_header(filename)[1] == 'zlib'
+    assert app.env.get_doctree('index').astext().startswith('The basic Sphinx documentation')
+
+    # a doctree written by another version is reread
+    doctree = app.env.get_doctree('index')
+    doctree.settings.env = doctree.reporter = None
+    filename.write_bytes(DoctreeSerializer('0.1/1').dumps(doctree))
+    added, changed, removed = app.env.get_outdated_files(config_changed=False)
+    assert changed == {'index'}
+
+
 @pytest.mark.sphinx('dummy', testroot='basic')
 def test_env_relfn2path(app):
     # relative filename and root document
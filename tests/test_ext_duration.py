@@ -19,3 +19,13 @@ def test_githubpages(app, status, warning):
 
     assert 'slowest reading durations' in status.getvalue()
     assert re.search('\\d+\\.\\d{3} index\n', status.getvalue())
+
+
+@pytest.mark.sphinx('dummy', confoverrides={'extensions': ['sphinx.ext.duration']})
+def test_merge_domaindata(app):
+    app.build()
+    domain = app.env.get_domain('duration')
+    assert set(domain.reading_durations) == set(app.env.all_docs)
+
+    other = app.env.extract_info(['index', 'images'])
+    assert set(other.domaindata['duration']['reading_durations']) == {'index', 'images'}
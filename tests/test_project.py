@@ -8,6 +8,8 @@
     :license: BSD, see LICENSE for details.
 """
 
+import os
+import time
 from collections import OrderedDict
 
 import pytest
@@ -82,3 +84,30 @@ def test_project_doc2path(app):
 
     # relative path
     assert project.doc2path('index', basedir=False) == 'index.rst'
+
+
+def test_project_discover_dircache(tempdir):
+    srcdir = tempdir / 'discover'
+    (srcdir / 'sub').makedirs()
+    (srcdir / 'vendor').makedirs()
+    (srcdir / 'index.rst').write_text('')
+    (srcdir / 'sub' / 'foo.rst').write_text('')
+    (srcdir / 'vendor' / 'bar.rst').write_text('')
+    mtime = int(time.time() - 60) * 10 ** 9
+    for dirname in (srcdir, srcdir / 'sub', srcdir / 'vendor'):
+        os.utime(dirname, ns=(mtime, mtime))
+
+    project = Project(srcdir, ['.rst'])
+    assert project.discover(['vendor']) == {'index', 'sub/foo'}
+    # excluded directories are not scanned
+    assert set(project._dircache) == {'', 'sub'}
+
+    # the listing of an unchanged directory is reused
+    (srcdir / 'sub' / 'baz.rst').write_text('')
+    os.utime(srcdir / 'sub', ns=(mtime, mtime))
+    other = Project(srcdir, ['.rst'])
+    other.restore(project)
+    assert other.discover(['vendor']) == {'index', 'sub/foo'}
+
+    os.utime(srcdir / 'sub', ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+    assert other.discover(['vendor']) == {'index', 'sub/foo', 'sub/baz'}
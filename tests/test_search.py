@@ -8,6 +8,7 @@
     :license: BSD, see LICENSE for details.
 """
 
+import json
 from io import BytesIO
 from collections import namedtuple
 
@@ -15,7 +16,11 @@ import pytest
 from docutils import frontend, utils
 from docutils.parsers import rst
 
-from sphinx.search import IndexBuilder
+from sphinx.search import (
+    IndexBuilder, SearchLanguage, js_index, shard_filename, shard_key
+)
+from sphinx.search.en import SearchEnglish
+from sphinx.search.ja import DefaultSplitter
 from sphinx.util import jsdump
 
 DummyEnvironment = namedtuple('DummyEnvironment', ['version', 'domains'])
@@ -45,7 +50,7 @@ def jsload(path):
     assert searchindex.startswith('Search.setIndex(')
     assert searchindex.endswith(')')
 
-    return jsdump.loads(searchindex[16:-1])
+    return json.loads(searchindex[16:-1])
 
 
 def is_registered_term(index, keyword):
@@ -116,8 +121,8 @@ def test_term_in_heading_and_section(app, status, warning):
     # if search term is in the title of one doc and in the text of another
     # both documents should be a hit in the search index as a title,
     # respectively text hit
-    assert 'textinhead:2' in searchindex
-    assert 'textinhead:0' in searchindex
+    assert '"textinhead":2' in searchindex
+    assert '"textinhead":0' in searchindex
 
 
 @pytest.mark.sphinx(testroot='search')
@@ -167,7 +172,9 @@ def test_IndexBuilder():
                   'non': [0, 1],
                   'test': [0, 1]},
         'titles': ('title', 'title2'),
-        'titleterms': {'section_titl': [0, 1]}
+        'titleterms': {'section_titl': [0, 1]},
+        'titleweights': {},
+        'weights': {},
     }
     assert index._objtypes == {('dummy', 'objtype'): 0}
     assert index._objnames == {0: ('dummy', 'objtype', 'objtype')}
@@ -221,12 +228,188 @@ def test_IndexBuilder():
                   'non': 0,
                   'test': 0},
         'titles': ('title2',),
-        'titleterms': {'section_titl': 0}
+        'titleterms': {'section_titl': 0},
+        'titleweights': {},
+        'weights': {},
     }
     assert index._objtypes == {('dummy', 'objtype'): 0}
     assert index._objnames == {0: ('dummy', 'objtype', 'objtype')}
 
 
+def test_IndexBuilder_postings():
+    env = DummyEnvironment('1.0', {})
+    doc = utils.new_document(b'test data', settings)
+    doc['file'] = 'dummy'
+    parser.parse(FILE_CONTENTS, doc)
+    doc2 = utils.new_document(b'test data', settings)
+    doc2['file'] = 'dummy'
+    parser.parse('other\n=====\n\nfermion\n', doc2)
+
+    index = IndexBuilder(env, 'en', {}, None)
+    index.feed('docname', 'filename', 'title', doc)
+    index.feed('docname2', 'filename2', 'title2', doc2)
+    assert index._doc_terms['docname2'] == ({'fermion': 1}, {'other': 1})
+
+    # dump / load
+    stream = BytesIO()
+    index.dump_postings(stream)
+    stream.seek(0)
+    index2 = IndexBuilder(env, 'en', {}, None)
+    index2.load_postings(stream)
+    assert index2.freeze() == index.freeze()
+    # the stems are kept for the next build
+    assert index2._stem_cache['fermion'] == 'fermion'
+    assert index2._stem_cache == index._stem_cache
+
+    # the terms only used by removed documents are dropped
+    index2.prune(['docname2'])
+    assert index2._mapping == {'fermion': {'docname2'}}
+    assert index2._title_mapping == {'other': {'docname2'}}
+
+    # feeding a document again replaces its terms
+    index2.feed('docname2', 'filename2', 'title2', doc)
+    assert index2._mapping['fermion'] == {'docname2'}
+    assert 'other' not in index2._title_mapping
+
+    # the postings of another language are not used
+    stream.seek(0)
+    with pytest.raises(ValueError):
+        IndexBuilder(env, 'de', {}, None).load_postings(stream)
+
+
+def test_js_index():
+    data = {'docnames': ('index', 'page'), 'objnames': {0: ('py', 'function', 'Function')},
+            'terms': {'function': [0, 1], 'class': 1, '模块': 0}}
+    expected = {'docnames': ['index', 'page'], 'objnames': {'0': ['py', 'function', 'Function']},
+                'terms': {'function': [0, 1], 'class': 1, '模块': 0}}
+
+    dumped = js_index.dumps(data)
+    assert dumped.startswith('Search.setIndex({"docnames":')
+    assert json.loads(dumped[16:-1]) == expected
+    assert js_index.loads(dumped) == expected
+
+    # the search indices of older versions of Sphinx can be loaded
+    assert js_index.loads('Search.setIndex(%s)' % jsdump.dumps(data)) == expected
+
+    with pytest.raises(ValueError):
+        js_index.loads('var index = {}')
+
+
+def test_shard_key():
+    assert shard_key('Fermion', 2) == 'fe'
+    assert shard_key('a', 2) == 'a'
+    assert shard_key('模块中', 2) == '模块'
+    # astral characters count twice, as in JavaScript
+    assert shard_key('\U0001f600x', 1) == '\ud83d'
+    assert shard_key('\U0001f600x', 2) == '\U0001f600'
+
+    assert shard_filename('fe') == 'fe'
+    assert shard_filename('f_') == 'f_00005f'
+    assert shard_filename('模块') == '_006a21_005757'
+
+
+def test_IndexBuilder_freeze_sharded():
+    env = DummyEnvironment('1.0', {})
+    doc = utils.new_document(b'test data', settings)
+    doc['file'] = 'dummy'
+    parser.parse(FILE_CONTENTS, doc)
+
+    index = IndexBuilder(env, 'en', {}, None)
+    for i in range(4):
+        index.feed('docname%d' % i, 'filename%d' % i, 'title%d' % i, doc)
+    index._remove('docname1')
+    frozen, shards = index.freeze_sharded(1)
+    assert 'terms' not in frozen
+    assert 'titleterms' not in frozen
+    assert frozen['shardlength'] == 1
+    assert frozen['docnames'] == ('docname0', 'docname2', 'docname3')
+    assert sorted(shards) == ['c', 'f', 'i', 'n', 's', 't']
+    # the postings are delta-encoded
+    assert shards['f'] == {'terms': {'fermion': [0, 1, 1]}, 'titleterms': {},
+                           'weights': {}, 'titleweights': {}}
+    assert shards['s'] == {'terms': {}, 'titleterms': {'section_titl': [0, 1, 1]},
+                           'weights': {}, 'titleweights': {}}
+
+
+def rank(frozen, words):
+    """Rank the documents for *words* like searchtools.js does."""
+    scores = {}
+    for word in words:
+        found = {}
+        for terms, weights, score in (('terms', 'weights', 5),
+                                      ('titleterms', 'titleweights', 15)):
+            postings = frozen[terms].get(word, [])
+            if isinstance(postings, int):
+                postings = [postings]
+            wordweights = frozen[weights].get(word, [0] * len(postings))
+            for doc, weight in zip(postings, wordweights):
+                base, total = found.get(doc, (0, 0))
+                found[doc] = (max(base, score), total + weight / 10)
+        if not scores:
+            scores = found
+        else:
+            scores = {doc: (max(scores[doc][0], found[doc][0]), scores[doc][1] + found[doc][1])
+                      for doc in scores.keys() & found.keys()}
+    ranked = sorted(scores, key=lambda doc: -sum(scores[doc]))
+    return [frozen['docnames'][doc] for doc in ranked]
+
+
+def test_IndexBuilder_ranking():
+    documents = {
+        'often': 'Quarks\n======\n\nfermion fermion fermion, boson and quark\n',
+        'once': ('Particles\n=========\n\nfermion boson lepton quark photon gluon '
+                 'electron neutrino muon tau\n'),
+        'title': 'Fermion\n=======\n\nspin statistics\n',
+        'none': 'Bosons\n======\n\nboson photon gluon\n',
+    }
+    env = DummyEnvironment('1.0', {})
+    index = IndexBuilder(env, 'en', {}, None)
+    for docname, content in documents.items():
+        doc = utils.new_document(b'test data', settings)
+        parser.parse(content, doc)
+        index.feed(docname, docname + '.rst', docname, doc)
+    frozen = index.freeze()
+    # only the weights that differ between the documents are stored
+    assert 'fermion' in frozen['weights']
+    assert 'lepton' not in frozen['weights']
+
+    # a title match is worth more; then the frequent and denser occurrence
+    assert rank(frozen, ['fermion']) == ['title', 'often', 'once']
+    # rarer words weigh more
+    assert rank(frozen, ['lepton']) == ['once']
+    assert rank(frozen, ['fermion', 'boson']) == ['often', 'once']
+    assert rank(frozen, ['quark']) == ['often', 'once']
+    assert rank(frozen, ['boson']) == ['none', 'often', 'once']
+    assert rank(frozen, ['muon', 'spin']) == []
+
+
+def test_SearchLanguage_split_texts():
+    lang = SearchEnglish({})
+    assert lang.split_texts(['Sphinx is', 'a\ndocumentation tool']) == \
+        ['Sphinx', 'is', 'a', 'documentation', 'tool']
+
+    class SearchCustom(SearchLanguage):
+        def split(self, input):
+            return [input.upper()]
+
+    lang = SearchCustom({})
+    assert lang.split_texts(['Sphinx is', 'a tool']) == ['SPHINX IS', 'A TOOL']
+
+
+def test_DefaultSplitter():
+    splitter = DefaultSplitter({})
+    assert splitter.split('') == []
+    assert splitter.split('私の名前は中野です') == ['私', 'の', '名前', 'は', '中野', 'です']
+    assert splitter.split('Sphinxはドキュメントを作成するツールです。') == \
+        ['Sphinx', 'は', 'ドキュメント', 'を', '作成', 'する', 'ツール', 'です', '。']
+
+    # repeated texts are split once; the callers get their own lists
+    result = splitter.split('私の名前は中野です')
+    result.append('extra')
+    assert splitter.split('私の名前は中野です') == ['私', 'の', '名前', 'は', '中野', 'です']
+    assert len(splitter._results) == 2
+
+
 def test_IndexBuilder_lookup():
     env = DummyEnvironment('1.0', {})
 
@@ -262,3 +445,67 @@ def test_nosearch(app):
     assert 'latex' not in index['terms']
     assert 'zfs' in index['terms']
     assert index['terms']['zfs'] == 0  # zfs on nosearch.rst is not registered to index
+
+
+@pytest.mark.sphinx(testroot='search', srcdir='search_incremental')
+def test_search_index_incremental(app):
+    app.build()
+    assert (app.doctreedir / 'html-searchpostings.pickle').exists()
+    assert not (app.outdir / '.searchpostings.pickle').exists()
+    index = jsload(app.outdir / 'searchindex.js')
+    assert 'zfs' in index['terms']
+
+    (app.srcdir / 'tocitem.rst').write_text('heading 1\n=========\n\nzettabyte\n')
+    app.build()
+    index2 = jsload(app.outdir / 'searchindex.js')
+    assert index2['docnames'] == index['docnames']
+    assert index2['terms']['zettabyt'] == index['docnames'].index('tocitem')
+    assert 'textinhead' in index['titleterms']
+    assert 'textinhead' not in index2['titleterms']
+    assert index2['terms']['zfs'] == index['terms']['zfs']
+
+    # a broken postings file falls back to loading the search index
+    (app.doctreedir / 'html-searchpostings.pickle').write_bytes(b'broken')
+    (app.srcdir / 'tocitem.rst').write_text('heading 1\n=========\n\nzebibyte\n')
+    app.build()
+    index3 = jsload(app.outdir / 'searchindex.js')
+    assert index3['terms']['zfs'] == index['terms']['zfs']
+    assert 'zettabyt' not in index3['terms']
+
+
+@pytest.mark.sphinx(testroot='search', srcdir='search_sharded',
+                    confoverrides={'html_search_shard_length': 2})
+def test_search_index_sharded(app):
+    app.build()
+    index = jsload(app.outdir / 'searchindex.js')
+    assert 'terms' not in index
+    assert index['shardlength'] == 2
+    assert index['shards']['zf'] == '_searchindex/zf.js'
+
+    shard = (app.outdir / '_searchindex' / 'zf.js').read_text()
+    assert shard == ('Search.setShard("zf",{"terms":{"zfs":0},"titleterms":{},'
+                     '"titleweights":{},"weights":{}})')
+    assert (app.outdir / '_searchindex' / '_006a21_005757.js').exists()
+    assert (app.outdir / '_searchindex' / 'lo.js').exists()
+
+    # the shards of terms that are gone are removed
+    (app.outdir / '_searchindex' / 'xx.js').write_text('')
+    (app.srcdir / 'tocitem.rst').write_text('heading 1\n=========\n\nzettabyte\n')
+    app.build()
+    assert not (app.outdir / '_searchindex' / 'xx.js').exists()
+    assert (app.outdir / '_searchindex' / 'zf.js').exists()
+    assert not (app.outdir / '_searchindex' / 'lo.js').exists()
+
+
+@pytest.mark.sphinx(testroot='search', srcdir='search_unsharded')
+def test_search_index_unsharded(make_app, app_params):
+    args, kwargs = app_params
+    app = make_app(*args, confoverrides={'html_search_shard_length': 2}, **kwargs)
+    app.build()
+    assert (app.outdir / '_searchindex' / 'zf.js').exists()
+
+    # the shards are removed when the index is not sharded anymore
+    app = make_app(*args, **kwargs)
+    app.build()
+    assert not (app.outdir / '_searchindex').exists()
+    assert 'zfs' in jsload(app.outdir / 'searchindex.js')['terms']
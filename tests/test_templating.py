@@ -47,3 +47,40 @@ def test_autosummary_context(make_app, app_params):
     result = (app.outdir / 'generated' / 'sphinx.application.TemplateBridge.html').read_text()
     assert 'autosummary/class.rst method block overloading' in result
     assert 'foobar' in result
+
+
+@pytest.mark.sphinx('html', testroot='templating', srcdir='templating_bytecode_cache')
+def test_template_bytecode_cache(make_app, app_params):
+    args, kwargs = app_params
+    app = make_app(*args, **kwargs)
+    app.builder.build_update()
+
+    cachedir = app.doctreedir / 'templates.cache'
+    assert cachedir.listdir()
+
+    def compiled_templates(app):
+        compiled = []
+        environment = app.builder.templates.environment
+        compile = environment.compile
+
+        def recording_compile(source, name=None, *args, **kwargs):
+            compiled.append(name)
+            return compile(source, name, *args, **kwargs)
+        environment.compile = recording_compile
+        return compiled
+
+    # the compiled templates are reused by the next build
+    app = make_app(*args, **kwargs)
+    compiled = compiled_templates(app)
+    app.builder.templates.environment.get_template('layout.html')
+    assert compiled == []
+
+    # ...until their source changes
+    layout = app.srcdir / '_templates' / 'layout.html'
+    layout.write_text(layout.read_text().replace('layout overloading', 'changed layout'))
+    app = make_app(*args, **kwargs)
+    compiled = compiled_templates(app)
+    app.builder.templates.environment.get_template('layout.html')
+    assert compiled == ['layout.html']
+    app.builder.build_all()
+    assert '<!-- changed layout -->' in (app.outdir / 'index.html').read_text()
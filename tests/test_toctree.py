@@ -11,6 +11,8 @@ import re
 
 import pytest
 
+from sphinx.environment.adapters.toctree import TocTree
+
 
 @pytest.mark.sphinx(testroot='toctree-glob')
 def test_relations(app, status, warning):
@@ -29,6 +31,37 @@ def test_relations(app, status, warning):
     assert 'quux' not in app.builder.relations
 
 
+@pytest.mark.sphinx(testroot='toctree-glob')
+def test_local_toctree_cache(app, status, warning):
+    app.builder.build_all()
+    app.builder.init_toctrees()
+
+    def render(docname, **kwargs):
+        toctree = TocTree(app.env).get_toctree_for(docname, app.builder, **kwargs)
+        return app.builder.render_partial(toctree)['fragment']
+
+    docnames = ['index', 'foo', 'bar/index', 'bar/bar_1', 'bar/bar_4/index', 'quux', 'genindex']
+    for docname in docnames:
+        for collapse in (True, False):
+            expected = render(docname, collapse=collapse, includehidden=False)
+            assert app.builder._get_local_toctree(docname, collapse=collapse) == expected
+            assert app.builder._get_local_toctree(docname, collapse=collapse) == expected
+
+    # the pages outside the global TOC in the same directory share the toctrees
+    assert 'quux' not in app.builder.get_toctree_docs()
+    assert 'bar/bar_4/index' in app.builder.get_toctree_docs()
+    assert len(app.builder._toctree_fragments) == 2
+
+    # so do the pages in the global TOC whose toctrees resolve to the same tree,
+    # e.g. the pages of a section below the depth shown
+    fragments = app.builder._resolved_toctree_fragments
+    fragments.clear()
+    expected = render('qux/qux_1', collapse=True, includehidden=False, maxdepth=1)
+    assert app.builder._get_local_toctree('qux/qux_1', maxdepth=1) == expected
+    assert app.builder._get_local_toctree('qux/qux_2', maxdepth=1) == expected
+    assert len(fragments) == 1
+
+
 @pytest.mark.sphinx('singlehtml', testroot='toctree-empty')
 def test_singlehtml_toctree(app, status, warning):
     app.builder.build_all()
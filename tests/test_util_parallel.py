@@ -0,0 +1,176 @@
+"""
+    test_util_parallel
+    ~~~~~~~~~~~~~~~~~~
+
+    Test parallel building utilities.
+
+    :copyright: Copyright 2007-2020 by the Sphinx team, see AUTHORS.
+    :license: BSD, see LICENSE for details.
+"""
+
+import os
+import time
+
+import pytest
+
+from sphinx.errors import SphinxParallelError
+from sphinx.util.parallel import (
+    ConcurrentTasks, SerialTasks, WorkerPool, make_chunks, parallel_available
+)
+
+requires_parallel = pytest.mark.skipif(not parallel_available,
+                                       reason="parallel build is not available")
+
+
+def test_make_chunks():
+    docnames = ['doc%d' % i for i in range(100)]
+    chunks = make_chunks(docnames, 4)
+    assert [len(chunk) for chunk in chunks] == [15] * 6 + [10]
+    assert sum(chunks, []) == docnames
+
+
+def test_make_chunks_with_costs():
+    docnames = ['doc%d' % i for i in range(100)]
+    costs = {docname: 1.0 for docname in docnames}
+    costs['doc50'] = 50.0
+    chunks = make_chunks(docnames, 4, costs=costs)
+    assert sorted(sum(chunks, [])) == sorted(docnames)
+
+    # the most expensive document comes first, on its own
+    assert chunks[0] == ['doc50']
+    chunk_costs = [sum(costs[docname] for docname in chunk) for chunk in chunks]
+    assert chunk_costs == sorted(chunk_costs, reverse=True)
+    assert max(len(chunk) for chunk in chunks) <= 15
+
+    assert make_chunks([], 4, costs={}) == []
+
+
+@requires_parallel
+def test_WorkerPool():
+    results = {}
+    pids = set()
+
+    def task(arg):
+        return arg * 2, os.getpid()
+
+    def collect(arg, result):
+        value, pid = result
+        results[arg] = value
+        pids.add(pid)
+
+    pool = WorkerPool(2)
+    for i in range(20):
+        pool.add_task(task, i, collect)
+    pool.join()
+
+    assert results == {i: i * 2 for i in range(20)}
+    # workers are reused across tasks
+    assert len(pids) <= 2
+    assert os.getpid() not in pids
+
+
+@requires_parallel
+def test_WorkerPool_new_task_func():
+    results = []
+    pool = WorkerPool(2)
+    pool.add_task(lambda: 'first', result_func=lambda arg, ret: results.append(ret))
+    pool.add_task(lambda: 'second', result_func=lambda arg, ret: results.append(ret))
+    pool.join()
+
+    assert results == ['first', 'second']
+
+
+@requires_parallel
+def test_WorkerPool_error():
+    def task(arg):
+        raise ValueError('broken: %s' % arg)
+
+    pool = WorkerPool(2)
+    with pytest.raises(SphinxParallelError) as exc:
+        pool.add_task(task, 'chunk')
+        pool.join()
+
+    assert 'ValueError: broken: chunk' in str(exc.value)
+
+
+@requires_parallel
+def test_WorkerPool_dead_worker():
+    pool = WorkerPool(1)
+    with pytest.raises(SphinxParallelError):
+        pool.add_task(os._exit, 1)
+        pool.join()
+
+
+def test_SerialTasks():
+    results = []
+    tasks = SerialTasks()
+    first = tasks.add_task(results.append, 1)
+    second = tasks.add_task(results.append, 2, after=[first], forked=True)
+    assert (first, second) == (0, 1)
+    assert results == [1, 2]
+
+
+@requires_parallel
+def test_ConcurrentTasks(tmpdir):
+    pids = {}
+    listings = {}
+
+    def forked_task(arg):
+        tmpdir.join(arg).write(arg)
+        return os.getpid()
+
+    def main_task(arg):
+        listings[arg] = sorted(f.basename for f in tmpdir.listdir())
+        return os.getpid()
+
+    def collect(arg, pid):
+        pids[arg] = pid
+
+    tasks = ConcurrentTasks(2)
+    first = tasks.add_task(main_task, 'first', collect)
+    # a task of the main process without dependencies runs right away
+    assert pids['first'] == os.getpid()
+    files = [tasks.add_task(forked_task, name, collect, forked=True)
+             for name in ('a', 'b', 'c')]
+    tasks.add_task(main_task, 'last', collect, after=files)
+    tasks.add_task(forked_task, 'd', collect, after=[first], forked=True)
+    tasks.join()
+
+    # the main tasks run in the main process, after their dependencies
+    assert pids['first'] == pids['last'] == os.getpid()
+    assert 'd' not in listings['first']
+    assert {'a', 'b', 'c'} <= set(listings['last'])
+    # the others each in a forked process
+    assert os.getpid() not in [pids[name] for name in 'abcd']
+    assert sorted(f.basename for f in tmpdir.listdir()) == ['a', 'b', 'c', 'd']
+
+
+@requires_parallel
+def test_ConcurrentTasks_error():
+    def task(arg):
+        raise ValueError('broken: %s' % arg)
+
+    tasks = ConcurrentTasks(2)
+    with pytest.raises(SphinxParallelError) as exc:
+        tasks.add_task(task, 'copy', forked=True)
+        tasks.join()
+    assert 'ValueError: broken: copy' in str(exc.value)
+
+    tasks = ConcurrentTasks(2)
+    with pytest.raises(SphinxParallelError):
+        tasks.add_task(os._exit, 1, forked=True)
+        tasks.join()
+
+    tasks = ConcurrentTasks(2)
+    with pytest.raises(SphinxParallelError):
+        tasks.add_task(print, after=[42])
+        tasks.join()
+
+    # a failing task terminates the processes still running
+    tasks = ConcurrentTasks(2)
+    tasks.add_task(time.sleep, 60, forked=True)
+    (proc, _), = tasks._running.values()
+    with pytest.raises(ValueError):
+        tasks.add_task(task, 'main')
+    assert not proc.is_alive()
+    assert tasks._running == {}